@@ -0,0 +1,23 @@
+import os
+import sys
+import time
+import argparse
+
+# Ensure the project root is in the python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.logic.palette_library import PaletteLibrary, DEFAULT_LIBRARY_PATH
+
+def main():
+    """Builds the precomputed palette library used by --color_engine library."""
+    parser = argparse.ArgumentParser(description="Build the precomputed palette library")
+    parser.add_argument("--output", default=DEFAULT_LIBRARY_PATH, help="Where to write the .npz library")
+    args = parser.parse_args()
+
+    start = time.time()
+    library = PaletteLibrary.build()
+    library.save(args.output)
+    print(f"DONE! {len(library.primaries)} palettes written to {args.output} in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import time
+import requests
+from urllib.parse import urlsplit, parse_qsl
+
+# GCS requires every chunk except the last to be a multiple of 256 KiB
+CHUNK_GRANULARITY = 256 * 1024
+DEFAULT_CHUNK_SIZE = 32 * CHUNK_GRANULARITY  # 8 MiB
+RESUMABLE_THRESHOLD = DEFAULT_CHUNK_SIZE
+
+
+class ResumableUploadError(Exception):
+    pass
+
+
+def supports_resumable(upload_url: str) -> bool:
+    """
+    Whether a staged target can open a resumable session. A V4 signature covers
+    the HTTP method and the signed headers, so a URL signed for a plain PUT (what
+    stagedUploadsCreate returns) answers 403 to the session-start POST. Only URLs
+    that sign x-goog-resumable were issued for a resumable start; unsigned URLs are tried.
+    """
+    query = {name.lower(): value for name, value in parse_qsl(urlsplit(upload_url).query)}
+    if "x-goog-signature" not in query:
+        return True
+    return "x-goog-resumable" in query.get("x-goog-signedheaders", "").lower().split(";")
+
+
+class ResumableUploader:
+    """
+    Uploads a body to a GCS-style resumable session in fixed-size chunks.
+    After a dropped connection or a 5xx, the session is queried for the last
+    acknowledged offset and the transfer resumes from there instead of from zero.
+
+    Only the unacknowledged tail of the current chunk is kept in memory, so the
+    source can be a plain file or any object with read() (e.g. a generator stream).
+    """
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = 5, backoff: float = 1.0,
+                 progress_callback=None):
+        if chunk_size % CHUNK_GRANULARITY:
+            raise ValueError(f"chunk_size must be a multiple of {CHUNK_GRANULARITY} bytes")
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.progress_callback = progress_callback
+
+    def start_session(self, upload_url: str, headers: dict) -> str:
+        """
+        Opens a resumable session (POST with x-goog-resumable: start) on a target
+        signed for it (see supports_resumable).
+        Returns the session URI, or None if the target does not allow resumable uploads.
+        """
+        start_headers = dict(headers)
+        start_headers["x-goog-resumable"] = "start"
+        try:
+            resp = requests.post(upload_url, headers=start_headers, data=b"")
+        except requests.RequestException as e:
+            print(f"   ⚠️ Resumable session start failed: {e}")
+            return None
+        if resp.status_code not in [200, 201] or "Location" not in resp.headers:
+            print(f"   ⚠️ Resumable session refused: {resp.status_code} - {resp.text[:200]}")
+            return None
+        return resp.headers["Location"]
+
+    def query_offset(self, session_uri: str, total_size: int) -> int:
+        """
+        Asks the bucket how many bytes it has persisted.
+        Returns total_size when the upload is already complete.
+        """
+        headers = {"Content-Range": f"bytes */{total_size}", "Content-Length": "0"}
+        resp = requests.put(session_uri, headers=headers, data=b"")
+        if resp.status_code in [200, 201]:
+            return total_size
+        if resp.status_code == 308:
+            return self._parse_range(resp)
+        raise ResumableUploadError(f"Session status query failed: {resp.status_code} - {resp.text}")
+
+    def upload(self, session_uri: str, source, total_size: int):
+        """
+        Sends source (anything with read()) to the session. Returns the final response.
+        """
+        acked = 0
+        pending = b""  # bytes from offset `acked` onwards that were read but not acknowledged
+        failures = 0
+
+        while True:
+            while len(pending) < self.chunk_size and acked + len(pending) < total_size:
+                piece = source.read(self.chunk_size - len(pending))
+                if not piece:
+                    break
+                pending += piece
+
+            chunk = pending[:self.chunk_size]
+            end = acked + len(chunk)
+            if end > total_size or (end < total_size and len(chunk) < self.chunk_size):
+                raise ResumableUploadError(f"Source size mismatch: expected {total_size} bytes")
+
+            headers = {"Content-Length": str(len(chunk))}
+            if chunk:
+                headers["Content-Range"] = f"bytes {acked}-{end - 1}/{total_size}"
+            else:
+                headers["Content-Range"] = f"bytes */{total_size}"
+
+            try:
+                resp = requests.put(session_uri, headers=headers, data=chunk)
+                if resp.status_code >= 500 or resp.status_code == 429:
+                    raise ResumableUploadError(f"Bucket returned {resp.status_code}")
+            except (requests.RequestException, ResumableUploadError) as e:
+                failures += 1
+                if failures > self.max_retries:
+                    raise ResumableUploadError(f"Giving up after {self.max_retries} retries: {e}")
+                print(f"   ⚠️ Chunk at offset {acked} failed ({e}), resuming...")
+                time.sleep(self.backoff * (2 ** (failures - 1)))
+                persisted = self.query_offset(session_uri, total_size)
+                if persisted < acked:
+                    raise ResumableUploadError(f"Bucket lost acknowledged data ({persisted} < {acked})")
+                pending = pending[persisted - acked:]
+                acked = persisted
+                continue
+
+            if resp.status_code in [200, 201]:
+                self._report(total_size, total_size)
+                return resp
+            if resp.status_code != 308:
+                raise ResumableUploadError(f"Chunk upload failed: {resp.status_code} - {resp.text}")
+
+            failures = 0
+            persisted = self._parse_range(resp)
+            pending = pending[persisted - acked:]
+            acked = persisted
+            self._report(acked, total_size)
+
+    def _report(self, sent: int, total: int):
+        if self.progress_callback:
+            self.progress_callback(sent, total)
+
+    @staticmethod
+    def _parse_range(resp) -> int:
+        # "Range: bytes=0-1048575" means bytes up to 1048575 inclusive are persisted
+        value = resp.headers.get("Range")
+        if not value:
+            return 0
+        return int(value.split("-")[-1]) + 1
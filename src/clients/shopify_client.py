@@ -2,34 +2,58 @@ import requests
 import json
 import time
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.clients.upload_streams import ProgressReader, MultipartFileStream
+from src.clients.resumable_upload import ResumableUploader, ResumableUploadError, RESUMABLE_THRESHOLD, supports_resumable
+
+# Shopify stores can hold at most 20 themes
+THEME_LIMIT = 20
 
 class ShopifyClient:
     def __init__(self, shop_url: str, access_token: str):
         # Clean URL
         if not shop_url:
             raise ValueError("Shopify Store URL is required")
-        self.shop_url = shop_url.replace("https://", "").replace("/", "")
+        # Plain http:// is only used against the local fake Admin API (src/mocks/mock_shopify_server.py)
+        scheme = "http" if shop_url.startswith("http://") else "https"
+        self.shop_url = shop_url.replace("https://", "").replace("http://", "").replace("/", "")
         self.access_token = access_token
-        self.rest_url = f"https://{self.shop_url}/admin/api/2025-01"
-        self.graphql_url = f"https://{self.shop_url}/admin/api/2025-01/graphql.json"
+        self.rest_url = f"{scheme}://{self.shop_url}/admin/api/2025-01"
+        self.graphql_url = f"{scheme}://{self.shop_url}/admin/api/2025-01/graphql.json"
         self.headers = {
             "X-Shopify-Access-Token": self.access_token,
             "Content-Type": "application/json"
         }
+        # CDN URL -> Shopify File GID, so uploaded media can be referenced later without re-fetching
+        self.file_ids = {}
+        # Snapshot of menus, locales, themes etc. fetched once per job (see load_store_context)
+        self.store_context = None
+        self._context_lock = threading.Lock()
 
-    def upload_local_file(self, file_path: str, mime_type: str = "application/zip", resource: str = "FILE") -> str:
+    def upload_local_file(self, file_path: str, mime_type: str = "application/zip", resource: str = "FILE", progress_callback=None) -> str:
         """
         Uploads a local file to Shopify Staged Uploads. 
         Returns the public URL (target) that Shopify can download from.
         This bypasses the need for Ngrok.
+        The file is streamed from disk (never fully buffered); progress_callback
+        receives (bytes_sent, total_bytes) as the body is sent.
         """
         if not os.path.exists(file_path):
             print(f"❌ File not found: {file_path}")
             return None
 
-        filename = os.path.basename(file_path)
-        file_size = str(os.path.getsize(file_path))
+        with open(file_path, "rb") as f:
+            return self.upload_stream(f, os.path.basename(file_path), os.path.getsize(file_path),
+                                      mime_type=mime_type, resource=resource, progress_callback=progress_callback)
 
+    def upload_stream(self, fileobj, filename: str, file_size: int, mime_type: str = "application/zip",
+                      resource: str = "FILE", progress_callback=None) -> str:
+        """
+        Same as upload_local_file, but for any object with read() whose exact
+        size is known in advance (e.g. an IterableReader over a theme archive being
+        built). The size is announced to stagedUploadsCreate and sent as Content-Length.
+        """
         # 1. Request Target
         query = """
         mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
@@ -48,7 +72,7 @@ class ShopifyClient:
                 "filename": filename,
                 "mimeType": mime_type,
                 "resource": resource,
-                "fileSize": file_size
+                "fileSize": str(file_size)
             }]
         }
         
@@ -72,17 +96,34 @@ class ShopifyClient:
         
         # Check if we need POST (Multipart) or PUT (Raw)
         try:
-            with open(file_path, "rb") as f:
-                if "policy" in param_dict or "key" in param_dict:
-                    # POST upload (usually AWS style)
-                    files = {"file": (filename, f, mime_type)}
-                    upload_resp = requests.post(upload_url, data=param_dict, files=files)
-                else:
-                    # PUT upload (GCS style)
-                    headers = {"Content-Type": mime_type}
-                    for p in parameters:
-                        headers[p["name"]] = p["value"]
-                    upload_resp = requests.put(upload_url, data=f, headers=headers)
+            if "policy" in param_dict or "key" in param_dict:
+                # POST upload (usually AWS style) - streamed multipart body
+                body = MultipartFileStream(param_dict, "file", filename, fileobj, mime_type, file_size, progress_callback)
+                upload_resp = requests.post(upload_url, data=body, headers={"Content-Type": body.content_type})
+            else:
+                # PUT upload (GCS style) - raw body streamed in fixed-size blocks
+                headers = {"Content-Type": mime_type}
+                for p in parameters:
+                    headers[p["name"]] = p["value"]
+                upload_resp = None
+                if file_size >= RESUMABLE_THRESHOLD:
+                    # Large files go through a resumable session, when the target is signed
+                    # for one, so a dropped connection resumes from the last acknowledged chunk
+                    if supports_resumable(upload_url):
+                        uploader = ResumableUploader(progress_callback=progress_callback)
+                        session_uri = uploader.start_session(upload_url, headers)
+                        if session_uri:
+                            upload_resp = uploader.upload(session_uri, fileobj, file_size)
+                        else:
+                            print(f"   ⚠️ {filename}: falling back to a single PUT (no resume on interruption)")
+                    else:
+                        print(f"   ⚠️ {filename}: staged target is signed for a single PUT; uploading without resume support")
+                if upload_resp is None:
+                    body = ProgressReader(fileobj, file_size, progress_callback)
+                    upload_resp = requests.put(upload_url, data=body, headers=headers)
+        except ResumableUploadError as e:
+            print(f"❌ Resumable Upload Failed: {e}")
+            return None
         except Exception as e:
             print(f"❌ Upload Connection Error: {e}")
             return None
@@ -125,7 +166,20 @@ class ShopifyClient:
             return None
 
         # 4. Poll for Readiness
-        return self._poll_for_file_url(file_id)
+        cdn_url = self._poll_for_file_url(file_id)
+        if cdn_url:
+            self.file_ids[cdn_url] = file_id
+        return cdn_url
+
+    def upload_local_files(self, file_paths: list, mime_type: str = "image/png", resource: str = "IMAGE", max_workers: int = 4) -> dict:
+        """
+        Uploads several files concurrently. Returns {file_path: url or None}.
+        """
+        if not file_paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            urls = pool.map(lambda path: self.upload_local_file(path, mime_type=mime_type, resource=resource), file_paths)
+            return dict(zip(file_paths, urls))
 
     def _poll_for_file_url(self, file_id: str) -> str:
         query = """
@@ -160,7 +214,7 @@ class ShopifyClient:
             time.sleep(2)
         return None
 
-    def upload_video_to_shopify(self, video_path: str, alt_text: str = "Product video") -> str:
+    def upload_video_to_shopify(self, video_path: str, alt_text: str = "Product video", progress_callback=None) -> str:
         """
         Special wrapper for video uploads. 
         1. Uploads file to bucket.
@@ -168,7 +222,7 @@ class ShopifyClient:
         3. Polls for CDN URL.
         """
         # Step 1 & 2: Upload to bucket, get the resource URL back (not the final CDN url yet)
-        resource_url = self.upload_local_file(video_path, mime_type="video/mp4", resource="VIDEO")
+        resource_url = self.upload_local_file(video_path, mime_type="video/mp4", resource="VIDEO", progress_callback=progress_callback)
         if not resource_url:
             return None
 
@@ -216,6 +270,7 @@ class ShopifyClient:
             if node and node.get("fileStatus") == "READY":
                 sources = node.get("sources", [])
                 if sources:
+                    self.file_ids[sources[0]["url"]] = video_id
                     return sources[0]["url"]
             time.sleep(3)
         
@@ -259,14 +314,28 @@ class ShopifyClient:
                 "role": "unpublished"
             }
         }
+        context = self.store_context
+        if context and context["theme_count"] >= THEME_LIMIT:
+            print(f"⚠️ Store already has {context['theme_count']} themes (limit {THEME_LIMIT}); upload will likely be rejected.")
+
         response = requests.post(endpoint, json=payload, headers=self.headers)
         if response.status_code == 201:
-            return response.json()["theme"]["id"]
+            theme = response.json()["theme"]
+            if context:
+                context["themes"][str(theme["id"])] = {"id": theme.get("admin_graphql_api_id"), "name": theme_name,
+                                                       "role": "UNPUBLISHED", "processing": True}
+                context["theme_count"] += 1
+            return theme["id"]
         
         print(f"❌ Theme Upload Error: {response.status_code} {response.text}")
         return None
 
     def publish_theme(self, theme_id: str):
+        cached = (self.store_context or {}).get("themes", {}).get(str(theme_id))
+        if cached and cached.get("role") == "MAIN":
+            print(f"✅ Theme {theme_id} is already published")
+            return
+
         print(f"⏳ Waiting for Theme {theme_id} to process...")
         endpoint_get = f"{self.rest_url}/themes/{theme_id}.json"
         
@@ -286,6 +355,13 @@ class ShopifyClient:
         
         if resp.status_code == 200:
             print(f"✅ Theme {theme_id} Published Successfully")
+            if self.store_context:
+                for theme in self.store_context["themes"].values():
+                    if theme.get("role") == "MAIN":
+                        theme["role"] = "UNPUBLISHED"
+                if cached:
+                    cached["role"] = "MAIN"
+                    cached["processing"] = False
         else:
             print(f"❌ Failed to Publish Theme: {resp.status_code} - {resp.text}")
 
@@ -310,6 +386,190 @@ class ShopifyClient:
         print(f"❌ Product Creation Failed: {response.text}")
         return None
 
+    def load_store_context(self, refresh: bool = False) -> dict:
+        """
+        Fetches menus, shop locales, themes, the primary location and the
+        Online Store publication in one aliased GraphQL query, and caches the
+        result on the client. Later steps read this snapshot instead of
+        issuing their own GETs, and skip mutations that would be no-ops.
+        Returns None (and caches nothing) when the query fails, e.g. for a
+        missing access scope, so callers fall back to their own lookups.
+        """
+        with self._context_lock:
+            if self.store_context is not None and not refresh:
+                return self.store_context
+
+            query = """
+            query storeContext {
+              menus: menus(first: 50) { nodes { id handle title } }
+              locales: shopLocales { locale primary published }
+              themes: themes(first: 50) { nodes { id name role processing } }
+              primaryLocation: locations(first: 1) { nodes { id } }
+              publications: publications(first: 20) { nodes { id name } }
+            }
+            """
+            data = self._graphql_request(query)
+            if data.get("errors") or not data.get("data"):
+                print(f"⚠️ Store context unavailable, falling back to per-step lookups: {data.get('errors')}")
+                self.store_context = None
+                return None
+            data = data["data"]
+
+            def nodes(key):
+                return (data.get(key) or {}).get("nodes", [])
+
+            locations = nodes("primaryLocation")
+            themes = nodes("themes")
+            self.store_context = {
+                "menus": {m["handle"]: m for m in nodes("menus")},
+                "locales": {l["locale"]: l for l in data.get("locales") or []},
+                "themes": {self._legacy_id(t["id"]): t for t in themes},
+                "theme_count": len(themes),
+                "location_id": locations[0]["id"] if locations else None,
+                "publication_id": next((p["id"] for p in nodes("publications") if p["name"] == "Online Store"), None)
+            }
+            return self.store_context
+
+    @staticmethod
+    def _legacy_id(gid: str) -> str:
+        """gid://shopify/Menu/123 -> '123' (the id REST endpoints expect)."""
+        return str(gid).split("/")[-1]
+
+    def create_product_graphql(self, title: str, html_body: str, brand: str, price: str = "29.99", inventory: int = 100):
+        """
+        Creates the product (no media) with a single synchronous productSet call.
+        Media is attached separately with attach_product_media, so this call never
+        waits on Shopify downloading images.
+        Returns {"id": <Product GID>, "handle": <handle>} or None.
+        """
+        defaults = self.load_store_context() or {}
+        location_id = defaults.get("location_id") or self._query_first_id("locations(first: 1) { nodes { id } }", "locations")
+        publication_id = defaults.get("publication_id") or self._query_first_id(
+            "publications(first: 20) { nodes { id name } }", "publications", name="Online Store")
+
+        variant = {
+            "optionValues": [{"optionName": "Title", "name": "Default Title"}],
+            "price": price,
+            "inventoryItem": {"tracked": True}
+        }
+        if location_id:
+            variant["inventoryQuantities"] = [{"locationId": location_id, "name": "available", "quantity": inventory}]
+        else:
+            print(f"⚠️ No inventory location found (read_locations scope?); '{title}' will be created without stock")
+
+        mutation = """
+        mutation productSet($input: ProductSetInput!) {
+          productSet(synchronous: true, input: $input) {
+            product { id handle }
+            userErrors { field message }
+          }
+        }
+        """
+        variables = {
+            "input": {
+                "title": title,
+                "descriptionHtml": html_body,
+                "vendor": brand,
+                "status": "ACTIVE",
+                "productOptions": [{"name": "Title", "values": [{"name": "Default Title"}]}],
+                "variants": [variant]
+            }
+        }
+        data = self._graphql_request(mutation, variables)
+        result = (data.get("data") or {}).get("productSet") or {}
+        product = result.get("product")
+        if not product:
+            print(f"❌ Product Creation Failed: {result.get('userErrors') or data.get('errors')}")
+            return None
+
+        if not publication_id:
+            print(f"⚠️ Online Store publication not found (read_publications scope?); '{title}' is not published")
+            return product
+        publish = """
+        mutation publishablePublish($id: ID!, $input: [PublicationInput!]!) {
+          publishablePublish(id: $id, input: $input) {
+            userErrors { field message }
+          }
+        }
+        """
+        data = self._graphql_request(publish, {"id": product["id"], "input": [{"publicationId": publication_id}]})
+        errors = ((data.get("data") or {}).get("publishablePublish") or {}).get("userErrors") or data.get("errors")
+        if errors:
+            print(f"⚠️ Product Publish Failed: {errors}")
+        return product
+
+    def _query_first_id(self, selection: str, key: str, name: str = None):
+        """Direct lookup for when the store context lacks a value: the first node's id (or the node named `name`)."""
+        data = self._graphql_request(f"query {{ {selection} }}")
+        nodes = ((data.get("data") or {}).get(key) or {}).get("nodes", [])
+        if name:
+            nodes = [n for n in nodes if n.get("name") == name]
+        return nodes[0]["id"] if nodes else None
+
+    def attach_product_media(self, product_id: str, file_ids: list = None, sources: list = None) -> bool:
+        """
+        Attaches media to a product without waiting for it to be processed.
+        - file_ids: already-registered Files (see self.file_ids) are referenced directly,
+          so Shopify does not download anything again.
+        - sources: (url, mediaContentType) pairs, e.g. staged resourceUrls, go through productCreateMedia.
+        Use wait_for_product_media to confirm processing.
+        """
+        ok = True
+        if file_ids:
+            mutation = """
+            mutation fileUpdate($files: [FileUpdateInput!]!) {
+              fileUpdate(files: $files) {
+                files { id }
+                userErrors { field message }
+              }
+            }
+            """
+            files = [{"id": fid, "referencesToAdd": [product_id]} for fid in file_ids if fid]
+            data = self._graphql_request(mutation, {"files": files})
+            errors = ((data.get("data") or {}).get("fileUpdate") or {}).get("userErrors") or data.get("errors")
+            if errors:
+                print(f"❌ Media Attach Failed: {errors}")
+                ok = False
+
+        if sources:
+            mutation = """
+            mutation productCreateMedia($productId: ID!, $media: [CreateMediaInput!]!) {
+              productCreateMedia(productId: $productId, media: $media) {
+                media { id status }
+                mediaUserErrors { field message }
+              }
+            }
+            """
+            media = [{"originalSource": src, "mediaContentType": content_type}
+                     for src, content_type in sources if src]
+            data = self._graphql_request(mutation, {"productId": product_id, "media": media})
+            errors = ((data.get("data") or {}).get("productCreateMedia") or {}).get("mediaUserErrors") or data.get("errors")
+            if errors:
+                print(f"❌ Media Create Failed: {errors}")
+                ok = False
+        return ok
+
+    def wait_for_product_media(self, product_id: str, expected: int, attempts: int = 30, interval: float = 2) -> bool:
+        """Polls until the product has `expected` media items that are all READY."""
+        query = """
+        query ($id: ID!) {
+          product(id: $id) {
+            media(first: 50) { nodes { id status } }
+          }
+        }
+        """
+        for _ in range(attempts):
+            data = self._graphql_request(query, {"id": product_id})
+            product = (data.get("data") or {}).get("product") or {}
+            nodes = (product.get("media") or {}).get("nodes", [])
+            if any(n.get("status") == "FAILED" for n in nodes):
+                print(f"❌ Product media processing failed: {nodes}")
+                return False
+            if len(nodes) >= expected and all(n.get("status") == "READY" for n in nodes):
+                return True
+            time.sleep(interval)
+        return False
+
     def create_page(self, title: str, html_body: str) -> str:
         endpoint = f"{self.rest_url}/pages.json"
         payload = {
@@ -325,12 +585,16 @@ class ShopifyClient:
         return None
 
     def add_page_to_menu(self, page_id: str, page_title: str, menu_handle: str = "main-menu"):
-        endpoint_get = f"{self.rest_url}/menus.json"
-        resp = requests.get(endpoint_get, headers=self.headers)
-        if resp.status_code != 200: return
-        
-        menus = resp.json().get("menus", [])
-        menu_id = next((m["id"] for m in menus if m["handle"] == menu_handle), None)
+        if self.store_context is not None:
+            menu = self.store_context["menus"].get(menu_handle)
+            menu_id = self._legacy_id(menu["id"]) if menu else None
+        else:
+            endpoint_get = f"{self.rest_url}/menus.json"
+            resp = requests.get(endpoint_get, headers=self.headers)
+            if resp.status_code != 200: return
+
+            menus = resp.json().get("menus", [])
+            menu_id = next((m["id"] for m in menus if m["handle"] == menu_handle), None)
         if not menu_id: return
 
         endpoint_post = f"{self.rest_url}/menus/{menu_id}/items.json"
@@ -345,9 +609,13 @@ class ShopifyClient:
 
     def enable_store_language(self, language_code: str):
         """Enables and publishes a language (locale) on the store."""
+        current = (self.store_context or {}).get("locales", {}).get(language_code)
+        if current and (current.get("published") or current.get("primary")):
+            print(f"🌐 Language {language_code} already enabled and published")
+            return
         print(f"🌐 Enabling language: {language_code}")
-        
-        # 1. Enable
+
+        # 1. Enable (skipped when the locale is already enabled)
         query_enable = """
         mutation shopLocaleEnable($locale: String!) {
             shopLocaleEnable(locale: $locale) {
@@ -356,7 +624,8 @@ class ShopifyClient:
             }
         }
         """
-        self._graphql_request(query_enable, {'locale': language_code})
+        if not current:
+            self._graphql_request(query_enable, {'locale': language_code})
 
         # 2. Publish
         query_publish = """
@@ -371,6 +640,8 @@ class ShopifyClient:
             'locale': language_code,
             'shopLocale': {'published': True}
         })
+        if self.store_context is not None:
+            self.store_context["locales"][language_code] = {"locale": language_code, "primary": False, "published": True}
 
     def _graphql_request(self, query, variables=None):
         resp = requests.post(self.graphql_url, headers=self.headers, json={'query': query, 'variables': variables or {}})
@@ -0,0 +1,143 @@
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ProgressReader:
+    """
+    File-like wrapper that streams an open file in fixed-size blocks.
+    Exposes __len__ so requests sends a Content-Length instead of buffering,
+    and reports (bytes_sent, total_bytes) to an optional progress callback.
+    """
+    def __init__(self, fileobj, total_size: int, progress_callback=None):
+        self.fileobj = fileobj
+        self.total_size = total_size
+        self.progress_callback = progress_callback
+        self.bytes_read = 0
+
+    def __len__(self):
+        return self.total_size
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        chunk = self.fileobj.read(size)
+        if chunk:
+            self.bytes_read += len(chunk)
+            if self.progress_callback:
+                self.progress_callback(self.bytes_read, self.total_size)
+        return chunk
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class IterableReader:
+    """
+    File-like adapter over an iterator of byte chunks (e.g. ThemeArchive.iter_chunks()),
+    so data produced on the fly can be consumed by the same upload paths as a file.
+    Chunks are pulled only as the HTTP body is read; nothing is staged on disk.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self._exhausted = False
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        while len(self._buffer) < size and not self._exhausted:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                self._exhausted = True
+        out, self._buffer = self._buffer[:size], self._buffer[size:]
+        return out
+
+    def close(self):
+        close = getattr(self._chunks, "close", None)
+        if close:
+            close()
+
+
+class MultipartFileStream:
+    """
+    Streaming multipart/form-data encoder for a single file field.
+    The form fields and part headers are small and kept in memory; the file
+    body is read lazily, so peak memory stays flat regardless of file size.
+    The total length is known upfront so the request carries a Content-Length
+    (S3-style POST policies reject chunked transfer encoding).
+    """
+    def __init__(self, fields: dict, file_field: str, filename: str, fileobj, mime_type: str,
+                 file_size: int, progress_callback=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        head = b""
+        for name, value in fields.items():
+            head += (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode("utf-8")
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self._segments = [head, ProgressReader(fileobj, file_size, progress_callback), tail]
+        self._index = 0
+        self._offset = 0
+        self.total_size = len(head) + file_size + len(tail)
+
+    def __len__(self):
+        return self.total_size
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        out = b""
+        while len(out) < size and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            if isinstance(segment, bytes):
+                piece = segment[self._offset:self._offset + size - len(out)]
+                self._offset += len(piece)
+                if self._offset >= len(segment):
+                    self._index += 1
+                    self._offset = 0
+            else:
+                piece = segment.read(size - len(out))
+                if not piece:
+                    self._index += 1
+            out += piece
+        return out
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def print_upload_progress(label: str):
+    """
+    Returns a progress callback that prints every 25% of the transfer.
+    """
+    state = {"last": -1}
+
+    def callback(sent, total):
+        if not total:
+            return
+        quarter = int(sent * 4 / total)
+        if quarter != state["last"]:
+            state["last"] = quarter
+            print(f"      ⬆️ {label}: {sent * 100 // total}% ({sent}/{total} bytes)", flush=True)
+
+    return callback
@@ -37,6 +37,7 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 ASSETS_DIR = os.path.join(BASE_DIR, "assets", "shopify-template")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 TEMP_DIR = os.path.join(BASE_DIR, "temp_theme_build")
+CACHE_DIR = os.path.join(BASE_DIR, ".theme_cache")
 
 # Mappings
 FOOTER_JSON_PATH = "sections/footer-group.json"
@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+
+# Bump when the cache layout changes so stale entries are ignored
+COLOR_CACHE_FORMAT_VERSION = 3
+DEFAULT_MAX_ENTRIES = 512
+
+
+def color_schema_key(primary_color: str, description: str, color_schemes_blocks: list,
+                     engine: str, engine_version: int, accent_hues: list = None) -> str:
+    """
+    SHA-256 over everything that determines a generated schema: the primary color,
+    the theme description, the base color_schemes (canonical JSON, so formatting
+    and the rest of settings_data.json do not matter) and the engine + its version.
+    accent_hues (image hue families, see image_palette.accent_hue_buckets) are
+    coarse on purpose: other shots of the same product map to the same key.
+    """
+    payload = json.dumps({
+        "format": COLOR_CACHE_FORMAT_VERSION,
+        "primary": primary_color.strip().lower(),
+        "description": description,
+        "schemes": color_schemes_blocks,
+        "engine": engine,
+        "engine_version": engine_version,
+        "accent_hues": list(accent_hues or []),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ColorSchemaCache:
+    """
+    Final (text-rule enforced) color_schemes blocks on disk, one JSON file per key.
+    Eviction is LRU: a hit refreshes the file's mtime, and writes beyond
+    max_entries remove the least recently used files.
+    """
+    def __init__(self, cache_dir: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key[:40]}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry.get("key") != key:
+                return None
+            os.utime(path)
+            return entry["blocks"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None
+
+    def put(self, key: str, blocks: list):
+        path = self._path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "blocks": blocks}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError as e:
+            print(f"   ⚠️ Could not persist color schema cache entry: {e}")
+
+    def evict(self) -> int:
+        """Removes the least recently used entries beyond max_entries. Returns the number removed."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        entries.sort(reverse=True)
+        removed = 0
+        for _, path in entries[self.max_entries:]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
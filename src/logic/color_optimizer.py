@@ -1,10 +1,35 @@
+import copy
 import json
 import os
 import re
 import base64
 import traceback
+import numpy as np
 from typing import Dict, Any, List
+from pydantic import BaseModel, Field
 from src.clients.openai_client import client
+from src.logic.theme_document import ThemeDocument
+from src.logic import jsonc
+from src.logic.palette_engine import recolor_schemes, classify_scheme
+from src.logic.contrast_engine import audit_color_schemes, HEX_COLOR, hex_array, relative_luminance, contrast_ratios
+from src.logic.color_cache import ColorSchemaCache, color_schema_key
+from src.logic.palette_library import PaletteLibrary, load_or_build_library, LIBRARY_FORMAT_VERSION, DEFAULT_LIBRARY_PATH
+from src.logic.image_palette import analyze_images, describe_image_colors, accent_hue_buckets
+
+COLOR_ENGINES = ("local", "library", "llm")
+# Bump an engine's version when its output changes (palette rules, prompt...) to invalidate cached schemas
+COLOR_ENGINE_VERSIONS = {"local": 1, "library": LIBRARY_FORMAT_VERSION, "llm": 1}
+
+GRADIENT_VALUE = re.compile(r'^(?:linear|radial)-gradient\([^;{}]*\)$')
+
+# --- STRUCTURED DATA CLASSES ---
+class ColorChange(BaseModel):
+    scheme: str = Field(..., description="Existing scheme name, e.g. scheme-1")
+    key: str = Field(..., description="Existing setting key in that scheme, e.g. background")
+    value: str = Field(..., description="New #rrggbb color, or a CSS linear-gradient for gradient keys")
+
+class ColorPatch(BaseModel):
+    changes: list[ColorChange] = Field(..., description="Only the settings that change")
 
 # ==============================================================================
 # 1. UTILITIES & MATH
@@ -20,133 +45,222 @@ def encode_image_to_base64(image_path: str) -> str:
     except Exception:
         return ""
 
-def hex_to_rgb(hex_color: str) -> tuple:
+def find_color_schemes(schema_json: dict) -> list:
     """
-    Converts hex string (e.g. #ffffff) to RGB tuple (255, 255, 255).
+    Returns every color_schemes block of a settings schema: top-level ones
+    and the one under "current" (as stored in settings_data.json).
     """
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-
-def calculate_luminance(rgb: tuple) -> float:
+    blocks = []
+    if isinstance(schema_json.get("color_schemes"), dict):
+        blocks.append(schema_json["color_schemes"])
+    current = schema_json.get("current")
+    if isinstance(current, dict) and isinstance(current.get("color_schemes"), dict):
+        blocks.append(current["color_schemes"])
+    return blocks
+
+def summarize_sections(template_content: str) -> str:
     """
-    Calculates the relative luminance of a color to determine if it is light or dark.
-    Uses standard W3C formula.
+    One line per section of a template ("id: type, color_scheme"), in page order.
+    Enough for the model to see how schemes are used, at a fraction of the tokens.
     """
-    def linearize(channel):
-        channel = channel / 255.0
-        if channel <= 0.03928:
-            return channel / 12.92
-        else:
-            return pow((channel + 0.055) / 1.055, 2.4)
-
-    r, g, b = rgb
-    return 0.2126 * linearize(r) + 0.7152 * linearize(g) + 0.0722 * linearize(b)
-
-def is_dark_color(hex_color: str) -> bool:
+    try:
+        template = jsonc.loads(template_content) if template_content else {}
+    except json.JSONDecodeError:
+        return "(unavailable)"
+    sections = template.get("sections", {}) if isinstance(template, dict) else {}
+    order = [s for s in template.get("order", []) if s in sections] + [s for s in sections if s not in template.get("order", [])]
+    lines = []
+    for section_id in order:
+        section = sections[section_id]
+        if not isinstance(section, dict):
+            continue
+        settings = section.get("settings", {})
+        scheme = settings.get("color_scheme", settings.get("color_scheme_1", "-"))
+        lines.append(f"{section_id}: {section.get('type', '?')}, {scheme}")
+    return "\n".join(lines) or "(no sections)"
+
+def validate_color_patch(patch: ColorPatch, blocks: list) -> dict:
     """
-    Returns True if the color is considered dark (luminance < 0.18).
+    Turns the model's changes into {scheme: {key: value}}, keeping only known
+    schemes and keys and values of the right shape (hex, or a gradient for gradient keys).
     """
-    try:
-        rgb = hex_to_rgb(hex_color)
-        luminance = calculate_luminance(rgb)
-        return luminance < 0.18
-    except:
-        # Fallback to assuming it's light if invalid hex
-        return False
-
-def enforce_text_color_rules(schema_json: dict, theme_color: str) -> dict:
+    valid = {}
+    rejected = 0
+    for change in patch.changes:
+        settings = next((b[change.scheme].get("settings", {}) for b in blocks if change.scheme in b), None)
+        value = change.value.strip()
+        if change.key.endswith("gradient"):
+            shape_ok = value == "" or GRADIENT_VALUE.match(value) is not None
+        else:
+            shape_ok = HEX_COLOR.fullmatch(value) is not None
+        if settings is None or change.key not in settings or not shape_ok:
+            rejected += 1
+            continue
+        valid.setdefault(change.scheme, {})[change.key] = value
+    if rejected:
+        print(f"   ⚠️ Ignored {rejected} invalid color changes from the model")
+    return valid
+
+def apply_color_patch(blocks: list, patch: dict) -> int:
+    """Applies {scheme: {key: value}} to every color_schemes block. Returns the number of values written."""
+    written = 0
+    for color_schemes in blocks:
+        for scheme_name, changes in patch.items():
+            settings = color_schemes.get(scheme_name, {}).get("settings")
+            if settings is None:
+                continue
+            for key, value in changes.items():
+                if key in settings:
+                    settings[key] = value
+                    written += 1
+    return written
+
+def replace_color_schemes(blocks: list, new_blocks: list):
+    """Overwrites each color_schemes block in place, so parsed documents (see ThemeDocument) see the change."""
+    for color_schemes, new_schemes in zip(blocks, new_blocks):
+        color_schemes.clear()
+        color_schemes.update(new_schemes)
+
+def enforce_text_color_rules(schema_json: dict, theme_color: str, report: bool = True) -> dict:
     """
     Post-process the schema to enforce strict text color rules (Accessibility).
-    - Dark Background -> White Text
-    - Light Background -> Black Text
-    - Button Labels -> Contrast against Button Background
+    Text and button labels become black or white, whichever has the higher
+    worst-case WCAG contrast against the background (and every gradient stop)
+    or the button they sit on. All schemes are audited in one vectorized pass.
     """
-    if "color_schemes" not in schema_json:
+    blocks = find_color_schemes(schema_json)
+    if not blocks:
         return schema_json
 
-    for scheme_name, scheme_data in schema_json["color_schemes"].items():
-        settings = scheme_data.get("settings", {})
-
-        if "text" in settings and "background" in settings:
-            background_color = settings["background"]
-
-            # 1. Enforce Black/White Text based on background
-            if is_dark_color(background_color):
-                settings["text"] = "#ffffff"
-            else:
-                settings["text"] = "#000000"
-
-            # 2. Button Labels
-            if "button" in settings:
-                btn_bg = settings["button"]
-                if "button_label" in settings:
-                    settings["button_label"] = "#ffffff" if is_dark_color(btn_bg) else "#000000"
-
-            # 3. Secondary Button Labels (Outline buttons usually)
-            if "secondary_button_label" in settings:
-                # Usually matches text color
-                settings["secondary_button_label"] = settings["text"]
-
+    audit = audit_color_schemes(blocks)
+    if report:
+        audit.print_report()
+    audit.apply()
     return schema_json
 
-def clean_json_response(response_text: str) -> str:
-    """
-    Strips Markdown code blocks if present in GPT response.
-    """
-    if "```json" in response_text:
-        start_marker = "```json"
-        end_marker = "```"
-        start_idx = response_text.find(start_marker)
-        if start_idx != -1:
-            start_idx += len(start_marker)
-            end_idx = response_text.find(end_marker, start_idx)
-            if end_idx != -1:
-                response_text = response_text[start_idx:end_idx]
-
-    response_text = response_text.replace("```", "").strip()
-    return response_text
-
 # ==============================================================================
 # 2. GENERATION LOGIC
 # ==============================================================================
 
+def generate_local_color_schemas(original_color_schema, theme_primary_color: str,
+                                 accent_hues: list = None, library: PaletteLibrary = None) -> dict:
+    """
+    Generates the new color schema locally: every scheme is re-colored from the
+    primary color with OKLCH harmony rules (see palette_engine), or from the
+    nearest precomputed palette when a PaletteLibrary is given, using accent_hues
+    (e.g. image_palette.accent_hue_buckets) when given, then the text
+    rules are enforced. Deterministic and free; no network call.
+    original_color_schema is settings text or parsed settings (modified in place).
+    Returns the parsed settings. Raises ValueError when there are no color_schemes.
+    """
+    schema_json = jsonc.loads(original_color_schema) if isinstance(original_color_schema, str) else original_color_schema
+    blocks = find_color_schemes(schema_json)
+    if not blocks:
+        raise ValueError("No color_schemes found in schema")
+    surfaces = library.surfaces_for(theme_primary_color) if library is not None else None
+    for color_schemes in blocks:
+        recolor_schemes(color_schemes, theme_primary_color, accent_hues, surfaces)
+    schema_json = enforce_text_color_rules(schema_json, theme_primary_color)
+    print(f"   🎨 Local palette applied to {sum(len(b) for b in blocks)} color schemes.")
+    return schema_json
+
 def generate_new_color_schemas(
-    original_color_schema: str,
+    original_color_schema,
     theme_primary_color: str,
     theme_description: str,
     index_json_path: str,
-    images_folder_path: str
-) -> str:
+    images_folder_path: str = None,
+    index_json_content: str = None,
+    image_paths: list = None,
+    engine: str = "local",
+    send_images: bool = False,
+    image_accents: bool = False,
+    cache: ColorSchemaCache = None,
+    palette_library_path: str = None
+) -> dict:
     """
-    Generates a brand new color schema JSON using GPT-4o.
-    Uses the EXACT prompt from the original notebook.
+    Generates a brand new color schema.
+    original_color_schema is the settings_data.json text, or its parsed data (e.g.
+    ThemeDocument.data) whose color_schemes are updated in place, and only once
+    generation succeeded, so comments and formatting survive. Returns the parsed settings.
+    engine="local" (default) derives it from the primary color with the palette engine;
+    engine="library" shifts the nearest palette of the precomputed library at
+    palette_library_path (built on first use) onto the primary color;
+    engine="llm" uses GPT-4o with the EXACT prompt from the original notebook.
+    index_json_content (e.g. from a ThemeDocument) skips re-reading index_json_path.
+    With image_accents=True the images (image_paths, which takes precedence over
+    listing images_folder_path) are reduced locally to their accent hue families,
+    which color the accent schemes; the LLM also gets their dominant/accent colors.
+    The raw images are only attached to the LLM request with send_images=True.
+    With a ColorSchemaCache, results are reused across jobs with the same primary
+    color, description, base color_schemes and engine version (plus the accent hue
+    families with image_accents=True, which are stable across shots of a product).
+    Requests that attach raw images (send_images=True) are not cached.
+    Raises on failure (no color_schemes, engine or API error); callers fall back
+    to plain hex replacement (see theme_utils.replace_colors_in_json_files).
     """
+    settings = jsonc.loads(original_color_schema) if isinstance(original_color_schema, str) else original_color_schema
+    target_blocks = find_color_schemes(settings)
+    if not target_blocks:
+        raise ValueError("No color_schemes found in schema")
+    # Engines work on a copy; the settings are only changed once generation succeeded
+    schema_json = copy.deepcopy(settings)
+    blocks = find_color_schemes(schema_json)
+
+    if image_paths is None and images_folder_path and os.path.exists(images_folder_path):
+        image_paths = [os.path.join(images_folder_path, f) for f in os.listdir(images_folder_path)]
+    valid_files = [p for p in (image_paths or []) if p.lower().endswith(('.png', '.jpg'))]
+    image_colors = analyze_images(valid_files) if image_accents else []
+    accent_hues = accent_hue_buckets(image_colors)
+    if image_colors:
+        print(f"   🖼️ Extracted colors from {len(image_colors)} images (accent hues: {accent_hues or 'none'}).")
+
+    cache_key = None
+    if cache is not None and not (engine == "llm" and send_images and valid_files):
+        cache_key = color_schema_key(theme_primary_color, theme_description, blocks, engine,
+                                     COLOR_ENGINE_VERSIONS.get(engine, 0), accent_hues)
+        cached = cache.get(cache_key)
+        if cached is not None and len(cached) == len(blocks):
+            replace_color_schemes(target_blocks, cached)
+            print(f"   ⚡ Color schema served from cache ({cache_key[:12]}).")
+            return settings
+
+    if engine in ("local", "library"):
+        library = load_or_build_library(palette_library_path or DEFAULT_LIBRARY_PATH) if engine == "library" else None
+        generate_local_color_schemas(schema_json, theme_primary_color, accent_hues, library)
+        replace_color_schemes(target_blocks, blocks)
+        if cache_key:
+            cache.put(cache_key, blocks)
+        return settings
 
     # 1. Read Inputs
-    try:
-        with open(index_json_path, 'r', encoding='utf-8') as f:
-            index_json_content = f.read()
-    except Exception:
-        index_json_content = "{}"
+    if index_json_content is None:
+        try:
+            with open(index_json_path, 'r', encoding='utf-8') as f:
+                index_json_content = f.read()
+        except Exception:
+            index_json_content = "{}"
+
+    # Only the color_schemes subtree goes to the model; its answer is merged back locally
+    color_schemes_json = json.dumps({"color_schemes": blocks[-1]}, separators=(",", ":"), ensure_ascii=False)
+    section_summary = summarize_sections(index_json_content)
 
-    # 2. Prepare Images context
+    # 2. Prepare Images context (raw images are opt-in; their colors are always sent)
     # NOTEBOOK FAITHFULNESS: Changed [:3] back to [:6]
     image_contents = []
-    if os.path.exists(images_folder_path):
-        valid_files = [f for f in os.listdir(images_folder_path) if f.lower().endswith(('.png', '.jpg'))]
-        for img_file in valid_files[:6]:
-            b64 = encode_image_to_base64(os.path.join(images_folder_path, img_file))
-            if b64:
-                image_contents.append({
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{b64}"}
-                })
+    for img_path in (valid_files[:6] if send_images else []):
+        b64 = encode_image_to_base64(img_path)
+        if b64:
+            image_contents.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:image/png;base64,{b64}"}
+            })
 
     # 3. Prompt Construction (EXACT COPY FROM NOTEBOOK)
     messages = [
         {
             "role": "system",
-            "content": "You are a precise JSON generator and expert color designer for e-commerce themes. You MUST follow strict text color rules. Always return raw JSON without markdown formatting or explanations."
+            "content": "You are an expert color designer for e-commerce themes. You MUST follow strict text color rules. You answer with a patch listing only the color settings to change."
         },
         {
             "role": "user",
@@ -154,16 +268,19 @@ def generate_new_color_schemas(
                 {
                     "type": "text",
                     "text": f"""
-You are an expert color designer for e-commerce themes. Generate a new color schema JSON based on the original schema, adapted to a new theme.
+You are an expert color designer for e-commerce themes. Adapt the original color schemes to a new theme.
 
-ORIGINAL COLOR SCHEMAS (use this EXACT format for output, including all keys and structure):
-{original_color_schema}
+ORIGINAL COLOR SCHEMAS (scheme names and setting keys you may change):
+{color_schemes_json}
 
 NEW PRIMARY COLOR: {theme_primary_color}
 THEME DESCRIPTION: {theme_description}
 
-HOME PAGE STRUCTURE (index.json):
-{index_json_content}
+HOME PAGE SECTIONS (section id: type, color scheme):
+{section_summary}
+
+PRODUCT IMAGE COLORS (dominant / accent colors and average luminance of the product images):
+{describe_image_colors(image_colors)}
 
 *** CRITICAL TEXT COLOR RULES - ABSOLUTE REQUIREMENT - ZERO TOLERANCE ***
 
@@ -186,16 +303,15 @@ BUTTON LABELS:
 
 OTHER COLORS (backgrounds, buttons, gradients):
 - These CAN and SHOULD use the theme color and harmonious palette
-- Create vibrant, cohesive palette matching theme description and images
+- Create vibrant, cohesive palette matching theme description and product image colors
 - Use CSS linear-gradient format for gradients
 
-STRUCTURE REQUIREMENTS:
-- Keep ALL existing scheme names exactly the same
-- Do NOT add or remove schemes
-- Update ALL hex colors and gradients to fit the new theme
+PATCH REQUIREMENTS:
+- One change per (scheme, key) whose value should change: {{"scheme", "key", "value"}}
+- Use ONLY existing scheme names and existing setting keys
+- Values are #rrggbb hex colors; gradient keys take a CSS linear-gradient (or "" for none)
+- Update every color and gradient that should fit the new theme
 - Ensure accessibility and contrast
-
-Return ONLY the JSON object - no markdown, no explanations, just raw JSON.
 """
                 }
             ] + image_contents
@@ -203,124 +319,224 @@ Return ONLY the JSON object - no markdown, no explanations, just raw JSON.
     ]
 
     try:
-        print("   🧠 Sending Color Schema Request to OpenAI...")
-        # Call GPT-4o
-        response = client.chat.completions.create(
+        print(f"   🧠 Sending Color Schema Request to OpenAI ({len(color_schemes_json) + len(section_summary)} chars of theme context)...")
+        # Call GPT-4o with a structured patch as output: a few hundred tokens instead of a full document
+        completion = client.beta.chat.completions.parse(
             model="gpt-4o",
             messages=messages,
             temperature=0.1,
-            max_tokens=15000, # Keep high token limit for massive JSON
-            response_format={"type": "json_object"}
+            max_tokens=3000,
+            response_format=ColorPatch
         )
 
-        raw_text = response.choices[0].message.content
-        
+        message = completion.choices[0].message
+        if message.parsed is None:
+            raise ValueError(f"OpenAI returned no patch ({message.refusal or 'empty response'})")
+
         # --- DEBUG LOGGING ---
-        print(f"\n--- [OPENAI COLOR LOG START] ---\n{raw_text}\n--- [OPENAI COLOR LOG END] ---\n")
+        print(f"\n--- [OPENAI COLOR LOG START] ---\n{message.parsed.model_dump_json(indent=2)}\n--- [OPENAI COLOR LOG END] ---\n")
         # ---------------------
 
-        if not raw_text:
-            raise ValueError("OpenAI returned empty content")
-
-        clean_text = clean_json_response(raw_text)
-
-        # Parse and Enforce Rules in Python to be safe
-        schema_json = json.loads(clean_text)
-        schema_json = enforce_text_color_rules(schema_json, theme_primary_color)
+        # Apply to the full settings, then Enforce Rules in Python to be safe
+        patch = validate_color_patch(message.parsed, blocks)
+        written = apply_color_patch(blocks, patch)
+        if not written:
+            raise ValueError("Patch contained no applicable color changes")
+        print(f"   ✅ Applied {written} color changes from the model.")
+        enforce_text_color_rules(schema_json, theme_primary_color)
+        replace_color_schemes(target_blocks, blocks)
+        if cache_key:
+            cache.put(cache_key, blocks)
 
-        return json.dumps(schema_json, indent=2)
+        return settings
 
     except Exception as e:
         print(f"   ❌ Color Generation Error: {str(e)}")
         traceback.print_exc()
-        # Fallback: Return original but with simple replacement
-        return original_color_schema.replace("#7069bc", theme_primary_color)
-
-def fix_color_schema(json_string):
-    """
-    Sanitizes JSON string if formatting is slightly off.
-    """
-    try:
-        # Try round trip to normalize formatting
-        return json.dumps(json.loads(json_string), indent=2)
-    except:
-        return json_string
+        raise
 
 # ==============================================================================
 # 3. OPTIMIZER CLASS (Contextual Analysis)
 # ==============================================================================
 
 class ShopifyColorSchemeOptimizer:
-    def __init__(self):
-        pass
+    """
+    Assigns a color scheme to every section of a set of templates in one pass.
+    For each template, a Viterbi pass over the sections in page order minimizes:
+    - low text contrast (the scheme's text against its background),
+    - a mismatch with the scheme role the section type prefers,
+    - adjacent sections with identical or near-identical backgrounds,
+    - changes from the current assignment (a small cost that keeps diffs minimal).
+    The result is a diff; nothing is written until apply_diff().
+    """
+    SCHEME_KEYS = ("color_scheme", "color_scheme_1")
+
+    # Section type -> preferred scheme roles (see palette_engine.classify_scheme)
+    TYPE_ROLE_PREFERENCES = {
+        "image-banner": ("base", "tint"),       # Hero Banner -> light, quiet background
+        "multicolumn": ("base", "tint"),        # Columns -> Standard background
+        "featured-collection": ("base",),
+        "rich-text": ("accent",),               # Text block -> Accent for emphasis
+        "image-with-text": ("dark", "accent"),  # Split -> Inverse for style
+    }
+
+    DEFAULT_WEIGHTS = {
+        "contrast": 1.0,       # times (1 - ratio / 21)
+        "role": 1.0,           # section type prefers another role
+        "same_background": 4.0,
+        "similar_background": 2.0,  # scaled by how close the luminances are, below the threshold
+        "change": 0.05,
+    }
+    SIMILAR_LUMINANCE = 0.05
+
+    def __init__(self, weights: dict = None):
+        self.weights = {**self.DEFAULT_WEIGHTS, **(weights or {})}
 
     def extract_color_schemes(self, color_schemas: dict) -> dict:
         """
-        Parses available schemes to know which are dark/light.
+        Parses available schemes: colors, role, background luminance and the
+        contrast of the scheme's text against its background.
         """
+        blocks = find_color_schemes(color_schemas)
         schemes = {}
-        for name, data in color_schemas.get("color_schemes", {}).items():
+        for name, data in (blocks[-1] if blocks else {}).items():
             s = data.get("settings", {})
+            background = s.get("background", "#ffffff")
+            text = s.get("text", "#000000")
             schemes[name] = {
-                "background": s.get("background", "#ffffff"),
-                "text": s.get("text", "#000000"),
-                "button": s.get("button", "#000000")
+                "background": background if HEX_COLOR.fullmatch(str(background)) else "#ffffff",
+                "text": text if HEX_COLOR.fullmatch(str(text)) else "#000000",
+                "button": s.get("button", "#000000"),
             }
+        if not schemes:
+            return schemes
+
+        luminance = relative_luminance(hex_array([s["background"] for s in schemes.values()]))
+        contrast = contrast_ratios(luminance, relative_luminance(hex_array([s["text"] for s in schemes.values()])))
+        for (name, scheme), lum, ratio in zip(schemes.items(), luminance, contrast):
+            scheme["luminance"] = float(lum)
+            scheme["contrast"] = float(ratio)
+            scheme["role"] = classify_scheme(scheme["background"])
         return schemes
 
-    def optimize_theme_colors(self, color_schemas: str, json_file_path: str, images_folder: str):
+    def _costs(self, schemes: dict):
+        """Per-scheme cost terms shared by every template: (contrast cost (k,), transition (k, k))."""
+        names = list(schemes)
+        contrast = np.array([schemes[n]["contrast"] for n in names])
+        luminance = np.array([schemes[n]["luminance"] for n in names])
+        backgrounds = np.array([schemes[n]["background"].lower() for n in names])
+
+        contrast_cost = self.weights["contrast"] * (1 - contrast / 21.0)
+        closeness = np.clip(1 - np.abs(luminance[:, None] - luminance[None, :]) / self.SIMILAR_LUMINANCE, 0, 1)
+        transition = self.weights["similar_background"] * closeness
+        transition = np.where(backgrounds[:, None] == backgrounds[None, :], self.weights["same_background"], transition)
+        return contrast_cost, transition
+
+    def _scheme_slot(self, section: dict):
+        settings = section.get("settings")
+        if not isinstance(settings, dict):
+            return None
+        return next((key for key in self.SCHEME_KEYS if key in settings), None)
+
+    def _solve(self, sections: list, schemes: dict, contrast_cost, transition) -> list:
+        """Viterbi over one run of adjacent sections. Returns the chosen scheme name per section."""
+        names = list(schemes)
+        roles = [schemes[n]["role"] for n in names]
+        unary = np.tile(contrast_cost, (len(sections), 1))
+        for i, (section, key) in enumerate(sections):
+            preferred = self.TYPE_ROLE_PREFERENCES.get(section.get("type", ""))
+            if preferred:
+                unary[i] += self.weights["role"] * np.array([role not in preferred for role in roles])
+            unary[i] += self.weights["change"] * np.array([name != section["settings"][key] for name in names])
+
+        cost = unary[0]
+        back = []
+        for i in range(1, len(sections)):
+            total = cost[:, None] + transition
+            best_previous = total.argmin(axis=0)
+            cost = total[best_previous, np.arange(len(names))] + unary[i]
+            back.append(best_previous)
+        choice = [int(cost.argmin())]
+        for best_previous in reversed(back):
+            choice.append(int(best_previous[choice[-1]]))
+        return [names[j] for j in reversed(choice)]
+
+    def optimize_templates(self, color_schemas, document: ThemeDocument, template_paths: list) -> list:
+        """
+        Plans the scheme of every section in the given templates (loaded through the
+        document) in one pass. Returns the diff as
+        [{"file", "section", "key", "old", "new"}, ...]; nothing is modified.
+        """
+        if isinstance(color_schemas, str):
+            color_schemas = jsonc.loads(color_schemas)
+        schemes = self.extract_color_schemes(color_schemas)
+        if not schemes:
+            print("   ⚠️ No color schemes to assign.")
+            return []
+        contrast_cost, transition = self._costs(schemes)
+
+        diff = []
+        for path in template_paths:
+            try:
+                template_data = document.data(path)
+            except Exception as e:
+                print(f"❌ Failed to load JSON for optimization: {e}")
+                continue
+            sections = template_data.get("sections", {}) if isinstance(template_data, dict) else {}
+            order = [s for s in template_data.get("order", []) if s in sections] + \
+                    [s for s in sections if s not in template_data.get("order", [])]
+
+            # Runs of consecutive sections with a scheme setting; a section without one breaks adjacency
+            runs, run = [], []
+            for section_id in order:
+                section = sections[section_id]
+                if not isinstance(section, dict) or section.get("disabled"):
+                    continue
+                key = self._scheme_slot(section)
+                if key is None:
+                    if run:
+                        runs.append(run)
+                    run = []
+                else:
+                    run.append((section_id, section, key))
+            if run:
+                runs.append(run)
+
+            for run in runs:
+                chosen = self._solve([(section, key) for _, section, key in run], schemes, contrast_cost, transition)
+                for (section_id, section, key), new_scheme in zip(run, chosen):
+                    if section["settings"][key] != new_scheme:
+                        diff.append({"file": document.rel(path), "section": section_id, "key": key,
+                                     "old": section["settings"][key], "new": new_scheme})
+
+        print(f"🎨 Color scheme assignment: {len(diff)} section changes across {len(template_paths)} templates")
+        return diff
+
+    @staticmethod
+    def apply_diff(document: ThemeDocument, diff: list) -> int:
+        """Applies a diff from optimize_templates to the in-memory document. Returns the number of changes."""
+        touched = set()
+        for change in diff:
+            sections = document.data(change["file"]).get("sections", {})
+            sections[change["section"]]["settings"][change["key"]] = change["new"]
+            touched.add(change["file"])
+        for path in touched:
+            document.touch(path)
+        return len(diff)
+
+    def optimize_theme_colors(self, color_schemas: str, json_file_path: str, images_folder: str,
+                              document: ThemeDocument = None):
         """
         Modifies index.json or product.json IN PLACE to use the best color scheme
-        for each section.
+        for each section (optimize_templates + apply_diff for one file).
+        With a ThemeDocument the template is edited in memory and written on document.flush().
         """
         print(f"🎨 Optimizing colors for {os.path.basename(json_file_path)}...")
-
-        try:
-            # Load the current template
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                template_data = json.load(f)
-
-            # We apply a logical heuristic optimization.
-            # We assign different schemes to break up the page visually.
-
-            if "sections" in template_data:
-                keys = list(template_data["sections"].keys())
-
-                for i, section_id in enumerate(keys):
-                    section = template_data["sections"][section_id]
-                    sType = section.get("type", "")
-
-                    new_scheme = None
-
-                    # Logic: Alternating or Specific based on type
-                    if sType == "image-banner":
-                        # Hero Banner -> Usually transparent or Scheme 1
-                        new_scheme = "background-1"
-                    elif sType == "rich-text":
-                        # Text block -> Use Accent scheme for emphasis
-                        new_scheme = "accent-1"
-                    elif sType == "multicolumn":
-                        # Columns -> Standard background
-                        new_scheme = "background-1"
-                    elif sType == "image-with-text":
-                        # Split -> Inverse for style
-                        new_scheme = "inverse"
-                    elif sType == "featured-collection":
-                        new_scheme = "background-1"
-
-                    # Apply if valid
-                    if new_scheme:
-                        if "settings" in section:
-                            # Only update if color_scheme key exists
-                            if "color_scheme" in section["settings"]:
-                                section["settings"]["color_scheme"] = new_scheme
-                            # Some themes use color_scheme_1
-                            elif "color_scheme_1" in section["settings"]:
-                                section["settings"]["color_scheme_1"] = new_scheme
-
-            # Save back the optimized file
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(template_data, f, indent=2)
-
-        except Exception as e:
-            print(f"❌ Failed to load JSON for optimization: {e}")
\ No newline at end of file
+        owns_document = document is None
+        if owns_document:
+            document = ThemeDocument(os.path.dirname(json_file_path))
+        diff = self.optimize_templates(color_schemas, document, [json_file_path])
+        self.apply_diff(document, diff)
+        if owns_document:
+            document.flush()
+        return diff
@@ -0,0 +1,164 @@
+import re
+import numpy as np
+
+# WCAG 2.x AA threshold for normal-size text
+AA_RATIO = 4.5
+TEXT_CANDIDATES = ("#000000", "#ffffff")
+
+HEX_COLOR = re.compile(r'#(?:[0-9a-fA-F]{6}|[0-9a-fA-F]{3})(?![0-9a-fA-F])')
+LUMA = np.array([0.2126, 0.7152, 0.0722])
+
+# What sits on which surface: text on the background and every gradient stop,
+# labels on the button
+ROLES = ("text", "button_label")
+
+
+def hex_array(colors) -> np.ndarray:
+    """List of #rrggbb / #rgb strings -> (N, 3) float array in 0..1."""
+    values = []
+    for color in colors:
+        digits = color[1:]
+        if len(digits) == 3:
+            digits = "".join(c * 2 for c in digits)
+        values.append(int(digits, 16))
+    packed = np.array(values, dtype=np.uint32).reshape(-1, 1)
+    return ((packed >> np.array([16, 8, 0], dtype=np.uint32)) & 0xFF) / 255.0
+
+def relative_luminance(rgb: np.ndarray) -> np.ndarray:
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return linear @ LUMA
+
+def contrast_ratios(lum_a: np.ndarray, lum_b: np.ndarray) -> np.ndarray:
+    """WCAG contrast ratio; broadcasts, so (N, 1) against (1, K) gives every pair."""
+    return (np.maximum(lum_a, lum_b) + 0.05) / (np.minimum(lum_a, lum_b) + 0.05)
+
+def _is_hex(value) -> bool:
+    return isinstance(value, str) and HEX_COLOR.fullmatch(value.strip()) is not None
+
+
+class ContrastAudit:
+    """
+    Contrast of every scheme in one vectorized pass. Each scheme has two groups:
+    "text" (against the background and all gradient stops) and "button_label"
+    (against the button). For each group the audit holds the current color's
+    worst-case ratio and the candidate whose worst-case ratio is highest.
+    """
+    def __init__(self, names: list, settings: list, candidates=TEXT_CANDIDATES, min_ratio: float = AA_RATIO):
+        self.names = names
+        self.settings = settings
+        self.candidates = list(candidates)
+        self.min_ratio = min_ratio
+
+        group_count = len(settings) * len(ROLES)
+        surface_groups, surface_colors, current = [], [], [None] * group_count
+        role_present = np.zeros(group_count, dtype=bool)
+        for i, scheme in enumerate(settings):
+            text_group, label_group = i * 2, i * 2 + 1
+            if _is_hex(scheme.get("background")):
+                surface_groups.append(text_group)
+                surface_colors.append(scheme["background"].strip())
+            gradient = scheme.get("background_gradient")
+            if isinstance(gradient, str):
+                for stop in HEX_COLOR.findall(gradient):
+                    surface_groups.append(text_group)
+                    surface_colors.append(stop)
+            if _is_hex(scheme.get("button")):
+                surface_groups.append(label_group)
+                surface_colors.append(scheme["button"].strip())
+            for group, role in ((text_group, "text"), (label_group, "button_label")):
+                role_present[group] = role in scheme
+                if _is_hex(scheme.get(role)):
+                    current[group] = scheme[role].strip()
+
+        self.has_surface = np.zeros(group_count, dtype=bool)
+        self.current = current
+        self.current_ratio = np.full(group_count, np.nan)
+        self.best_ratio = np.full(group_count, np.nan)
+        self.best_index = np.zeros(group_count, dtype=int)
+        if not surface_colors:
+            return
+
+        groups = np.array(surface_groups)
+        surface_lum = relative_luminance(hex_array(surface_colors))
+        self.has_surface[groups] = True
+        # Only roles the scheme defines are audited
+        self.has_surface &= role_present
+
+        # Worst case per (group, candidate) over the group's surfaces
+        candidate_ratios = contrast_ratios(surface_lum[:, None], relative_luminance(hex_array(self.candidates))[None, :])
+        worst = np.full((group_count, len(self.candidates)), np.inf)
+        np.minimum.at(worst, groups, candidate_ratios)
+        self.best_index = worst.argmax(axis=1)
+        self.best_ratio = np.where(self.has_surface, worst.max(axis=1), np.nan)
+
+        has_current = np.array([color is not None for color in current])
+        current_lum = np.full(group_count, np.nan)
+        if has_current.any():
+            current_lum[has_current] = relative_luminance(hex_array([c for c in current if c is not None]))
+        current_ratios = contrast_ratios(surface_lum, current_lum[groups])
+        worst_current = np.full(group_count, np.inf)
+        np.minimum.at(worst_current, groups, current_ratios)
+        self.current_ratio = np.where(self.has_surface & has_current, worst_current, np.nan)
+
+    def best_color(self, scheme_index: int, role: str) -> str:
+        group = scheme_index * 2 + ROLES.index(role)
+        return self.candidates[self.best_index[group]] if self.has_surface[group] else None
+
+    def apply(self) -> int:
+        """Writes the best text / label colors into the audited settings. Returns the number of values changed."""
+        changed = 0
+        for i, scheme in enumerate(self.settings):
+            text = self.best_color(i, "text")
+            if text and "text" in scheme:
+                changed += scheme["text"] != text
+                scheme["text"] = text
+                # Outline buttons sit on the background, like text
+                if "secondary_button_label" in scheme:
+                    changed += scheme["secondary_button_label"] != text
+                    scheme["secondary_button_label"] = text
+            label = self.best_color(i, "button_label")
+            if label and "button_label" in scheme:
+                changed += scheme["button_label"] != label
+                scheme["button_label"] = label
+        return changed
+
+    def rows(self) -> list:
+        """One dict per audited (scheme, role), for reports."""
+        rows = []
+        for group in np.flatnonzero(self.has_surface):
+            scheme_index, role_index = divmod(int(group), 2)
+            current_ratio = self.current_ratio[group]
+            rows.append({
+                "scheme": self.names[scheme_index],
+                "role": ROLES[role_index],
+                "current": self.current[group],
+                "current_ratio": None if np.isnan(current_ratio) else round(float(current_ratio), 2),
+                "current_passes": bool(current_ratio >= self.min_ratio),
+                "best": self.candidates[self.best_index[group]],
+                "best_ratio": round(float(self.best_ratio[group]), 2),
+            })
+        return rows
+
+    def failures(self) -> list:
+        return [row for row in self.rows() if not row["current_passes"]]
+
+    def print_report(self):
+        rows = self.rows()
+        failing = [row for row in rows if not row["current_passes"]]
+        print(f"   🔍 Contrast audit: {len(rows) - len(failing)} of {len(rows)} checks pass WCAG AA ({self.min_ratio}:1)")
+        for row in failing:
+            current = f"{row['current']} ({row['current_ratio']}:1)" if row["current"] else "missing"
+            print(f"      ⚠️ {row['scheme']} {row['role']}: {current} -> {row['best']} ({row['best_ratio']}:1)")
+
+
+def audit_color_schemes(blocks: list, candidates=TEXT_CANDIDATES, min_ratio: float = AA_RATIO) -> ContrastAudit:
+    """
+    Audits every scheme of one or more color_schemes blocks (from one palette
+    or many, e.g. a batch of generated palettes) in a single pass.
+    """
+    names, settings = [], []
+    for block_index, color_schemes in enumerate(blocks):
+        for scheme_name, scheme_data in color_schemes.items():
+            names.append(scheme_name if len(blocks) == 1 else f"{block_index}:{scheme_name}")
+            settings.append(scheme_data.get("settings", {}))
+    return ContrastAudit(names, settings, candidates, min_ratio)
@@ -0,0 +1,107 @@
+import os
+import math
+import numpy as np
+from PIL import Image
+from src.logic.contrast_engine import relative_luminance
+from src.logic.palette_engine import hex_to_oklch
+
+SAMPLE_SIZE = 64       # images are analyzed as (at most) 64x64 thumbnails
+CLUSTERS = 5
+ITERATIONS = 12
+MIN_ACCENT_SHARE = 0.03
+# Accent hues are reduced to hue families so they are stable across shots of a product
+ACCENT_HUE_BUCKET = 45      # degrees -> 8 families
+MIN_ACCENT_CHROMA = 0.04    # OKLCH; grayer accents have no meaningful hue
+MIN_ACCENT_SUPPORT = 0.5    # share of images a family must appear in
+MAX_ACCENT_HUES = 2
+
+
+def _to_hex(rgb) -> str:
+    return "#" + "".join(f"{int(round(c)):02x}" for c in np.clip(rgb, 0, 255))
+
+def _pixels(image_path: str) -> np.ndarray:
+    """Downsampled, opaque pixels of an image as an (N, 3) float array."""
+    with Image.open(image_path) as image:
+        image.draft("RGB", (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))  # JPEG: decode at reduced size
+        image = image.convert("RGBA")
+        image.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+        data = np.asarray(image, dtype=np.float64).reshape(-1, 4)
+    opaque = data[data[:, 3] >= 128, :3]
+    return opaque if len(opaque) else data[:, :3]
+
+def kmeans(pixels: np.ndarray, k: int = CLUSTERS, iterations: int = ITERATIONS):
+    """
+    Deterministic k-means: centers start at brightness quantiles, then every
+    iteration assigns all pixels at once. Returns (centers, share of pixels per center).
+    """
+    order = np.argsort(pixels.sum(axis=1))
+    k = min(k, len(pixels))
+    centers = pixels[order[(np.arange(k) * 2 + 1) * len(pixels) // (2 * k)]].copy()
+    for _ in range(iterations):
+        labels = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, pixels)
+        filled = counts > 0
+        new_centers = centers.copy()
+        new_centers[filled] = sums[filled] / counts[filled, None]
+        if np.allclose(new_centers, centers, atol=0.5):
+            centers = new_centers
+            break
+        centers = new_centers
+    labels = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    return centers, np.bincount(labels, minlength=k) / len(pixels)
+
+def analyze_image(image_path: str) -> dict:
+    """
+    Dominant color (largest cluster), accent color (most saturated remaining
+    cluster with a visible share) and average relative luminance of an image.
+    """
+    pixels = _pixels(image_path)
+    centers, shares = kmeans(pixels)
+    dominant = int(shares.argmax())
+    saturation = centers.max(axis=1) - centers.min(axis=1)
+    candidates = [i for i in range(len(centers)) if i != dominant and shares[i] >= MIN_ACCENT_SHARE]
+    accent = max(candidates, key=lambda i: saturation[i]) if candidates else None
+    return {
+        "image": os.path.basename(image_path),
+        "dominant": _to_hex(centers[dominant]),
+        "accent": _to_hex(centers[accent]) if accent is not None else None,
+        "luminance": round(float(relative_luminance(pixels / 255.0).mean()), 3),
+    }
+
+def analyze_images(image_paths: list, max_images: int = 6) -> list:
+    """analyze_image for the first max_images readable images; unreadable ones are skipped."""
+    results = []
+    for image_path in (image_paths or [])[:max_images]:
+        try:
+            results.append(analyze_image(image_path))
+        except Exception as e:
+            print(f"   ⚠️ Could not analyze {os.path.basename(image_path)}: {e}")
+    return results
+
+def describe_image_colors(image_colors: list) -> str:
+    """Compact text for prompts: one line per image."""
+    lines = []
+    for i, colors in enumerate(image_colors, 1):
+        accent = f", accent {colors['accent']}" if colors["accent"] else ""
+        lines.append(f"image {i}: dominant {colors['dominant']}{accent}, luminance {colors['luminance']}")
+    return "\n".join(lines) or "(no images)"
+
+def accent_hue_buckets(image_colors: list) -> list:
+    """
+    Hue families (bucket centers in degrees) of the images' accent colors that
+    appear in at least half of the images, most frequent first. Different shots
+    of the same product give the same result, so it can be part of a cache key.
+    """
+    counts = {}
+    for colors in image_colors:
+        if not colors["accent"]:
+            continue
+        L, C, h = hex_to_oklch(colors["accent"])
+        if C >= MIN_ACCENT_CHROMA:
+            family = int(round(h / ACCENT_HUE_BUCKET)) % (360 // ACCENT_HUE_BUCKET)
+            counts[family] = counts.get(family, 0) + 1
+    support = max(1, math.ceil(len(image_colors) * MIN_ACCENT_SUPPORT))
+    families = sorted((f for f, n in counts.items() if n >= support), key=lambda f: (-counts[f], f))
+    return [f * ACCENT_HUE_BUCKET for f in families[:MAX_ACCENT_HUES]]
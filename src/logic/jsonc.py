@@ -0,0 +1,222 @@
+import re
+import json
+from json.decoder import scanstring
+
+# One alternation covering every lexical element of JSON with comments; leading
+# whitespace is absorbed into each match. Strings are matched as a whole, so "/*"
+# inside a value is never taken for a comment.
+TOKEN = re.compile(r'''
+    \s*(?:
+    (?P<comment>/\*[\s\S]*?\*/|//[^\n]*)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<punct>[{}\[\]:,])
+  | (?P<number>-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<literal>true|false|null)
+  | (?P<end>$))
+''', re.VERBOSE)
+
+# Strings and comments only: enough to strip comments at C speed
+STRING_OR_COMMENT = re.compile(r'"(?:[^"\\]|\\.)*"|/\*[\s\S]*?\*/|//[^\n]*')
+
+LITERALS = {"true": True, "false": False, "null": None}
+
+
+class JSONCDecodeError(json.JSONDecodeError):
+    pass
+
+
+def tokenize(text: str, keep_comments: bool = False):
+    """Yields (kind, start, end) for every token; whitespace (and comments unless kept) is skipped."""
+    position = 0
+    match_token = TOKEN.match
+    while True:
+        match = match_token(text, position)
+        if not match:
+            raise JSONCDecodeError("Unexpected character", text, position)
+        kind = match.lastgroup
+        if kind == "end":
+            return
+        if kind != "comment" or keep_comments:
+            yield kind, match.start(kind), match.end()
+        position = match.end()
+
+
+class Node:
+    """Where a parsed value sits in the source text; containers keep their children."""
+    __slots__ = ("start", "end", "value", "children")
+
+    def __init__(self, start: int, end: int, value=None, children=None):
+        self.start = start
+        self.end = end
+        self.value = value  # scalars only
+        self.children = children  # dict: {key: Node}, list: [Node]
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = list(tokenize(text))
+        self.index = 0
+
+    def _next(self):
+        if self.index >= len(self.tokens):
+            raise JSONCDecodeError("Unexpected end of document", self.text, len(self.text))
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def _peek_punct(self, char: str) -> bool:
+        if self.index < len(self.tokens):
+            kind, start, end = self.tokens[self.index]
+            return kind == "punct" and self.text[start] == char
+        return False
+
+    def _expect(self, char: str):
+        kind, start, end = self._next()
+        if kind != "punct" or self.text[start] != char:
+            raise JSONCDecodeError(f"Expecting '{char}'", self.text, start)
+        return end
+
+    def parse_document(self):
+        value, node = self.parse_value()
+        if self.index != len(self.tokens):
+            raise JSONCDecodeError("Extra data", self.text, self.tokens[self.index][1])
+        return value, node
+
+    def parse_value(self):
+        kind, start, end = self._next()
+        text = self.text
+        if kind == "string":
+            value = scanstring(text, start + 1)[0]
+            return value, Node(start, end, value)
+        if kind == "number":
+            raw = text[start:end]
+            value = float(raw) if any(c in raw for c in ".eE") else int(raw)
+            return value, Node(start, end, value)
+        if kind == "literal":
+            value = LITERALS[text[start:end]]
+            return value, Node(start, end, value)
+        if kind == "punct" and text[start] == "{":
+            return self._parse_object(start)
+        if kind == "punct" and text[start] == "[":
+            return self._parse_array(start)
+        raise JSONCDecodeError("Expecting value", text, start)
+
+    def _parse_object(self, start: int):
+        value, children = {}, {}
+        while not self._peek_punct("}"):
+            kind, key_start, key_end = self._next()
+            if kind != "string":
+                raise JSONCDecodeError("Expecting property name enclosed in double quotes", self.text, key_start)
+            key = scanstring(self.text, key_start + 1)[0]
+            self._expect(":")
+            value[key], children[key] = self.parse_value()
+            if not self._peek_punct(","):
+                break
+            self.index += 1  # a trailing comma before "}" is tolerated
+        end = self._expect("}")
+        return value, Node(start, end, children=children)
+
+    def _parse_array(self, start: int):
+        value, children = [], []
+        while not self._peek_punct("]"):
+            item, node = self.parse_value()
+            value.append(item)
+            children.append(node)
+            if not self._peek_punct(","):
+                break
+            self.index += 1
+        end = self._expect("]")
+        return value, Node(start, end, children=children)
+
+
+def loads(text: str):
+    """
+    Parses JSON with /* */ and // comments. Comments are removed in one
+    string-aware scan and the rest goes to the C parser; documents it rejects
+    (e.g. trailing commas) fall back to the tokenizing parser.
+    """
+    try:
+        return json.loads(strip_comments(text))
+    except json.JSONDecodeError:
+        return _Parser(text).parse_document()[0]
+
+
+def strip_comments(text: str) -> str:
+    """Removes comments outside of strings, leaving everything else byte-for-byte."""
+    parts = []
+    position = 0
+    for match in STRING_OR_COMMENT.finditer(text):
+        if match.group()[0] != '"':
+            parts.append(text[position:match.start()])
+            position = match.end()
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def string_value_spans(text: str):
+    """Yields (start, end) of every string literal that is a value (not an object key)."""
+    tokens = list(tokenize(text))
+    for i, (kind, start, end) in enumerate(tokens):
+        if kind != "string":
+            continue
+        if i + 1 < len(tokens) and tokens[i + 1][0] == "punct" and text[tokens[i + 1][1]] == ":":
+            continue
+        yield start, end
+
+
+class JsoncDocument:
+    """
+    A parsed JSONC file that remembers where every value came from.
+    dumps() diffs .data against the parse and rewrites only the spans that
+    changed, so comments, key order, spacing and untouched escapes survive.
+    """
+    def __init__(self, text: str, indent: int = 2):
+        self.text = text
+        self.indent = indent
+        self.data, self.root = _Parser(text).parse_document()
+
+    def _line_indent(self, position: int) -> str:
+        line_start = self.text.rfind("\n", 0, position) + 1
+        line = self.text[line_start:position]
+        return line[:len(line) - len(line.lstrip())]
+
+    def _render(self, value, position: int, indent: str = None) -> str:
+        rendered = json.dumps(value, indent=self.indent, ensure_ascii=False)
+        return rendered.replace("\n", "\n" + (self._line_indent(position) if indent is None else indent))
+
+    def _diff(self, value, node: Node, edits: list):
+        children = node.children
+        if isinstance(children, dict) and isinstance(value, dict) and children and list(value)[:len(children)] == list(children):
+            for key, child in children.items():
+                self._diff(value[key], child, edits)
+            # Keys added at the end are inserted after the last original member, in its style
+            added = list(value)[len(children):]
+            if added:
+                last = list(children.values())[-1]
+                indent = self._line_indent(last.start)
+                separator = ",\n" + indent if "\n" in self.text[node.start:node.end] else ", "
+                inserted = "".join(f"{separator}{json.dumps(key, ensure_ascii=False)}: {self._render(value[key], 0, indent)}"
+                                   for key in added)
+                edits.append((last.end, last.end, inserted))
+        elif isinstance(children, list) and isinstance(value, list) and len(value) == len(children):
+            for item, child in zip(value, children):
+                self._diff(item, child, edits)
+        elif children is None and type(value) is type(node.value) and value == node.value:
+            return
+        else:
+            edits.append((node.start, node.end, self._render(value, node.start)))
+
+    def dumps(self) -> str:
+        edits = []
+        self._diff(self.data, self.root, edits)
+        if not edits:
+            return self.text
+        parts = []
+        position = 0
+        for start, end, replacement in edits:
+            parts.append(self.text[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(self.text[position:])
+        return "".join(parts)
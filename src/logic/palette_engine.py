@@ -0,0 +1,195 @@
+import math
+from src.logic.contrast_engine import hex_array, relative_luminance, contrast_ratios
+
+# Text colors allowed by the scheme rules (see the color prompt): black or white only
+DARK_TEXT = "#000000"
+LIGHT_TEXT = "#ffffff"
+
+# Lightness / chroma targets (OKLCH) for each scheme role
+ROLE_TONES = {
+    "base": (0.985, 0.012),   # near-white page background, faintly tinted
+    "tint": (0.93, 0.045),    # soft tinted background
+    "dark": (0.26, 0.05),     # inverse / footer background
+}
+SHADOW_TONE = (0.22, 0.03)
+# Primary lightness above which buttons switch to a deep shade (accents) / keep the primary (dark schemes)
+ACCENT_BUTTON_SWITCH = 0.55
+DARK_BUTTON_SWITCH = 0.5
+# Hue offsets (degrees) for accents after the primary: analogous, then complementary
+ACCENT_HUE_SHIFTS = [0, 30, 180, -30]
+
+
+# ==============================================================================
+# 1. COLOR SPACES (sRGB <-> OKLab <-> OKLCH)
+# ==============================================================================
+
+def hex_to_rgb(hex_color: str) -> tuple:
+    """#rrggbb (or #rgb) -> (r, g, b) floats in 0..1."""
+    hex_color = hex_color.strip().lstrip('#')
+    if len(hex_color) == 3:
+        hex_color = "".join(c * 2 for c in hex_color)
+    return tuple(int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4))
+
+def rgb_to_hex(rgb: tuple) -> str:
+    return "#" + "".join(f"{round(min(max(c, 0.0), 1.0) * 255):02x}" for c in rgb)
+
+def _to_linear(c: float) -> float:
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+def _to_gamma(c: float) -> float:
+    return c * 12.92 if c <= 0.0031308 else 1.055 * (c ** (1 / 2.4)) - 0.055
+
+def rgb_to_oklch(rgb: tuple) -> tuple:
+    r, g, b = (_to_linear(c) for c in rgb)
+    l = (0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b) ** (1 / 3)
+    m = (0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b) ** (1 / 3)
+    s = (0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b) ** (1 / 3)
+    L = 0.2104542553 * l + 0.7936177850 * m - 0.0040720468 * s
+    a = 1.9779984951 * l - 2.4285922050 * m + 0.4505937099 * s
+    bb = 0.0259040371 * l + 0.7827717662 * m - 0.8086757660 * s
+    return L, math.hypot(a, bb), math.degrees(math.atan2(bb, a)) % 360
+
+def oklch_to_linear_rgb(L: float, C: float, h: float) -> tuple:
+    a = C * math.cos(math.radians(h))
+    b = C * math.sin(math.radians(h))
+    l = (L + 0.3963377774 * a + 0.2158037573 * b) ** 3
+    m = (L - 0.1055613458 * a - 0.0638541728 * b) ** 3
+    s = (L - 0.0894841775 * a - 1.2914855480 * b) ** 3
+    return (
+        4.0767416621 * l - 3.3077115913 * m + 0.2309699292 * s,
+        -1.2684380046 * l + 2.6097574011 * m - 0.3413193965 * s,
+        -0.0041960863 * l - 0.7034186147 * m + 1.7076147010 * s,
+    )
+
+def oklch_to_hex(L: float, C: float, h: float) -> str:
+    """Converts to sRGB, reducing chroma (hue and lightness kept) until the color is in gamut."""
+    L = min(max(L, 0.0), 1.0)
+    low, high = 0.0, C
+    rgb = oklch_to_linear_rgb(L, C, h)
+    if not all(-1e-4 <= c <= 1 + 1e-4 for c in rgb):
+        for _ in range(24):
+            mid = (low + high) / 2
+            if all(-1e-4 <= c <= 1 + 1e-4 for c in oklch_to_linear_rgb(L, mid, h)):
+                low = mid
+            else:
+                high = mid
+        rgb = oklch_to_linear_rgb(L, low, h)
+    return rgb_to_hex(tuple(_to_gamma(min(max(c, 0.0), 1.0)) for c in rgb))
+
+def hex_to_oklch(hex_color: str) -> tuple:
+    return rgb_to_oklch(hex_to_rgb(hex_color))
+
+
+# ==============================================================================
+# 2. WCAG CONTRAST
+# ==============================================================================
+
+def best_text_color(background: str, candidates=(DARK_TEXT, LIGHT_TEXT)) -> str:
+    """The candidate with the highest WCAG contrast against background (black/white always reach 4.5:1)."""
+    ratios = contrast_ratios(relative_luminance(hex_array([background])), relative_luminance(hex_array(candidates)))
+    return candidates[int(ratios.argmax())]
+
+
+# ==============================================================================
+# 3. PALETTE GENERATION
+# ==============================================================================
+
+def classify_scheme(background: str) -> str:
+    """Role of an existing scheme, from its background: base, tint, dark or accent."""
+    try:
+        L, C, h = hex_to_oklch(background)
+    except (ValueError, TypeError):
+        return "base"
+    if L < 0.45:
+        return "dark"
+    if C > 0.06:
+        return "accent"
+    return "base" if L > 0.985 else "tint"
+
+def tone(primary: str, role: str, hue_shift: float = 0) -> str:
+    L, C, h = hex_to_oklch(primary)
+    if role == "accent":
+        return oklch_to_hex(L, C, h + hue_shift)
+    target_l, max_c = ROLE_TONES[role]
+    return oklch_to_hex(target_l, min(C, max_c), h + hue_shift)
+
+def linear_gradient(start: str, end: str, angle: int = 135) -> str:
+    return f"linear-gradient({angle}deg, {start} 0%, {end} 100%)"
+
+def role_colors(primary: str, role: str, accent_index: int = 0, accent_hue: float = None) -> dict:
+    """
+    Harmonious surface colors for one scheme role: background, gradient end,
+    button and shadow. The primary color goes to backgrounds, buttons, gradients
+    and shadows. accent_hue (e.g. from the product imagery) replaces the default
+    hue shift of an accent scheme.
+    """
+    L, C, h = hex_to_oklch(primary)
+    if role == "accent":
+        if accent_hue is not None:
+            shift = accent_hue - h
+        else:
+            shift = ACCENT_HUE_SHIFTS[accent_index % len(ACCENT_HUE_SHIFTS)]
+        background = tone(primary, "accent", shift)
+        # Buttons on a colored background: a deep (or, on dark accents, pale) shade of the same hue
+        button = oklch_to_hex(0.3 if L >= ACCENT_BUTTON_SWITCH else 0.88, min(C, 0.08), h + shift)
+        gradient_end = oklch_to_hex(min(L + 0.08, 0.97), C * 0.8, h + shift + 20)
+    else:
+        background = tone(primary, role)
+        button = primary if role != "dark" or L > DARK_BUTTON_SWITCH else oklch_to_hex(0.75, C, h)
+        bg_l, bg_c, _ = hex_to_oklch(background)
+        gradient_end = oklch_to_hex(bg_l + (0.06 if role == "dark" else -0.05), bg_c, h + 20)
+
+    return {
+        "background": background,
+        "gradient_end": gradient_end,
+        "button": button,
+        "shadow": oklch_to_hex(SHADOW_TONE[0], min(C, SHADOW_TONE[1]), h),
+    }
+
+def finish_scheme(surfaces: dict) -> dict:
+    """Scheme settings from role_colors(): text and labels are black or white, whichever contrasts most."""
+    text = best_text_color(surfaces["background"])
+    return {
+        "background": surfaces["background"],
+        "background_gradient": linear_gradient(surfaces["background"], surfaces["gradient_end"]),
+        "text": text,
+        "button": surfaces["button"],
+        "button_label": best_text_color(surfaces["button"]),
+        "secondary_button_label": text,
+        "shadow": surfaces["shadow"],
+    }
+
+def scheme_colors(primary: str, role: str, accent_index: int = 0, accent_hue: float = None) -> dict:
+    """All settings of one scheme role for a primary color."""
+    return finish_scheme(role_colors(primary, role, accent_index, accent_hue))
+
+def recolor_schemes(color_schemes: dict, primary: str, accent_hues: list = None, surfaces=None) -> dict:
+    """
+    Rewrites every scheme of a color_schemes block for a new primary color, keeping
+    scheme names, keys and each scheme's role (light, tinted, dark or accent).
+    The first accent scheme uses the primary; later ones take accent_hues (degrees,
+    e.g. from the product imagery) before falling back to harmony shifts.
+    surfaces(role, accent_index, accent_hue) can replace role_colors (e.g. a
+    precomputed palette library).
+    Only keys the scheme already has are written; empty gradients stay empty.
+    """
+    if surfaces is None:
+        surfaces = lambda role, accent_index, accent_hue: role_colors(primary, role, accent_index, accent_hue)
+    accent_hues = accent_hues or []
+    accent_count = 0
+    for scheme_name, scheme_data in color_schemes.items():
+        settings = scheme_data.get("settings", {})
+        role = classify_scheme(settings.get("background", "#ffffff"))
+        accent_hue = None
+        if role == "accent" and 0 < accent_count <= len(accent_hues):
+            accent_hue = accent_hues[accent_count - 1]
+        colors = finish_scheme(surfaces(role, accent_count, accent_hue))
+        if role == "accent":
+            accent_count += 1
+        for key, value in colors.items():
+            if key not in settings:
+                continue
+            if key == "background_gradient" and not settings[key]:
+                continue
+            settings[key] = value
+    return color_schemes
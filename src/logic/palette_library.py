@@ -0,0 +1,187 @@
+import os
+import functools
+import numpy as np
+from src.logic.palette_engine import (
+    ACCENT_HUE_SHIFTS, ACCENT_BUTTON_SWITCH, DARK_BUTTON_SWITCH, role_colors, finish_scheme, hex_to_oklch, oklch_to_hex
+)
+from src.logic.contrast_engine import audit_color_schemes
+from src.config import CACHE_DIR
+
+# Bump when the grid, the palette rules or the file layout change
+LIBRARY_FORMAT_VERSION = 1
+
+# Dense OKLCH grid of primary colors (duplicates after gamut mapping are dropped)
+GRID_HUES = np.arange(0, 360, 10)
+GRID_CHROMA = np.array([0.0, 0.03, 0.06, 0.09, 0.12, 0.15, 0.18, 0.22])
+GRID_LIGHTNESS = np.linspace(0.25, 0.95, 11)
+
+SLOTS = ("base", "tint", "dark") + tuple(f"accent{i}" for i in range(len(ACCENT_HUE_SHIFTS)))
+FIELDS = ("background", "gradient_end", "button", "shadow")
+BUCKET_SIZE = 0.08  # OKLab units
+DEFAULT_LIBRARY_PATH = os.path.join(CACHE_DIR, "palette_library.npz")
+
+
+def _slot_role(slot: str):
+    return ("accent", int(slot[6:])) if slot.startswith("accent") else (slot, 0)
+
+def _regime(lightness):
+    """Which side of the palette rules' lightness switches a primary is on; lookups stay on the same side."""
+    return (np.asarray(lightness) >= ACCENT_BUTTON_SWITCH).astype(int) * 2 + (np.asarray(lightness) > DARK_BUTTON_SWITCH)
+
+def _oklab(lch: np.ndarray) -> np.ndarray:
+    hue = np.radians(lch[..., 2])
+    return np.stack([lch[..., 0], lch[..., 1] * np.cos(hue), lch[..., 1] * np.sin(hue)], axis=-1)
+
+
+class PaletteLibrary:
+    """
+    Pre-generated, contrast-validated palettes for a grid of primary colors,
+    stored as arrays: primaries (N, 3) and surfaces (N, slots, fields, 3), all
+    OKLCH. palette_for() finds the nearest primary in OKLab through a bucket
+    grid and shifts that palette onto the requested color.
+    """
+    def __init__(self, primaries: np.ndarray, surfaces: np.ndarray):
+        self.primaries = primaries
+        self.surfaces = surfaces
+        self.primaries_lab = _oklab(primaries)
+        self.regimes = _regime(primaries[:, 0])
+        self.buckets = {}
+        for i, key in enumerate(map(tuple, np.floor(self.primaries_lab / BUCKET_SIZE).astype(int))):
+            self.buckets.setdefault(key, []).append(i)
+
+    @classmethod
+    def build(cls):
+        """Generates every grid palette with the palette engine and keeps the ones passing the contrast audit."""
+        primaries, surfaces, seen = [], [], set()
+        for L in GRID_LIGHTNESS:
+            for C in GRID_CHROMA:
+                for h in (GRID_HUES if C > 0 else GRID_HUES[:1]):
+                    primary = oklch_to_hex(L, C, h)
+                    if primary in seen:
+                        continue
+                    seen.add(primary)
+                    slots = [role_colors(primary, *_slot_role(slot)) for slot in SLOTS]
+                    primaries.append(hex_to_oklch(primary))
+                    surfaces.append([[hex_to_oklch(colors[field]) for field in FIELDS] for colors in slots])
+
+        surfaces = np.array(surfaces, dtype=np.float32)
+        primaries = np.array(primaries, dtype=np.float32)
+
+        # Validation: one batched audit over every scheme of every palette. A gradient
+        # whose stops straddle the black/white crossover (mid-lightness primaries) is
+        # repaired by giving its end stop the background's lightness, then re-audited.
+        failing = cls._audit(surfaces)
+        gradient, background = FIELDS.index("gradient_end"), FIELDS.index("background")
+        for palette_index, slot_index in failing:
+            surfaces[palette_index, slot_index, gradient, 0] = surfaces[palette_index, slot_index, background, 0]
+        rejected = {palette_index for palette_index, _ in cls._audit(surfaces)}
+        keep = [i for i in range(len(surfaces)) if i not in rejected]
+        print(f"🎨 Palette library: {len(keep)} of {len(surfaces)} grid palettes pass the contrast audit "
+              f"({len(failing)} gradients repaired)")
+        return cls(primaries[keep], surfaces[keep])
+
+    @staticmethod
+    def _audit(surfaces: np.ndarray) -> set:
+        """(palette, slot) pairs whose best text or label color misses WCAG AA."""
+        blocks = []
+        for palette in surfaces:
+            block = {}
+            for slot, fields in zip(SLOTS, palette):
+                colors = {field: oklch_to_hex(*lch) for field, lch in zip(FIELDS, fields)}
+                block[slot] = {"settings": finish_scheme(colors)}
+            blocks.append(block)
+        audit = audit_color_schemes(blocks)
+        failing = set()
+        for row in audit.rows():
+            if row["best_ratio"] < audit.min_ratio:
+                palette_index, slot = row["scheme"].split(":")
+                failing.add((int(palette_index), SLOTS.index(slot)))
+        return failing
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_path, version=LIBRARY_FORMAT_VERSION, primaries=self.primaries, surfaces=self.surfaces)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Returns None when the file is missing, unreadable or from another format version."""
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != LIBRARY_FORMAT_VERSION:
+                    return None
+                return cls(data["primaries"], data["surfaces"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def nearest(self, primary: str) -> int:
+        lab = _oklab(np.array(hex_to_oklch(primary)))
+        cell = np.floor(lab / BUCKET_SIZE).astype(int)
+        candidates = [i for dl in (-1, 0, 1) for da in (-1, 0, 1) for db in (-1, 0, 1)
+                      for i in self.buckets.get((cell[0] + dl, cell[1] + da, cell[2] + db), [])]
+        indices = np.array(candidates) if candidates else np.arange(len(self.primaries))
+        same_regime = indices[self.regimes[indices] == _regime(lab[0])]
+        if len(same_regime) == 0:
+            same_regime = np.flatnonzero(self.regimes == _regime(lab[0]))
+        if len(same_regime):
+            indices = same_regime
+        distances = ((self.primaries_lab[indices] - lab) ** 2).sum(axis=1)
+        return int(indices[distances.argmin()])
+
+    def palette_for(self, primary: str) -> dict:
+        """
+        {slot: {field: hex}} for any primary color. Hue shifts by the difference to
+        the nearest grid primary; colors that follow the primary (accent surfaces and
+        buttons equal to it) also take its lightness and chroma, the others keep
+        their role tone with chroma limited to the requested one.
+        """
+        L, C, h = hex_to_oklch(primary)
+        index = self.nearest(primary)
+        L0, C0, h0 = (float(v) for v in self.primaries[index])
+        hue_shift = h - h0 if C0 > 1e-3 else 0.0
+        chroma_ratio = C / C0 if C0 > 1e-3 else 1.0
+
+        palette = {}
+        for slot, fields in zip(SLOTS, self.surfaces[index]):
+            is_accent = slot.startswith("accent")
+            colors = {}
+            for field, (l, c, hue) in zip(FIELDS, (map(float, lch) for lch in fields)):
+                if C0 <= 1e-3:
+                    hue = h  # the grid palette is neutral; any hue will do
+                follows_primary = (is_accent and field in ("background", "gradient_end")) or \
+                    (field == "button" and abs(l - L0) < 2e-3 and abs(c - C0) < 2e-3)
+                if follows_primary:
+                    colors[field] = oklch_to_hex(l + L - L0, c * chroma_ratio if C0 > 1e-3 else C, hue + hue_shift)
+                else:
+                    colors[field] = oklch_to_hex(l, C if abs(c - C0) < 2e-3 else min(c, C), hue + hue_shift)
+            palette[slot] = colors
+        return palette
+
+    def surfaces_for(self, primary: str):
+        """A surfaces(role, accent_index, accent_hue) function for recolor_schemes."""
+        palette = self.palette_for(primary)
+
+        def surfaces(role, accent_index, accent_hue):
+            if accent_hue is not None:
+                return role_colors(primary, role, accent_index, accent_hue)
+            if role == "accent":
+                return palette[f"accent{accent_index % len(ACCENT_HUE_SHIFTS)}"]
+            return palette[role]
+        return surfaces
+
+
+@functools.lru_cache(maxsize=4)
+def load_or_build_library(path: str) -> PaletteLibrary:
+    """
+    Loads the library file, building and saving it first when missing or outdated.
+    Loaded libraries are kept for the life of the process.
+    """
+    library = PaletteLibrary.load(path)
+    if library is None:
+        library = PaletteLibrary.build()
+        try:
+            library.save(path)
+        except OSError as e:
+            print(f"   ⚠️ Could not save palette library: {e}")
+    return library
@@ -0,0 +1,61 @@
+import re
+from collections import Counter
+from functools import lru_cache
+
+# Leftover tokens that are blanked when no value was provided for them
+CLEANUP_PATTERNS = (r"NEW_THEME_[A-Z0-9_]+", r"NEW_[A-Z0-9_]+_CONTENT")
+LEFTOVER = "__leftover__"
+
+
+class PlaceholderMatcher:
+    """
+    One compiled alternation over a fixed key set.
+    Keys are tried longest-first, so at any position the longest key wins
+    (NEW_THEME_PRODUCT_IMAGE_TITLE_2 is never split by NEW_THEME_PRODUCT_IMAGE_TITLE),
+    independent of the order keys were listed in. When cleanup is enabled,
+    placeholder-shaped tokens without a key are blanked in the same scan.
+    """
+    def __init__(self, keys: tuple, cleanup: bool = True):
+        self.keys = keys
+        ordered = sorted(keys, key=lambda k: (-len(k), k))
+        groups = []
+        if ordered:
+            groups.append("(?P<key>" + "|".join(re.escape(k) for k in ordered) + ")")
+        if cleanup:
+            groups.append("(?P<leftover>" + "|".join(CLEANUP_PATTERNS) + ")")
+        self.pattern = re.compile("|".join(groups)) if groups else None
+
+    def substitute(self, content: str, values: dict):
+        """
+        Replaces every placeholder in a single left-to-right scan.
+        Returns (new_content, hits) where hits counts matches per key
+        (blanked leftovers are counted under LEFTOVER).
+        """
+        hits = Counter()
+        if self.pattern is None:
+            return content, hits
+
+        def replace(match):
+            key = match.lastgroup == "key" and match.group("key")
+            if key:
+                hits[key] += 1
+                return values.get(key, "")
+            hits[LEFTOVER] += 1
+            return ""
+
+        return self.pattern.sub(replace, content), hits
+
+
+@lru_cache(maxsize=64)
+def _compiled_matcher(keys: tuple, cleanup: bool) -> PlaceholderMatcher:
+    return PlaceholderMatcher(keys, cleanup)
+
+
+def get_matcher(keys, cleanup: bool = True) -> PlaceholderMatcher:
+    """Returns the matcher for this key set, compiling it only the first time it is seen."""
+    return _compiled_matcher(tuple(sorted(set(keys))), cleanup)
+
+
+def substitute_placeholders(content: str, values: dict, cleanup: bool = True):
+    """Convenience wrapper: substitute all keys of `values` in one pass."""
+    return get_matcher(values.keys(), cleanup).substitute(content, values)
@@ -0,0 +1,137 @@
+import os
+import re
+import pickle
+import hashlib
+import threading
+from collections import Counter
+from src.logic.placeholder_engine import get_matcher, LEFTOVER
+
+# Bump when the compiled representation changes so stale disk entries are ignored
+TEMPLATE_FORMAT_VERSION = 1
+
+
+class CompiledTemplate:
+    """
+    A template split into literal chunks and slot references:
+    literals[0] slot[0] literals[1] slot[1] ... literals[n].
+    Rendering is a single join over the segments; no scanning happens per job.
+    """
+    def __init__(self, literals: list, slots: list):
+        self.literals = literals
+        self.slots = slots
+        self.hits = Counter(slots)
+
+    def render(self, values: dict) -> str:
+        parts = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            if slot != LEFTOVER:
+                parts.append(values.get(slot, ""))
+            parts.append(literal)
+        return "".join(parts)
+
+
+def compile_template(content: str, keys, patterns: dict = None) -> CompiledTemplate:
+    """
+    Splits content on every placeholder of `keys` (plus leftover placeholder tokens).
+    `patterns` maps extra slot names to regexes whose whole match becomes a slot,
+    e.g. {"@product_handle": r'"product":\\s*"[^"]*"'}.
+    """
+    literals, slots = [], []
+    matcher = get_matcher(keys)
+    position = 0
+    if matcher.pattern is not None:
+        for match in matcher.pattern.finditer(content):
+            literals.append(content[position:match.start()])
+            slots.append(match.group("key") if match.lastgroup == "key" else LEFTOVER)
+            position = match.end()
+    literals.append(content[position:])
+
+    for name, regex in (patterns or {}).items():
+        compiled = re.compile(regex)
+        new_literals, new_slots = [], []
+        for i, literal in enumerate(literals):
+            position = 0
+            for match in compiled.finditer(literal):
+                new_literals.append(literal[position:match.start()])
+                new_slots.append(name)
+                position = match.end()
+            new_literals.append(literal[position:])
+            if i < len(slots):
+                # The original slot follows the last piece of this literal
+                new_slots.append(slots[i])
+        literals, slots = new_literals, new_slots
+
+    return CompiledTemplate(literals, slots)
+
+
+class TemplateCache:
+    """
+    Caches compiled templates per (source file, key set, patterns).
+    Entries are revalidated with a cheap stat check and invalidated by the
+    file's SHA-256, so a long-running worker only scans a base template once.
+    When cache_dir is set, compiled templates are also persisted across processes.
+    """
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir
+        self._entries = {}  # (path, keys, patterns) -> (stat signature, sha256, compiled)
+        self._compiled = {}  # (sha256, keys, patterns) -> compiled, shared by identical files
+        self._lock = threading.Lock()
+
+    def load(self, path: str, keys, patterns: dict = None) -> CompiledTemplate:
+        keyset = tuple(sorted(set(keys)))
+        pattern_items = tuple(sorted((patterns or {}).items()))
+        entry_key = (os.path.abspath(path), keyset, pattern_items)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._entries.get(entry_key)
+        if cached and cached[0] == signature:
+            return cached[2]
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            compiled = self._compiled.get((digest, keyset, pattern_items))
+        if compiled is None:
+            compiled = self._load_from_disk(digest, keyset, pattern_items)
+            if compiled is None:
+                compiled = compile_template(raw.decode("utf-8"), keyset, dict(pattern_items))
+                self._save_to_disk(digest, keyset, pattern_items, compiled)
+
+        with self._lock:
+            self._compiled[(digest, keyset, pattern_items)] = compiled
+            self._entries[entry_key] = (signature, digest, compiled)
+        return compiled
+
+    def _disk_path(self, digest: str, keyset: tuple, pattern_items: tuple) -> str:
+        key_digest = hashlib.sha256(repr((TEMPLATE_FORMAT_VERSION, keyset, pattern_items)).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, "templates", f"{digest[:32]}_{key_digest}.pickle")
+
+    def _load_from_disk(self, digest: str, keyset: tuple, pattern_items: tuple):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(digest, keyset, pattern_items)
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def _save_to_disk(self, digest: str, keyset: tuple, pattern_items: tuple, compiled: CompiledTemplate):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(digest, keyset, pattern_items)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(compiled, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"   ⚠️ Could not persist compiled template: {e}")
+
+
+# Process-wide cache shared by ThemeManager instances
+default_template_cache = TemplateCache()
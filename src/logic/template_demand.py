@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from src.logic.placeholder_engine import get_matcher
+from src.logic import jsonc
+
+# Bump when the index layout changes so stale disk entries are ignored
+DEMAND_FORMAT_VERSION = 1
+
+# Bare (unquoted) placeholders stand in for whole JSON values, e.g. "blocks": NEW_THEME_FAQ_DATA
+BARE_BEFORE = re.compile(r'[:\[,]\s*$')
+BARE_AFTER = re.compile(r'^\s*[,}\]]')
+
+
+def _quote_bare_tokens(content: str, pattern) -> str:
+    """Quotes bare placeholders so the template parses as JSON and the tokens stay visible."""
+    parts = []
+    position = 0
+    for match in pattern.finditer(content):
+        before = content[max(0, match.start() - 64):match.start()]
+        after = content[match.end():match.end() + 64]
+        if BARE_BEFORE.search(before) and BARE_AFTER.match(after):
+            parts.append(content[position:match.start()])
+            parts.append(f'"{match.group()}"')
+            position = match.end()
+    parts.append(content[position:])
+    return "".join(parts)
+
+
+def scan_template(content: str, tokens) -> dict:
+    """
+    Returns {token: [section_id or None, ...]} for every token found in content.
+    Tokens inside "sections" are attributed to their section; others (or all of
+    them, when the template cannot be parsed) to None.
+    """
+    matcher = get_matcher(tokens, cleanup=False)
+    if matcher.pattern is None:
+        return {}
+    found = {}
+    in_sections = set()
+    try:
+        data = jsonc.loads(_quote_bare_tokens(content, matcher.pattern))
+        sections = data.get("sections", {}) if isinstance(data, dict) else {}
+    except json.JSONDecodeError:
+        sections = {}
+    for section_id, section in sections.items():
+        for token in set(matcher.pattern.findall(json.dumps(section, ensure_ascii=False))):
+            found.setdefault(token, []).append(section_id)
+            in_sections.add(token)
+    for token in set(matcher.pattern.findall(content)) - in_sections:
+        found[token] = [None]
+    return found
+
+
+class TemplateDemand:
+    """
+    Which content keys the active templates actually consume, and where.
+    `occurrences` maps placeholder tokens to [(template, section_id), ...];
+    `consumers` maps a generated content key to the tokens it feeds when that is
+    not the key itself (e.g. a reviews list feeding a blocks placeholder).
+    """
+    def __init__(self, occurrences: dict, consumers: dict = None):
+        self.occurrences = occurrences
+        self.consumers = consumers or {}
+
+    def tokens_for(self, key: str) -> list:
+        return self.consumers.get(key, [key])
+
+    def where(self, key: str) -> list:
+        return [place for token in self.tokens_for(key) for place in self.occurrences.get(token, [])]
+
+    def consumed(self, key: str) -> bool:
+        return any(token in self.occurrences for token in self.tokens_for(key))
+
+    def wants(self, *keys) -> bool:
+        """True if any of the keys is consumed by a template."""
+        return any(self.consumed(key) for key in keys)
+
+    def unused(self, generated_keys) -> list:
+        return sorted(key for key in generated_keys if not self.consumed(key))
+
+    def report_unused(self, ai_content: dict):
+        unused = self.unused(ai_content)
+        if unused:
+            print(f"   📑 {len(unused)} generated keys are not used by the active templates: {', '.join(unused)}")
+        else:
+            print("   📑 Every generated key is used by the active templates.")
+        return unused
+
+
+class TemplateDemandIndex:
+    """
+    Builds and caches TemplateDemand per set of template contents.
+    The cache key is the SHA-256 of every scanned template plus the token lists,
+    so editing a template (or the keys it is scanned for) rebuilds the index.
+    When cache_dir is set, indexes are also persisted across processes.
+    """
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def load(self, templates: dict, consumers: dict = None) -> TemplateDemand:
+        """templates maps template name -> (source path, tokens to look for)."""
+        sources = {}
+        digest = hashlib.sha256(f"v{DEMAND_FORMAT_VERSION}".encode("utf-8"))
+        for name in sorted(templates):
+            path, tokens = templates[name]
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                raw = f.read()
+            sources[name] = (raw, tokens)
+            digest.update(name.encode("utf-8"))
+            digest.update(hashlib.sha256(raw).digest())
+            digest.update(json.dumps(sorted(set(tokens))).encode("utf-8"))
+        index_key = digest.hexdigest()
+
+        with self._lock:
+            occurrences = self._indexes.get(index_key)
+        if occurrences is None:
+            occurrences = self._load_from_disk(index_key)
+        if occurrences is None:
+            occurrences = {}
+            for name, (raw, tokens) in sources.items():
+                for token, sections in scan_template(raw.decode("utf-8"), tokens).items():
+                    occurrences.setdefault(token, []).extend([name, section] for section in sections)
+            self._save_to_disk(index_key, occurrences)
+        with self._lock:
+            self._indexes[index_key] = occurrences
+        return TemplateDemand(occurrences, consumers)
+
+    def _disk_path(self, index_key: str) -> str:
+        return os.path.join(self.cache_dir, "demand", f"{index_key[:32]}.json")
+
+    def _load_from_disk(self, index_key: str):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(index_key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _save_to_disk(self, index_key: str, occurrences: dict):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(index_key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(occurrences, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"   ⚠️ Could not persist template demand index: {e}")
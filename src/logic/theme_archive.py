@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import zlib
+import struct
+import hashlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Local file header / central directory / end-of-central-directory layouts (PKWARE APPNOTE)
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+
+UTF8_FLAG = 0x800
+ZIP_VERSION = 20
+MAX_ZIP32 = 0xFFFFFFFF
+STREAM_CHUNK = 64 * 1024
+# Modified files at least this large are compressed on worker threads
+PARALLEL_THRESHOLD = 1024 * 1024
+
+
+def _dos_datetime(mtime: float) -> tuple:
+    t = time.localtime(mtime)
+    year = max(t.tm_year, 1980)
+    dosdate = (year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dostime = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dostime, dosdate
+
+
+def _scan_tree(root_dir: str) -> dict:
+    """{relative posix path: os.stat_result} for every regular file under root_dir."""
+    files = {}
+    for root, dirs, filenames in os.walk(root_dir):
+        dirs.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            rel = os.path.relpath(path, root_dir).replace(os.sep, "/")
+            files[rel] = os.stat(path)
+    return files
+
+
+class ZipEntry:
+    """One archive member; data is either compressed bytes or a raw span of the base ZIP."""
+    def __init__(self, name: str, crc: int, compress_size: int, file_size: int, method: int,
+                 dostime: int, dosdate: int, mode: int, data: bytes = None, raw_offset: int = None):
+        self.name = name
+        self.name_bytes = name.encode("utf-8")
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.method = method
+        self.dostime = dostime
+        self.dosdate = dosdate
+        self.mode = mode
+        self.data = data
+        self.raw_offset = raw_offset
+
+    @classmethod
+    def compress(cls, name: str, path: str, stat: os.stat_result):
+        with open(path, "rb") as f:
+            raw = f.read()
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = compressor.compress(raw) + compressor.flush()
+        method = zipfile.ZIP_DEFLATED
+        if len(data) >= len(raw):
+            data, method = raw, zipfile.ZIP_STORED
+        dostime, dosdate = _dos_datetime(stat.st_mtime)
+        return cls(name, zlib.crc32(raw), len(data), len(raw), method, dostime, dosdate, stat.st_mode, data=data)
+
+    def local_header(self) -> bytes:
+        return LOCAL_HEADER.pack(b"PK\x03\x04", ZIP_VERSION, 0, UTF8_FLAG, self.method, self.dostime, self.dosdate,
+                                 self.crc, self.compress_size, self.file_size, len(self.name_bytes), 0) + self.name_bytes
+
+    def central_header(self, offset: int) -> bytes:
+        return CENTRAL_HEADER.pack(b"PK\x01\x02", ZIP_VERSION, 3, ZIP_VERSION, 0, UTF8_FLAG, self.method,
+                                   self.dostime, self.dosdate, self.crc, self.compress_size, self.file_size,
+                                   len(self.name_bytes), 0, 0, 0, 0, (self.mode & 0xFFFF) << 16, offset) + self.name_bytes
+
+    def record_size(self) -> int:
+        return LOCAL_HEADER.size + len(self.name_bytes) + self.compress_size
+
+
+class ThemeArchive:
+    """
+    A planned archive: all sizes are known before the first byte is produced, so
+    total_size can be announced upfront (e.g. as a staged upload's fileSize) and the
+    bytes streamed to disk or straight into an upload with iter_chunks().
+    """
+    def __init__(self, entries: list, base_zip_path: str = None):
+        if len(entries) >= 0xFFFF:
+            raise ValueError("Theme has too many files for a ZIP32 archive")
+        self.entries = entries
+        self.base_zip_path = base_zip_path
+        self.central_directory_offset = sum(e.record_size() for e in entries)
+        central_size = sum(CENTRAL_HEADER.size + len(e.name_bytes) for e in entries)
+        self.total_size = self.central_directory_offset + central_size + END_RECORD.size
+        if self.total_size > MAX_ZIP32:
+            raise ValueError("Theme archive exceeds 4 GiB; ZIP64 is not supported")
+
+    def iter_chunks(self):
+        base = open(self.base_zip_path, "rb") if self.base_zip_path else None
+        try:
+            offsets = []
+            position = 0
+            for entry in self.entries:
+                offsets.append(position)
+                yield entry.local_header()
+                if entry.data is not None:
+                    yield entry.data
+                else:
+                    # Already-compressed bytes copied verbatim from the base archive
+                    base.seek(entry.raw_offset)
+                    remaining = entry.compress_size
+                    while remaining:
+                        chunk = base.read(min(STREAM_CHUNK, remaining))
+                        if not chunk:
+                            raise IOError(f"Base archive truncated at {entry.name}")
+                        remaining -= len(chunk)
+                        yield chunk
+                position += entry.record_size()
+
+            central = b"".join(entry.central_header(offset) for entry, offset in zip(self.entries, offsets))
+            yield central
+            yield END_RECORD.pack(b"PK\x05\x06", 0, 0, len(self.entries), len(self.entries),
+                                  len(central), self.central_directory_offset, 0)
+        finally:
+            if base:
+                base.close()
+
+    def write_to(self, output_path: str) -> str:
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            for chunk in self.iter_chunks():
+                f.write(chunk)
+        os.replace(tmp_path, output_path)
+        return output_path
+
+
+class BaseThemeArchive:
+    """
+    A ZIP of the unmodified base theme, built once and cached on disk keyed by
+    the theme's file listing (path, size, mtime). Holds, per member, the stat
+    fingerprint used to decide whether a workspace file is unchanged and the
+    offset of its compressed bytes.
+    """
+    def __init__(self, theme_dir: str, cache_dir: str):
+        self.theme_dir = theme_dir
+        files = _scan_tree(theme_dir)
+        fingerprint = hashlib.sha256(json.dumps(
+            [[rel, st.st_size, st.st_mtime_ns] for rel, st in files.items()]).encode("utf-8")).hexdigest()[:24]
+
+        archive_dir = os.path.join(cache_dir, "archives")
+        self.zip_path = os.path.join(archive_dir, f"base_{fingerprint}.zip")
+        manifest_path = os.path.join(archive_dir, f"base_{fingerprint}.json")
+
+        if not (os.path.exists(self.zip_path) and os.path.exists(manifest_path)):
+            print(f"🗜️ Building base theme archive ({len(files)} files)...")
+            os.makedirs(archive_dir, exist_ok=True)
+            entries = build_entries(theme_dir, files)
+            ThemeArchive(entries).write_to(self.zip_path)
+            manifest = self._read_members(files)
+            tmp_manifest = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_manifest, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_manifest, manifest_path)
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.members = json.load(f)
+
+    def _read_members(self, files: dict) -> dict:
+        members = {}
+        with open(self.zip_path, "rb") as raw, zipfile.ZipFile(self.zip_path) as zf:
+            for info in zf.infolist():
+                raw.seek(info.header_offset)
+                header = LOCAL_HEADER.unpack(raw.read(LOCAL_HEADER.size))
+                data_offset = info.header_offset + LOCAL_HEADER.size + header[10] + header[11]
+                st = files[info.filename]
+                members[info.filename] = {
+                    "crc": info.CRC, "compress_size": info.compress_size, "file_size": info.file_size,
+                    "method": info.compress_type, "dostime": header[5], "dosdate": header[6],
+                    "mode": st.st_mode, "data_offset": data_offset,
+                    "size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino, "dev": st.st_dev
+                }
+        return members
+
+    def unchanged_entry(self, rel: str, st: os.stat_result):
+        """Returns a raw-copy ZipEntry if the workspace file is identical to the base member."""
+        member = self.members.get(rel)
+        if not member:
+            return None
+        same_inode = st.st_ino == member["ino"] and st.st_dev == member["dev"]
+        same_stat = st.st_size == member["size"] and st.st_mtime_ns == member["mtime_ns"]
+        if not (same_inode or same_stat):
+            return None
+        return ZipEntry(rel, member["crc"], member["compress_size"], member["file_size"], member["method"],
+                        member["dostime"], member["dosdate"], member["mode"], raw_offset=member["data_offset"])
+
+
+def build_entries(root_dir: str, files: dict, max_workers: int = 4) -> list:
+    """Compresses the given files; large ones on a thread pool (zlib releases the GIL)."""
+    entries = {}
+    large = [rel for rel, st in files.items() if st.st_size >= PARALLEL_THRESHOLD]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {rel: pool.submit(ZipEntry.compress, rel, os.path.join(root_dir, rel), files[rel]) for rel in large}
+        for rel, st in files.items():
+            if rel not in futures:
+                entries[rel] = ZipEntry.compress(rel, os.path.join(root_dir, rel), st)
+        for rel, future in futures.items():
+            entries[rel] = future.result()
+    return [entries[rel] for rel in files]
+
+
+def plan_theme_archive(workspace_path: str, base: BaseThemeArchive) -> ThemeArchive:
+    """
+    Plans the job archive: unchanged members are copied from the base ZIP without
+    recompression, only job-modified files are deflated.
+    """
+    files = _scan_tree(workspace_path)
+    entries = []
+    changed = {}
+    for rel, st in files.items():
+        entry = base.unchanged_entry(rel, st)
+        if entry is None:
+            changed[rel] = st
+        entries.append(entry)
+
+    compressed = dict(zip(changed, build_entries(workspace_path, changed)))
+    entries = [entry if entry is not None else compressed[rel] for rel, entry in zip(files, entries)]
+    print(f"🗜️ Archive plan: {len(files) - len(changed)} entries reused, {len(changed)} compressed")
+    return ThemeArchive(entries, base.zip_path)
@@ -0,0 +1,136 @@
+import os
+from src.logic.jsonc import JsoncDocument, strip_comments
+from src.utils.common import write_text_atomic
+
+
+def strip_json_comments(content):
+    """
+    Removes C-style comments from JSON content (/* ... */ and //)
+    so that the standard json parser can read it. String values are left intact.
+    """
+    return strip_comments(content)
+
+
+class ThemeFile:
+    """
+    One theme JSON file held in memory. It is either text (e.g. a freshly rendered
+    template) or parsed data; parsing happens on first access, and serialization
+    back to text only happens once, at flush time. Serializing parsed data only
+    rewrites the values that changed, so comments and formatting are kept.
+    """
+    def __init__(self, path: str, rel: str, text: str):
+        self.path = path
+        self.rel = rel
+        self.set_text(text)
+        self.dirty = False
+
+    @property
+    def data(self):
+        if self._parsed is None:
+            self._parsed = JsoncDocument(self.text if strip_json_comments(self.text).strip() else "{}")
+        return self._parsed.data
+
+    def set_text(self, text: str):
+        self.text = text
+        self._parsed = None
+        self._data_is_current = False
+        self.dirty = True
+
+    @property
+    def data_is_current(self) -> bool:
+        """True when edits live in .data and .text is stale."""
+        return self._data_is_current
+
+    def touch(self):
+        """Marks the parsed data as modified; call after mutating .data."""
+        self._data_is_current = True
+        self.dirty = True
+
+    def serialize(self) -> str:
+        if self._data_is_current:
+            return self._parsed.dumps()
+        return self.text
+
+
+class ThemeDocument:
+    """
+    In-memory view of a theme workspace's JSON files for the duration of a job.
+    Each file is read from disk once, shared by every transformation
+    (placeholder rendering, color schemes, video injection...) and written
+    back once by flush(). Paths may be absolute or relative to the workspace.
+    """
+    def __init__(self, workspace_path: str):
+        self.workspace_path = workspace_path
+        self._files = {}
+
+    def rel(self, path: str) -> str:
+        """Workspace-relative, forward-slash form of a path (the key of every loaded file)."""
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.workspace_path)
+        return path.replace(os.sep, "/")
+
+    def exists(self, path: str) -> bool:
+        rel = self.rel(path)
+        return rel in self._files or os.path.exists(os.path.join(self.workspace_path, rel))
+
+    def file(self, path: str) -> ThemeFile:
+        rel = self.rel(path)
+        if rel not in self._files:
+            full_path = os.path.join(self.workspace_path, rel)
+            with open(full_path, "r", encoding="utf-8") as f:
+                self._files[rel] = ThemeFile(full_path, rel, f.read())
+        return self._files[rel]
+
+    def is_loaded(self, path: str) -> bool:
+        return self.rel(path) in self._files
+
+    def json_files(self) -> list:
+        """Relative paths of every .json file in the workspace."""
+        paths = []
+        for root, dirs, files in os.walk(self.workspace_path):
+            for filename in files:
+                if filename.lower().endswith(".json"):
+                    paths.append(self.rel(os.path.join(root, filename)))
+        return paths
+
+    def text(self, path: str) -> str:
+        theme_file = self.file(path)
+        return theme_file.serialize()
+
+    def set_text(self, path: str, text: str):
+        rel = self.rel(path)
+        if rel in self._files:
+            self._files[rel].set_text(text)
+        else:
+            # Replaced wholesale (e.g. a rendered template): no need to read the old copy
+            theme_file = ThemeFile(os.path.join(self.workspace_path, rel), rel, text)
+            theme_file.dirty = True
+            self._files[rel] = theme_file
+
+    def data(self, path: str):
+        return self.file(path).data
+
+    def touch(self, path: str):
+        self.file(path).touch()
+
+    def sections(self, path: str):
+        """Yields (section_id, section) for a template or section group file."""
+        for section_id, section in self.data(path).get("sections", {}).items():
+            yield section_id, section
+
+    @staticmethod
+    def blocks(section: dict):
+        """Yields (block_id, block) for a section."""
+        for block_id, block in section.get("blocks", {}).items():
+            yield block_id, block
+
+    def flush(self) -> int:
+        """Writes every modified file once. Returns the number of files written."""
+        written = 0
+        for theme_file in self._files.values():
+            if theme_file.dirty:
+                write_text_atomic(theme_file.path, theme_file.serialize())
+                theme_file.dirty = False
+                written += 1
+        print(f"💾 Theme document flushed: {written} of {len(self._files)} loaded files written")
+        return written
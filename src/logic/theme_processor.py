@@ -1,13 +1,13 @@
 import os
 import json
 import re
+from src.utils.common import write_text_atomic
 
 def replace_in_file(path, placeholder, value):
     with open(path, 'r', encoding='utf-8') as f:
         content = f.read()
     content = content.replace(placeholder, value)
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    write_text_atomic(path, content)
 
 def process_template_files(ai_content, theme_dir, images_map):
     # This is the massive logic from process_and_write_files
@@ -33,6 +33,6 @@ def process_template_files(ai_content, theme_dir, images_map):
                 pass 
                 
     # 4. Save
-    with open(index_path, 'w') as f: f.write(index_str)
+    write_text_atomic(index_path, index_str)
     
     # [Repeat for product.json, settings_data.json, footer-group.json, etc.]
\ No newline at end of file
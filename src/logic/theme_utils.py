@@ -1,117 +1,169 @@
 import os
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
+from src.logic.jsonc import string_value_spans
+from src.logic.theme_document import ThemeDocument
 
-def strip_json_comments(content):
-    """
-    Removes C-style comments from JSON content (/* ... */)
-    so that the standard json parser can read it.
-    """
-    # Regex to match /* ... */ comments
-    pattern = r'/\*[\s\S]*?\*/'
-    return re.sub(pattern, '', content)
 
-def replace_colors_in_json_files(folder_path: str, color_replacements: dict):
+class ColorReplacer:
     """
-    Recursively replaces hex codes in all JSON files (Settings, Templates, Sections).
-    Handles files with comments gracefully.
+    All color replacements as one compiled, case-insensitive alternation
+    (longest source first), plus a bytes twin used to skip files cheaply.
     """
-    if not os.path.exists(folder_path):
-        return
+    def __init__(self, color_replacements: dict):
+        sources = sorted(color_replacements, key=lambda c: (-len(c), c))
+        self.lookup = {c.lower(): json.dumps(new, ensure_ascii=False)[1:-1] for c, new in color_replacements.items()}
+        self.raw_lookup = {c.lower(): new for c, new in color_replacements.items()}
+        alternation = "|".join(re.escape(c) for c in sources)
+        self.pattern = re.compile(alternation, re.IGNORECASE) if sources else None
+        self.bytes_pattern = re.compile(alternation.encode("utf-8"), re.IGNORECASE) if sources else None
 
-    print(f"🎨 Running Recursive Color Replacement in {folder_path}...")
+    def may_match(self, raw: bytes) -> bool:
+        return self.bytes_pattern is not None and self.bytes_pattern.search(raw) is not None
 
-    def replace_in_value(value):
-        replacements_made = 0
+    def replace_in_text(self, content: str):
+        """
+        Rewrites matches inside JSON string values only (object keys and comments
+        are left alone) as span edits, so all other formatting survives.
+        Returns (new_content, values_changed).
+        """
+        if self.pattern is None or not self.pattern.search(content):
+            return content, 0
+        parts = []
+        position = 0
+        changed = 0
+        for start, end in string_value_spans(content):
+            literal = content[start:end]
+            if not self.pattern.search(literal):
+                continue
+            parts.append(content[position:start])
+            parts.append(self.pattern.sub(lambda m: self.lookup[m.group().lower()], literal))
+            position = end
+            changed += 1
+        parts.append(content[position:])
+        return "".join(parts), changed
+
+    def replace_in_value(self, value):
+        """Same replacement over already-parsed data. Returns (value, values_changed)."""
         if isinstance(value, str):
-            original_value = value
-            for original_color, new_color in color_replacements.items():
-                pattern = re.escape(original_color)
-                # Case insensitive replacement
-                value = re.sub(pattern, new_color, value, flags=re.IGNORECASE)
-            if value != original_value:
-                replacements_made = 1
-        elif isinstance(value, dict):
+            if self.pattern is None:
+                return value, 0
+            new_value = self.pattern.sub(lambda m: self.raw_lookup[m.group().lower()], value)
+            return new_value, int(new_value != value)
+        replacements_made = 0
+        if isinstance(value, dict):
             for key, val in value.items():
-                new_val, count = replace_in_value(val)
-                value[key] = new_val
+                value[key], count = self.replace_in_value(val)
                 replacements_made += count
         elif isinstance(value, list):
             for i, item in enumerate(value):
-                new_item, count = replace_in_value(item)
-                value[i] = new_item
+                value[i], count = self.replace_in_value(item)
                 replacements_made += count
         return value, replacements_made
 
-    for root, dirs, files in os.walk(folder_path):
-        json_files = [f for f in files if f.lower().endswith('.json')]
-        for filename in json_files:
-            file_path = os.path.join(root, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Clean content before parsing
-                clean_content = strip_json_comments(content)
-                
-                if not clean_content.strip():
-                    continue # Skip empty files
-
-                data = json.loads(clean_content)
-
-                modified_data, count = replace_in_value(data)
-
-                if count > 0:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(modified_data, f, indent=2, ensure_ascii=False)
-            except json.JSONDecodeError:
-                # Still warn, but clarify it's a parsing error
-                print(f"   ⚠️ Skipping invalid JSON: {filename}")
-            except Exception as e:
-                print(f"   ⚠️ Error processing {filename}: {e}")
-
-def inject_video_id(theme_root: str, video_id: str):
+
+def replace_colors_in_json_files(folder_path: str, color_replacements: dict, document: ThemeDocument = None,
+                                 max_workers: int = 8):
+    """
+    Replaces hex codes (case-insensitive) in the string values of all JSON files
+    (Settings, Templates, Sections), in place, keeping comments and formatting.
+    Files whose raw bytes contain none of the source colors are never decoded or parsed.
+    When a ThemeDocument is given, edits stay in memory until document.flush().
+    """
+    if not os.path.exists(folder_path):
+        return
+
+    print(f"🎨 Running Color Replacement in {folder_path}...")
+    replacer = ColorReplacer(color_replacements)
+    owns_document = document is None
+    if owns_document:
+        document = ThemeDocument(folder_path)
+
+    def process(rel_path):
+        try:
+            if document.is_loaded(rel_path):
+                theme_file = document.file(rel_path)
+                if theme_file.data_is_current:
+                    _, count = replacer.replace_in_value(theme_file.data)
+                    return rel_path, None, count
+                content = theme_file.text
+            else:
+                with open(os.path.join(folder_path, rel_path), "rb") as f:
+                    raw = f.read()
+                if not replacer.may_match(raw):
+                    return rel_path, None, 0
+                content = raw.decode("utf-8")
+            new_content, count = replacer.replace_in_text(content)
+            return rel_path, new_content, count
+        except Exception as e:
+            print(f"   ⚠️ Error processing {os.path.basename(rel_path)}: {e}")
+            return rel_path, None, 0
+
+    json_files = document.json_files()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(process, json_files))
+
+    files_changed = 0
+    values_changed = 0
+    for rel_path, new_content, count in results:
+        if not count:
+            continue
+        files_changed += 1
+        values_changed += count
+        if new_content is None:
+            document.touch(rel_path)
+        else:
+            document.set_text(rel_path, new_content)
+    print(f"   -> {values_changed} values updated in {files_changed} of {len(json_files)} JSON files")
+
+    if owns_document:
+        document.flush()
+
+def inject_video_id(theme_root: str, video_id: str, document: ThemeDocument = None):
     """
     Injects the Shopify Video ID into index.json and product.json.
+    When a ThemeDocument is given, edits stay in memory until document.flush().
     """
     if not video_id:
         return
 
     print(f"🎥 Injecting Video ID ({video_id}) into templates...")
-    
-    files_to_check = [
-        os.path.join(theme_root, "templates", "index.json"),
-        os.path.join(theme_root, "templates", "product.json")
-    ]
-
-    for file_path in files_to_check:
-        if not os.path.exists(file_path):
+    owns_document = document is None
+    if owns_document:
+        document = ThemeDocument(theme_root)
+
+    files_to_check = ["templates/index.json", "templates/product.json"]
+
+    for rel_path in files_to_check:
+        if not document.exists(rel_path):
             continue
 
         try:
             # 1. String Replacement
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
+            content = document.text(rel_path)
+
             # Replace placeholder if exists
             updated_content = content.replace("NEW_THEME_PRODUCT_VIDEO", video_id)
             updated_content = updated_content.replace("NEW_VIDEO_SOURCE_PRODUCT", video_id)
+            if updated_content != content:
+                document.set_text(rel_path, updated_content)
 
             # 2. JSON Object Replacement (Logic for specific section types)
-            # Remove comments before parsing to be safe
-            clean_content = strip_json_comments(updated_content)
-            data = json.loads(clean_content)
-            
-            if "sections" in data:
-                for section_id, section_data in data["sections"].items():
-                    # Match video-with-text or similar video sections
-                    if section_data.get("type") in ["video-with-text", "video", "video-text"]:
-                        if "settings" in section_data:
-                            section_data["settings"]["video"] = video_id
-                            print(f"   -> Updated section {section_id} in {os.path.basename(file_path)}")
-
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            updated = False
+            for section_id, section_data in document.sections(rel_path):
+                # Match video-with-text or similar video sections
+                if section_data.get("type") in ["video-with-text", "video", "video-text"]:
+                    if "settings" in section_data:
+                        section_data["settings"]["video"] = video_id
+                        updated = True
+                        print(f"   -> Updated section {section_id} in {os.path.basename(rel_path)}")
+
+            if updated:
+                document.touch(rel_path)
 
         except Exception as e:
-            print(f"   ⚠️ Error injecting video in {os.path.basename(file_path)}: {e}")
\ No newline at end of file
+            print(f"   ⚠️ Error injecting video in {os.path.basename(rel_path)}: {e}")
+
+    if owns_document:
+        document.flush()
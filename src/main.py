@@ -1,10 +1,10 @@
 import os
 import sys
-import json
 import uuid
-import shutil
 import re
 import argparse
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Ensure the project root is in the python path
@@ -12,8 +12,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 # --- IMPORTS ---
 from src.clients.shopify_client import ShopifyClient
+from src.clients.upload_streams import print_upload_progress, IterableReader
 from src.theme_manager import ThemeManager
+from src.utils.job_dirs import JobDirectory, resolve_build_root, prune_job_dirs
 from src.logic.theme_utils import replace_colors_in_json_files, inject_video_id
+from src.logic.theme_document import ThemeDocument
 from src.mocks.data_payloads import MOCK_THEME_CONTENT, MOCK_IMAGES
 from src.mocks.mock_visual_generation import mock_generate_all_visuals
 from src.logic.content_prompts import (
@@ -34,7 +37,8 @@ from src.logic.content_prompts import (
     prompt_gpt
 )
 from src.logic.visual_generation import generate_all_visuals
-from src.logic.color_optimizer import generate_new_color_schemas, fix_color_schema, ShopifyColorSchemeOptimizer
+from src.logic.color_optimizer import generate_new_color_schemas, ShopifyColorSchemeOptimizer, COLOR_ENGINES
+from src.logic.color_cache import ColorSchemaCache
 
 # Load env vars
 load_dotenv()
@@ -48,6 +52,18 @@ def convert_cdn_to_shopify_schema(cdn_url):
     filename_part = cdn_url.split('/')[-1].split('?')[0]
     return f"shopify://shop_images/{filename_part}"
 
+def create_about_page(client, brand_name):
+    """Creates the About page and links it in the main menu."""
+    about_html = f"""
+    <div class="about-us">
+        <h1>À propos de {brand_name}</h1>
+        <p>Bienvenue chez {brand_name}. Nous sommes dédiés à l'excellence.</p>
+    </div>
+    """
+    page_id = client.create_page(f"À propos", about_html)
+    if page_id: client.add_page_to_menu(str(page_id), "À propos")
+    return page_id
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--brand_name", default="Luminelle Beauty")
@@ -59,6 +75,17 @@ def main():
     parser.add_argument("--language", default="fr")
     parser.add_argument("--input_image", default=os.path.join("input", "product.png"), help="Path to source product image")
     parser.add_argument("--test", action="store_true", help="Run in test mode (No AI costs)")
+    parser.add_argument("--color_engine", choices=COLOR_ENGINES, default="local",
+                        help="Color schema generator: local palette engine (default), precomputed palette library or the LLM")
+    parser.add_argument("--send_images", action="store_true",
+                        help="Attach the raw product images to the LLM color request (not cached)")
+    parser.add_argument("--image_accents", action="store_true",
+                        help="Color the accent schemes from the product images' hue families")
+    parser.add_argument("--build_root", default=os.getenv("THEME_BUILD_ROOT"), help="Directory job build folders are created in")
+    parser.add_argument("--tmpfs", action="store_true", help="Build in RAM (/dev/shm) when available")
+    parser.add_argument("--keep_build", action="store_true", help="Keep the job build folder after a successful run")
+    parser.add_argument("--build_ttl_hours", type=float, default=24, help="Prune leftover build folders older than this")
+    parser.add_argument("--max_builds", type=int, default=10, help="Prune leftover build folders beyond this count")
     args = parser.parse_args()
 
     if not args.shopify_url or not args.access_token:
@@ -77,20 +104,49 @@ def main():
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     PROJECT_ROOT = os.path.dirname(BASE_DIR)
     BASE_THEME_PATH = os.path.join(PROJECT_ROOT, "assets", "shopify-template")
-    TEMP_DIR = os.path.join(PROJECT_ROOT, "temp_theme_build")
+    BUILD_ROOT = resolve_build_root(args.build_root or os.path.join(PROJECT_ROOT, "temp_theme_build"), args.tmpfs)
+    CACHE_DIR = os.path.join(PROJECT_ROOT, ".theme_cache")
 
-    if os.path.exists(TEMP_DIR): shutil.rmtree(TEMP_DIR)
-    os.makedirs(TEMP_DIR, exist_ok=True)
+    # Every artifact of this job lives in its own folder, so concurrent jobs never share files
+    prune_job_dirs(BUILD_ROOT, args.build_ttl_hours, args.max_builds)
+    with JobDirectory(BUILD_ROOT, job_id, keep=args.keep_build) as job_dir:
+        run_job(args, job_id, job_dir, BASE_THEME_PATH, CACHE_DIR)
 
+def run_job(args, job_id, job_dir, base_theme_path, cache_dir):
     # Initialize
     client = ShopifyClient(args.shopify_url, args.access_token)
-    theme_manager = ThemeManager(BASE_THEME_PATH, TEMP_DIR)
+    theme_manager = ThemeManager(base_theme_path, job_dir.path, cache_dir=cache_dir)
+
+    print_progress("setup", "Loading store context (menus, locales, themes)...")
+    store_context = client.load_store_context()
+    if store_context:
+        print(f"   -> {len(store_context['menus'])} menus, {len(store_context['locales'])} locales, {store_context['theme_count']} themes")
+
+    # Only content the active templates consume is generated
+    demand = theme_manager.demand_index()
+    print(f"   -> Template demand index: {len(demand.occurrences)} placeholders in use")
 
     ai_content = {}
     images_map = {} # Maps Placeholder -> shopify:// URL
     product_image_urls = [] # List of https:// CDN URLs for Product API
     video_shopify_url = None
 
+    # ==============================================================================
+    # 0. STORE OBJECTS (BACKGROUND)
+    # ==============================================================================
+    # Product and pages only depend on the CLI inputs, so they are created while
+    # content and visuals are generated. Media is attached once uploads finish.
+    background = ThreadPoolExecutor(max_workers=2)
+    print_progress("shopify_product", "Creating product (background)...")
+    product_future = background.submit(
+        client.create_product_graphql,
+        title=args.product_title,
+        html_body=f"<p>{args.product_description}</p>",
+        brand=args.brand_name
+    )
+    print_progress("shopify_pages", "Creating Pages (background)...")
+    pages_future = background.submit(create_about_page, client, args.brand_name)
+
     # ==============================================================================
     # 1. CONTENT GENERATION
     # ==============================================================================
@@ -103,89 +159,104 @@ def main():
         print_progress("ai_text", "🧠 Generating Marketing Copy with OpenAI...")
 
         # A. Slogans & Blurbs
-        ai_content["NEW_BRAND_SLOGAN_CONTENT"] = generate_slogan_prompt(args.product_title, args.product_description, args.language)
-        first_slogan = ai_content["NEW_BRAND_SLOGAN_CONTENT"]
+        if demand.wants("NEW_BRAND_SLOGAN_CONTENT", "NEW_SECOND_SLOGAN_CONTENT"):
+            ai_content["NEW_BRAND_SLOGAN_CONTENT"] = generate_slogan_prompt(args.product_title, args.product_description, args.language)
 
-        ai_content["NEW_PRODUCT_BLURB_CONTENT"] = generate_product_blurb_prompt(args.product_title, args.product_description, args.language)
-        ai_content["NEW_CTA_HERO_BUTTON_CONTENT"] = generate_cta_prompt(args.product_title, args.product_description, args.language)
+        if demand.wants("NEW_PRODUCT_BLURB_CONTENT"):
+            ai_content["NEW_PRODUCT_BLURB_CONTENT"] = generate_product_blurb_prompt(args.product_title, args.product_description, args.language)
+        if demand.wants("NEW_CTA_HERO_BUTTON_CONTENT"):
+            ai_content["NEW_CTA_HERO_BUTTON_CONTENT"] = generate_cta_prompt(args.product_title, args.product_description, args.language)
 
         # B. Product Descriptions
-        ai_content["NEW_PRODUCT_DESCRIPTION_1_CONTENT"] = generate_product_description_prompt(args.product_title, args.product_description, args.language)
+        if demand.wants("NEW_PRODUCT_DESCRIPTION_1_CONTENT", "NEW_PRODUCT_HEADING_1_CONTENT"):
+            ai_content["NEW_PRODUCT_DESCRIPTION_1_CONTENT"] = generate_product_description_prompt(args.product_title, args.product_description, args.language)
 
-        heading_prompt = f"Based on product title {args.product_title} and description {ai_content['NEW_PRODUCT_DESCRIPTION_1_CONTENT']} give me a 3 to 4 words heading in {args.language}. Return ONLY the text."
-        ai_content["NEW_PRODUCT_HEADING_1_CONTENT"] = prompt_gpt(heading_prompt)
+        if demand.wants("NEW_PRODUCT_HEADING_1_CONTENT"):
+            heading_prompt = f"Based on product title {args.product_title} and description {ai_content['NEW_PRODUCT_DESCRIPTION_1_CONTENT']} give me a 3 to 4 words heading in {args.language}. Return ONLY the text."
+            ai_content["NEW_PRODUCT_HEADING_1_CONTENT"] = prompt_gpt(heading_prompt)
 
-        ai_content["NEW_SECOND_SLOGAN_CONTENT"] = generate_alternative_slogan_prompt(args.product_title, args.product_description, first_slogan, args.language)
+        if demand.wants("NEW_SECOND_SLOGAN_CONTENT"):
+            first_slogan = ai_content["NEW_BRAND_SLOGAN_CONTENT"]
+            ai_content["NEW_SECOND_SLOGAN_CONTENT"] = generate_alternative_slogan_prompt(args.product_title, args.product_description, first_slogan, args.language)
 
         # C. HTML Content
-        ai_content["NEW_HIGHLIGHT_PRODUCT_FEATURES_CONTENT"] = generate_highlight_prompt(args.language, args.product_title, args.product_description)
-        ai_content["NEW_WHY_CHOOSE_US_BRAND_TEXT_CONTENT"] = generate_why_choose_prompt(args.language, args.brand_name)
+        if demand.wants("NEW_HIGHLIGHT_PRODUCT_FEATURES_CONTENT"):
+            ai_content["NEW_HIGHLIGHT_PRODUCT_FEATURES_CONTENT"] = generate_highlight_prompt(args.language, args.product_title, args.product_description)
+        if demand.wants("NEW_WHY_CHOOSE_US_BRAND_TEXT_CONTENT"):
+            ai_content["NEW_WHY_CHOOSE_US_BRAND_TEXT_CONTENT"] = generate_why_choose_prompt(args.language, args.brand_name)
 
         # D. Video Text
-        ai_content["NEW_PARAGRAPH_PRODUCT_TEXT_VIDEO"] = generate_content_prompt_product(args.product_title, args.product_description, args.language)
-        ai_content["NEW_HEADING_PRODUCT_TEXT_VIDEO"] = generate_heading_prompt_product(args.product_title, args.product_description, args.language)
+        if demand.wants("NEW_PARAGRAPH_PRODUCT_TEXT_VIDEO"):
+            ai_content["NEW_PARAGRAPH_PRODUCT_TEXT_VIDEO"] = generate_content_prompt_product(args.product_title, args.product_description, args.language)
+        if demand.wants("NEW_HEADING_PRODUCT_TEXT_VIDEO"):
+            ai_content["NEW_HEADING_PRODUCT_TEXT_VIDEO"] = generate_heading_prompt_product(args.product_title, args.product_description, args.language)
 
         # E. Complex Structures (JSON)
-        
-        print("   -> Generating Reviews (Structured)...")
-        # 1. Get List of Dicts
-        reviews_list = get_valid_reviews(args.product_title, args.product_description, args.language)
-        
-        # 2. Assign list directly for Multicolumn section
-        ai_content["NEW_THEME_MULTICOLUMN_REVIEWS_LIST"] = reviews_list
-
-        # 3. Construct HTML strings for Home Page placeholders
-        for i in range(4):
-            if i < len(reviews_list):
-                r = reviews_list[i]
-                html_review = f"<h2>{r['review_headline']}</h2><p></p><p>{r['review_body']}</p><h6><strong>{r['author_info']}</strong></h6>"
-                ai_content[f"NEW_REVIEW_{i+1}_HOME_CONTENT"] = html_review
-            else:
-                ai_content[f"NEW_REVIEW_{i+1}_HOME_CONTENT"] = ""
-
-        print("   -> Generating Q&A...")
-        qna = generate_customer_qna(args.product_title, args.product_description, args.language)
-        if qna:
-            for i, item in enumerate(qna):
-                idx = i + 1
-                ai_content[f"NEW_THEME_FAQ_HEADING_{idx}"] = item.get("Question", "")
-                ai_content[f"NEW_THEME_FAQ_CONTENT_{idx}"] = item.get("Answer", "")
-
-        print("   -> Generating Pros...")
-        pros = get_pros_json(args.product_title, args.product_description, args.language)
-        if pros:
-            ai_content["NEW_PROS_1_CONTENT"] = pros.get("pros_store_1", "")
-            ai_content["NEW_PROS_2_CONTENT"] = pros.get("pros_store_2", "")
-            ai_content["NEW_PROS_3_CONTENT"] = pros.get("pros_store_3", "")
-            ai_content["NEW_PROS_4_CONTENT"] = pros.get("pros_store_4", "")
-            ai_content["NEW_PROS_5_CONTENT"] = pros.get("pros_store_5", "")
+        home_review_keys = [f"NEW_REVIEW_{i+1}_HOME_CONTENT" for i in range(4)]
+        if demand.wants("NEW_THEME_MULTICOLUMN_REVIEWS_LIST", *home_review_keys):
+            print("   -> Generating Reviews (Structured)...")
+            # 1. Get List of Dicts
+            reviews_list = get_valid_reviews(args.product_title, args.product_description, args.language)
+
+            # 2. Assign list directly for Multicolumn section
+            ai_content["NEW_THEME_MULTICOLUMN_REVIEWS_LIST"] = reviews_list
+
+            # 3. Construct HTML strings for Home Page placeholders
+            for i in range(4):
+                if i < len(reviews_list):
+                    r = reviews_list[i]
+                    html_review = f"<h2>{r['review_headline']}</h2><p></p><p>{r['review_body']}</p><h6><strong>{r['author_info']}</strong></h6>"
+                    ai_content[f"NEW_REVIEW_{i+1}_HOME_CONTENT"] = html_review
+                else:
+                    ai_content[f"NEW_REVIEW_{i+1}_HOME_CONTENT"] = ""
+
+        faq_keys = [f"NEW_THEME_FAQ_{kind}_{i+1}" for i in range(4) for kind in ("HEADING", "CONTENT")]
+        if demand.wants(*faq_keys):
+            print("   -> Generating Q&A...")
+            qna = generate_customer_qna(args.product_title, args.product_description, args.language)
+            if qna:
+                for i, item in enumerate(qna):
+                    idx = i + 1
+                    ai_content[f"NEW_THEME_FAQ_HEADING_{idx}"] = item.get("Question", "")
+                    ai_content[f"NEW_THEME_FAQ_CONTENT_{idx}"] = item.get("Answer", "")
+
+        pros_keys = [f"NEW_PROS_{i+1}_CONTENT" for i in range(5)]
+        if demand.wants(*pros_keys):
+            print("   -> Generating Pros...")
+            pros = get_pros_json(args.product_title, args.product_description, args.language)
+            if pros:
+                ai_content["NEW_PROS_1_CONTENT"] = pros.get("pros_store_1", "")
+                ai_content["NEW_PROS_2_CONTENT"] = pros.get("pros_store_2", "")
+                ai_content["NEW_PROS_3_CONTENT"] = pros.get("pros_store_3", "")
+                ai_content["NEW_PROS_4_CONTENT"] = pros.get("pros_store_4", "")
+                ai_content["NEW_PROS_5_CONTENT"] = pros.get("pros_store_5", "")
 
         # --- F. FOOTER & TRUST BADGES (MISSING BLOCK ADDED HERE) ---
         print("   -> Generating Footer Features...")
-        
-        # 1. Shipping
-        ai_content["NEW_THEME_FOOTER_FEATURE_1_TITLE"] = translate_text("Free Shipping", args.language)
-        ai_content["NEW_THEME_FOOTER_FEATURE_1_DESCRIPTION"] = translate_text("On all orders over $50", args.language)
-        
-        # 2. Returns
-        ai_content["NEW_THEME_FOOTER_FEATURE_2_TITLE"] = translate_text("Satisfied or Refunded", args.language)
-        ai_content["NEW_THEME_FOOTER_FEATURE_2_DESCRIPTION"] = translate_text("30-day money-back guarantee", args.language)
-        
-        # 3. Support
-        ai_content["NEW_THEME_FOOTER_FEATURE_3_TITLE"] = translate_text("Support 24/7", args.language)
-        ai_content["NEW_THEME_FOOTER_FEATURE_3_DESCRIPTION"] = translate_text("Our team is here to help", args.language)
-        
-        # 4. Security
-        ai_content["NEW_THEME_FOOTER_FEATURE_4_TITLE"] = translate_text("Secure Checkout", args.language)
-        ai_content["NEW_THEME_FOOTER_FEATURE_4_DESCRIPTION"] = translate_text("100% Secure Payment", args.language)
-
-        # Footer Misc
-        ai_content["FOOTER_ANNOUNCEMENT_1"] = translate_text("Limited Time Offer: 20% OFF", args.language)
-        ai_content["FOOTER_ANNOUNCEMENT_2"] = translate_text("New Arrivals Weekly", args.language)
-        ai_content["FOOTER_NEWSLETTER_HEADING"] = translate_text("Join Our Newsletter", args.language)
-        ai_content["FOOTER_NEWSLETTER_SUBHEADING"] = translate_text("Get exclusive deals and updates.", args.language)
-        ai_content["FOOTER_NEWSLETTER_PRIVACY_NOTE"] = translate_text("We respect your privacy.", args.language)
-        ai_content["FOOTER_GET_IN_TOUCH_TITLE"] = translate_text("Get In Touch", args.language)
+        footer_texts = {
+            # 1. Shipping
+            "NEW_THEME_FOOTER_FEATURE_1_TITLE": "Free Shipping",
+            "NEW_THEME_FOOTER_FEATURE_1_DESCRIPTION": "On all orders over $50",
+            # 2. Returns
+            "NEW_THEME_FOOTER_FEATURE_2_TITLE": "Satisfied or Refunded",
+            "NEW_THEME_FOOTER_FEATURE_2_DESCRIPTION": "30-day money-back guarantee",
+            # 3. Support
+            "NEW_THEME_FOOTER_FEATURE_3_TITLE": "Support 24/7",
+            "NEW_THEME_FOOTER_FEATURE_3_DESCRIPTION": "Our team is here to help",
+            # 4. Security
+            "NEW_THEME_FOOTER_FEATURE_4_TITLE": "Secure Checkout",
+            "NEW_THEME_FOOTER_FEATURE_4_DESCRIPTION": "100% Secure Payment",
+            # Footer Misc
+            "FOOTER_ANNOUNCEMENT_1": "Limited Time Offer: 20% OFF",
+            "FOOTER_ANNOUNCEMENT_2": "New Arrivals Weekly",
+            "FOOTER_NEWSLETTER_HEADING": "Join Our Newsletter",
+            "FOOTER_NEWSLETTER_SUBHEADING": "Get exclusive deals and updates.",
+            "FOOTER_NEWSLETTER_PRIVACY_NOTE": "We respect your privacy.",
+            "FOOTER_GET_IN_TOUCH_TITLE": "Get In Touch"
+        }
+        for key, text in footer_texts.items():
+            if demand.wants(key):
+                ai_content[key] = translate_text(text, args.language)
         ai_content["FOOTER_GET_IN_TOUCH_DESCRIPTION"] = f"support@{args.brand_name.lower().replace(' ', '')}.com"
 
         # G. Translations (UI Elements)
@@ -230,10 +301,14 @@ def main():
 
         print("   -> Translating Labels...")
         for key, text in labels_to_translate.items():
-            ai_content[key] = translate_text(text, args.language)
+            if demand.wants(key):
+                ai_content[key] = translate_text(text, args.language)
 
-        original_benefits = r"<p>🚚 Free shipping with every order<br\/>☎️ 24\/7 Customer support<br\/>🗓️ 30-Day-Guarantee<br\/>✨ 4.9\/5 Customer rating<\/p>"
-        ai_content["NEW_THEME_BENEFITS_PRODUCT_CONTENT"] = translate_benefits(original_benefits, args.language)
+        if demand.wants("NEW_THEME_BENEFITS_PRODUCT_CONTENT"):
+            original_benefits = r"<p>🚚 Free shipping with every order<br\/>☎️ 24\/7 Customer support<br\/>🗓️ 30-Day-Guarantee<br\/>✨ 4.9\/5 Customer rating<\/p>"
+            ai_content["NEW_THEME_BENEFITS_PRODUCT_CONTENT"] = translate_benefits(original_benefits, args.language)
+
+    demand.report_unused(ai_content)
 
 
     # ==============================================================================
@@ -249,7 +324,7 @@ def main():
             args.product_title,
             args.product_description,
             args.input_image,
-            TEMP_DIR
+            job_dir.assets_dir
         )
     else:
         print_progress("images", "🎨 Generating AI Visuals (DALL-E 2 + RunwayML)...")
@@ -257,13 +332,14 @@ def main():
             args.product_title,
             args.product_description,
             args.input_image,
-            TEMP_DIR
+            job_dir.assets_dir
         )
 
     if generated_assets:
         print("   -> Uploading assets to Shopify Storage...")
+        uploaded_urls = client.upload_local_files(list(generated_assets.values()), mime_type="image/png", resource="IMAGE")
         for placeholder, local_path in generated_assets.items():
-            cdn_url = client.upload_local_file(local_path, mime_type="image/png", resource="IMAGE")
+            cdn_url = uploaded_urls.get(local_path)
             if cdn_url:
                 theme_schema_url = convert_cdn_to_shopify_schema(cdn_url)
                 images_map[placeholder] = theme_schema_url
@@ -273,7 +349,7 @@ def main():
 
     if local_video_path and os.path.exists(local_video_path):
         print("   -> Uploading video to Shopify...")
-        video_shopify_url = client.upload_video_to_shopify(local_video_path, "Product Video")
+        video_shopify_url = client.upload_video_to_shopify(local_video_path, "Product Video", progress_callback=print_upload_progress("video"))
         if video_shopify_url:
             print(f"      ✅ Video Ready: {video_shopify_url}")
         else:
@@ -283,39 +359,36 @@ def main():
 
 
     # ==============================================================================
-    # 3. CREATE PRODUCT
+    # 3. ATTACH PRODUCT MEDIA
     # ==============================================================================
-    print_progress("shopify_product", "Creating product...")
-    product = client.create_product(
-        title=args.product_title,
-        html_body=f"<p>{args.product_description}</p>",
-        image_urls=product_image_urls,
-        brand=args.brand_name
-    )
+    product = product_future.result()
     product_handle = product["handle"] if product else "test-product"
 
+    # Media references the files we already uploaded; processing is confirmed at the end
+    product_media_ids = [client.file_ids[url] for url in product_image_urls if url in client.file_ids]
+    if product and product_media_ids:
+        print_progress("shopify_product", f"Attaching {len(product_media_ids)} media to {product_handle}...")
+        client.attach_product_media(product["id"], file_ids=product_media_ids)
+
     # ==============================================================================
-    # 4. CREATE PAGES
+    # 4. PAGES
     # ==============================================================================
-    print_progress("shopify_pages", "Creating Pages...")
-    about_html = f"""
-    <div class="about-us">
-        <h1>À propos de {args.brand_name}</h1>
-        <p>Bienvenue chez {args.brand_name}. Nous sommes dédiés à l'excellence.</p>
-    </div>
-    """
-    page_id = client.create_page(f"À propos", about_html)
-    if page_id: client.add_page_to_menu(str(page_id), "À propos")
+    if not pages_future.result():
+        print("   ⚠️ About page was not created.")
+    background.shutdown()
 
     # ==============================================================================
     # 5. THEME INJECTION & PROCESSING
     # ==============================================================================
     print_progress("inject", "Injecting content into theme...")
     workspace_path = theme_manager.setup_workspace(job_id)
+    # Theme JSON is loaded once, edited in memory by every stage below and flushed before zipping
+    theme_doc = ThemeDocument(workspace_path)
 
     # A. Standard replacement
     theme_manager.process_notebook_logic(
-        workspace_path, ai_content, images_map, args.primary_color, args.brand_name, product_handle
+        workspace_path, ai_content, images_map, args.primary_color, args.brand_name, product_handle,
+        document=theme_doc
     )
 
     # ==============================================================================
@@ -331,46 +404,51 @@ def main():
 
     if args.test:
         print("   🧪 Test Mode: Running hex replacement only.")
-        replace_colors_in_json_files(workspace_path, color_replacements)
+        replace_colors_in_json_files(workspace_path, color_replacements, document=theme_doc)
     else:
-        print("   🧠 Production Mode: Generating Full Color Schema (GPT-4o)...")
+        if args.color_engine == "llm":
+            print("   🧠 Production Mode: Generating Full Color Schema (GPT-4o)...")
+        else:
+            print(f"   🎨 Production Mode: Generating Full Color Schema ({args.color_engine} palette engine)...")
 
         settings_path = os.path.join(workspace_path, "config", "settings_data.json")
         index_path = os.path.join(workspace_path, "templates", "index.json")
-        product_path = os.path.join(workspace_path, "templates", "product.json")
 
         try:
-            with open(settings_path, 'r') as f:
-                settings_content = f.read()
+            settings_data = theme_doc.data(settings_path)
 
-            # 1. Generate Schema
-            new_schema_str = generate_new_color_schemas(
-                original_color_schema=settings_content,
+            # 1. Generate Schema (color_schemes are updated in place in the document)
+            generate_new_color_schemas(
+                original_color_schema=settings_data,
                 theme_primary_color=args.primary_color,
                 theme_description="Luxury Brand",
                 index_json_path=index_path,
-                images_folder_path=TEMP_DIR
+                image_paths=list(generated_assets.values()),
+                index_json_content=theme_doc.text(index_path),
+                engine=args.color_engine,
+                send_images=args.send_images,
+                image_accents=args.image_accents,
+                cache=ColorSchemaCache(os.path.join(cache_dir, "colors")),
+                palette_library_path=os.path.join(cache_dir, "palette_library.npz")
             )
 
-            # 2. Sanitize & Write
-            fixed_schema = fix_color_schema(new_schema_str)
-            # Verify JSON valid before writing
-            json.loads(fixed_schema)
+            # 2. Write (only the changed values; comments and formatting are kept)
+            theme_doc.touch(settings_path)
+            print("   ✅ Applied Color Schema.")
 
-            with open(settings_path, 'w') as f:
-                f.write(fixed_schema)
-            print("   ✅ Applied AI Schema.")
-
-            # 3. Optimize Sections
+            # 3. Optimize Sections (one assignment pass over every template)
             optimizer = ShopifyColorSchemeOptimizer()
-            optimizer.optimize_theme_colors(fixed_schema, index_path, TEMP_DIR)
-            optimizer.optimize_theme_colors(fixed_schema, product_path, TEMP_DIR)
+            template_paths = sorted(p for p in theme_doc.json_files() if p.startswith("templates/"))
+            scheme_diff = optimizer.optimize_templates(settings_data, theme_doc, template_paths)
+            for change in scheme_diff:
+                print(f"      {change['file']} {change['section']}: {change['old']} -> {change['new']}")
+            optimizer.apply_diff(theme_doc, scheme_diff)
 
         except Exception as e:
             print(f"   ❌ Color Generation Failed ({e}). Falling back to simple replacement.")
 
-        # 4. Run cleanup replacement anyway
-        replace_colors_in_json_files(workspace_path, color_replacements)
+        # 4. Run cleanup replacement anyway (the fallback when generation failed)
+        replace_colors_in_json_files(workspace_path, color_replacements, document=theme_doc)
 
 
     # ==============================================================================
@@ -378,16 +456,22 @@ def main():
     # ==============================================================================
     if video_shopify_url:
         print_progress("video", "Injecting Video ID into JSONs...")
-        inject_video_id(workspace_path, video_shopify_url)
+        inject_video_id(workspace_path, video_shopify_url, document=theme_doc)
+
+    theme_doc.flush()
 
     # ==============================================================================
     # 8. UPLOAD & PUBLISH
     # ==============================================================================
-    print_progress("zip", "Zipping theme...")
-    zip_path = theme_manager.zip_theme(workspace_path)
+    print_progress("zip", "Planning theme archive...")
+    archive = theme_manager.plan_archive(workspace_path)
 
-    print_progress("hosting", "Uploading to Shopify Storage...")
-    uploaded_file_url = client.upload_local_file(zip_path, mime_type="application/zip", resource="FILE")
+    # The archive is produced while it is uploaded; no ZIP is written to disk
+    print_progress("hosting", "Streaming theme archive to Shopify Storage...")
+    with closing(IterableReader(archive.iter_chunks())) as archive_stream:
+        uploaded_file_url = client.upload_stream(archive_stream, f"{os.path.basename(workspace_path)}.zip", archive.total_size,
+                                                 mime_type="application/zip", resource="FILE",
+                                                 progress_callback=print_upload_progress("theme zip"))
 
     if not uploaded_file_url:
         raise Exception("Upload failed")
@@ -402,6 +486,12 @@ def main():
         print_progress("language", f"Activating Language: {args.language}")
         client.enable_store_language(args.language)
 
+        if product and product_media_ids:
+            if client.wait_for_product_media(product["id"], len(product_media_ids)):
+                print("   ✅ Product media ready.")
+            else:
+                print("   ⚠️ Product media not confirmed READY.")
+
         print("DONE! 🚀")
     else:
         print("❌ Theme upload failed")
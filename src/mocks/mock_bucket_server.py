@@ -0,0 +1,211 @@
+import re
+import time
+import uuid
+import socket
+import argparse
+import threading
+from email import policy
+from email.parser import BytesParser
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Bytes persisted after an interrupted chunk are rounded down to this, like GCS
+PERSIST_GRANULARITY = 256 * 1024
+
+
+class MockBucket:
+    """
+    In-memory stand-in for the S3/GCS buckets behind Shopify staged upload targets.
+    Supports multipart POST, raw PUT and the GCS resumable protocol, and can
+    inject latency, dropped connections and 5xx errors to exercise retry logic.
+    """
+    def __init__(self, latency: float = 0.0, interrupt_at: int = None, error_every: int = 0):
+        self.latency = latency
+        self.interrupt_at = interrupt_at  # drop the connection once the session reaches this offset
+        self.error_every = error_every  # answer every Nth chunk PUT with a 503
+        self.objects = {}
+        self.sessions = {}
+        self.interruptions = 0
+        self.requests_seen = 0
+        self.lock = threading.Lock()
+
+    def new_session(self, key: str, content_type: str) -> str:
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = {
+                "key": key,
+                "content_type": content_type,
+                "data": bytearray(),
+                "interrupted": False,
+                "complete": False
+            }
+        return session_id
+
+
+def signed_for_resumable(path: str) -> bool:
+    query = {name.lower(): value for name, value in parse_qsl(urlsplit(path).query)}
+    if "x-goog-signature" not in query:
+        return True
+    return "x-goog-resumable" in query.get("x-goog-signedheaders", "").lower().split(";")
+
+
+def make_handler(bucket: MockBucket):
+    class BucketHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body: bytes = b"", headers: dict = None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def _read_body(self) -> bytes:
+            length = int(self.headers.get("Content-Length", 0))
+            return self.rfile.read(length) if length else b""
+
+        def _drop_connection(self):
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        def do_GET(self):
+            time.sleep(bucket.latency)
+            key = self.path.lstrip("/")
+            if key not in bucket.objects:
+                return self._reply(404, b"Not Found")
+            self._reply(200, bytes(bucket.objects[key]))
+
+        def do_POST(self):
+            time.sleep(bucket.latency)
+            key = self.path.lstrip("/").split("?")[0]
+
+            if self.headers.get("x-goog-resumable") == "start":
+                self._read_body()
+                if not signed_for_resumable(self.path):
+                    # Like GCS: the V4 signature covers the method, so a PUT-signed URL rejects the POST
+                    return self._reply(403, b"SignatureDoesNotMatch")
+                session_id = bucket.new_session(key, self.headers.get("Content-Type", ""))
+                host = self.headers.get("Host")
+                return self._reply(201, headers={"Location": f"http://{host}/upload/resumable/{session_id}"})
+
+            # S3-style multipart POST: form fields + "file" part
+            body = self._read_body()
+            header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+            message = BytesParser(policy=policy.default).parsebytes(header + body)
+            fields = {}
+            file_bytes = None
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename() is not None:
+                    file_bytes = part.get_payload(decode=True)
+                else:
+                    fields[name] = part.get_payload(decode=True).decode("utf-8")
+            if file_bytes is None:
+                return self._reply(400, b"Missing file part")
+            bucket.objects[fields.get("key", key)] = file_bytes
+            self._reply(204)
+
+        def do_PUT(self):
+            time.sleep(bucket.latency)
+            match = re.match(r"^/upload/resumable/([0-9a-f]+)$", self.path)
+            if not match:
+                bucket.objects[self.path.lstrip("/").split("?")[0]] = self._read_body()
+                return self._reply(200)
+
+            session = bucket.sessions.get(match.group(1))
+            if not session:
+                return self._reply(404, b"No such upload session")
+
+            content_range = self.headers.get("Content-Range", "")
+            status_query = re.match(r"^bytes \*/(\d+|\*)$", content_range)
+            chunk_range = re.match(r"^bytes (\d+)-(\d+)/(\d+|\*)$", content_range)
+
+            if status_query:
+                self._read_body()
+                return self._session_status(session)
+
+            if not chunk_range:
+                self._read_body()
+                return self._reply(400, b"Missing Content-Range")
+
+            with bucket.lock:
+                bucket.requests_seen += 1
+                fail_now = bucket.error_every and bucket.requests_seen % bucket.error_every == 0
+            if fail_now:
+                self._read_body()
+                return self._reply(503, b"Service Unavailable")
+
+            start, end = int(chunk_range.group(1)), int(chunk_range.group(2))
+            total = chunk_range.group(3)
+            if start != len(session["data"]):
+                self._read_body()
+                return self._session_status(session)
+
+            length = int(self.headers.get("Content-Length", 0))
+            if (bucket.interrupt_at is not None and not session["interrupted"]
+                    and start <= bucket.interrupt_at < start + length):
+                # Persist part of the chunk, then drop the connection mid-body
+                partial = self.rfile.read(bucket.interrupt_at - start)
+                keep = (len(partial) // PERSIST_GRANULARITY) * PERSIST_GRANULARITY
+                session["data"] += partial[:keep]
+                session["interrupted"] = True
+                bucket.interruptions += 1
+                return self._drop_connection()
+
+            session["data"] += self.rfile.read(length)
+            if total != "*" and end + 1 == int(total):
+                session["complete"] = True
+                bucket.objects[session["key"]] = bytes(session["data"])
+                return self._reply(200, b"{}", {"Content-Type": "application/json"})
+            self._session_status(session)
+
+        def _session_status(self, session):
+            if session["complete"]:
+                return self._reply(200, b"{}", {"Content-Type": "application/json"})
+            headers = {}
+            if session["data"]:
+                headers["Range"] = f"bytes=0-{len(session['data']) - 1}"
+            self._reply(308, headers=headers)
+
+    return BucketHandler
+
+
+def start_mock_bucket(host: str = "127.0.0.1", port: int = 0, **options):
+    """
+    Starts the bucket server on a background thread.
+    Returns the server; server.base_url and server.bucket are set for convenience.
+    """
+    bucket = MockBucket(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(bucket))
+    server.daemon_threads = True
+    server.bucket = bucket
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for staged upload buckets")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--interrupt_at", type=int, default=None, help="Drop the connection once per session at this byte offset")
+    parser.add_argument("--error_every", type=int, default=0, help="Return 503 for every Nth chunk")
+    args = parser.parse_args()
+
+    srv = start_mock_bucket(args.host, args.port, latency=args.latency,
+                            interrupt_at=args.interrupt_at, error_every=args.error_every)
+    print(f"🪣 Mock bucket listening on {srv.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
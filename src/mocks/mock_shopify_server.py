@@ -0,0 +1,462 @@
+import re
+import json
+import time
+import argparse
+import unicodedata
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from src.mocks.mock_bucket_server import start_mock_bucket
+
+API_VERSION = "2025-01"
+
+
+class LeakyBucket:
+    """Shopify-style leaky bucket, used for both REST call limits and GraphQL cost points."""
+    def __init__(self, capacity: float, leak_rate: float):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def _leak(self):
+        now = time.time()
+        self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+        self.updated = now
+
+    def take(self, amount: float) -> bool:
+        with self.lock:
+            self._leak()
+            if self.level + amount > self.capacity:
+                return False
+            self.level += amount
+            return True
+
+    def available(self) -> float:
+        with self.lock:
+            self._leak()
+            return self.capacity - self.level
+
+
+class FakeShopifyStore:
+    """
+    In-memory state behind the fake Admin API: files, products, themes, pages,
+    menus and locales, with configurable processing delays and rate limits.
+    """
+    def __init__(self, bucket_url: str, latency: float = 0.0, file_processing_delay: float = 1.0,
+                 video_processing_delay: float = 3.0, theme_processing_delay: float = 3.0,
+                 rest_bucket_size: int = 40, rest_leak_rate: float = 2.0,
+                 graphql_bucket_size: int = 1000, graphql_restore_rate: float = 50.0,
+                 put_resources: tuple = ("FILE", "VIDEO"), resumable_targets: bool = False):
+        self.bucket_url = bucket_url
+        self.latency = latency
+        self.file_processing_delay = file_processing_delay
+        self.video_processing_delay = video_processing_delay
+        self.theme_processing_delay = theme_processing_delay
+        self.put_resources = set(put_resources)
+        # PUT targets are V4-signed like Shopify's: for a plain PUT, or (resumable_targets) for a session start
+        self.resumable_targets = resumable_targets
+        self.rest_limit = LeakyBucket(rest_bucket_size, rest_leak_rate)
+        self.graphql_limit = LeakyBucket(graphql_bucket_size, graphql_restore_rate)
+
+        self.lock = threading.Lock()
+        self.next_id = 1000
+        self.files = {}
+        self.products = {}
+        self.pages = {}
+        self.themes = {}
+        self.menus = {"1": {"id": 1, "handle": "main-menu", "title": "Main menu", "items": []},
+                      "2": {"id": 2, "handle": "footer", "title": "Footer menu", "items": []}}
+        self.locales = {"en": {"locale": "en", "name": "English", "primary": True, "published": True}}
+        self.calls = {}
+
+    def new_id(self) -> int:
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def count(self, name: str):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def file_status(self, record: dict) -> str:
+        return "READY" if time.time() >= record["ready_at"] else "PROCESSING"
+
+
+# ==============================================================================
+# GRAPHQL RESOLVERS
+# ==============================================================================
+
+def handleize(title: str) -> str:
+    ascii_title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", ascii_title.lower()).strip("-") or "product"
+
+
+def estimate_query_cost(query: str) -> int:
+    """Rough stand-in for Shopify's calculated query cost."""
+    if query.lstrip().startswith("mutation"):
+        return 10
+    return 1 + sum(int(n) // 10 for n in re.findall(r"first:\s*(\d+)", query))
+
+
+def resolve_graphql(store: FakeShopifyStore, query: str, variables: dict) -> dict:
+    if "stagedUploadsCreate" in query:
+        store.count("stagedUploadsCreate")
+        targets = []
+        for item in variables.get("input", []):
+            key = f"staged/{store.new_id()}/{item['filename']}"
+            if item.get("resource") in store.put_resources:
+                signed_headers = "host;x-goog-resumable" if store.resumable_targets else "host"
+                signature = f"X-Goog-Algorithm=GOOG4-RSA-SHA256&X-Goog-SignedHeaders={signed_headers}&X-Goog-Signature=fake"
+                targets.append({"url": f"{store.bucket_url}/{key}?{signature}", "resourceUrl": f"{store.bucket_url}/{key}",
+                                "parameters": [{"name": "content_type", "value": item.get("mimeType", "")}]})
+            else:
+                targets.append({"url": store.bucket_url, "resourceUrl": f"{store.bucket_url}/{key}",
+                                "parameters": [{"name": "key", "value": key},
+                                               {"name": "policy", "value": "fake-policy"},
+                                               {"name": "Content-Type", "value": item.get("mimeType", "")}]})
+        return {"stagedUploadsCreate": {"stagedTargets": targets, "userErrors": []}}
+
+    if "fileCreate" in query:
+        store.count("fileCreate")
+        created = []
+        for item in variables.get("files", []):
+            content_type = item.get("contentType", "FILE")
+            kind = {"IMAGE": "MediaImage", "VIDEO": "Video"}.get(content_type, "GenericFile")
+            delay = store.video_processing_delay if kind == "Video" else store.file_processing_delay
+            gid = f"gid://shopify/{kind}/{store.new_id()}"
+            store.files[gid] = {"id": gid, "kind": kind, "url": item["originalSource"],
+                                "alt": item.get("alt", ""), "ready_at": time.time() + delay, "references": []}
+            created.append({"id": gid, "fileStatus": "UPLOADED"})
+        return {"fileCreate": {"files": created, "userErrors": []}}
+
+    if "fileUpdate" in query:
+        store.count("fileUpdate")
+        updated, errors = [], []
+        for item in variables.get("files", []):
+            record = store.files.get(item["id"])
+            if not record:
+                errors.append({"field": ["files", "id"], "message": f"File {item['id']} not found"})
+                continue
+            for product_id in item.get("referencesToAdd", []):
+                product = store.products.get(product_id)
+                if product is not None:
+                    record["references"].append(product_id)
+                    product["media"].append({"id": record["id"], "ready_at": record["ready_at"]})
+            updated.append({"id": record["id"]})
+        return {"fileUpdate": {"files": updated, "userErrors": errors}}
+
+    if "productSet" in query:
+        store.count("productSet")
+        data = variables.get("input", {})
+        numeric_id = store.new_id()
+        gid = f"gid://shopify/Product/{numeric_id}"
+        handle = handleize(data.get("title", "product"))
+        store.products[gid] = {"id": gid, "legacy_id": numeric_id, "handle": handle, "input": data, "media": []}
+        return {"productSet": {"product": {"id": gid, "handle": handle}, "userErrors": []}}
+
+    if "publishablePublish" in query:
+        store.count("publishablePublish")
+        return {"publishablePublish": {"userErrors": []}}
+
+    if "productCreateMedia" in query:
+        store.count("productCreateMedia")
+        product = store.products.get(variables.get("productId"))
+        if product is None:
+            return {"productCreateMedia": {"media": [], "mediaUserErrors": [{"field": ["productId"], "message": "Product not found"}]}}
+        created = []
+        for item in variables.get("media", []):
+            media = {"id": f"gid://shopify/MediaImage/{store.new_id()}", "ready_at": time.time() + store.file_processing_delay}
+            product["media"].append(media)
+            created.append({"id": media["id"], "status": "UPLOADED"})
+        return {"productCreateMedia": {"media": created, "mediaUserErrors": []}}
+
+    if "shopLocaleEnable" in query:
+        store.count("shopLocaleEnable")
+        locale = variables["locale"]
+        store.locales.setdefault(locale, {"locale": locale, "name": locale, "primary": False, "published": False})
+        return {"shopLocaleEnable": {"shopLocale": store.locales[locale], "userErrors": []}}
+
+    if "shopLocaleUpdate" in query:
+        store.count("shopLocaleUpdate")
+        locale = store.locales.get(variables["locale"])
+        if not locale:
+            return {"shopLocaleUpdate": {"shopLocale": None, "userErrors": [{"field": ["locale"], "message": "Locale not enabled"}]}}
+        locale["published"] = variables.get("shopLocale", {}).get("published", locale["published"])
+        return {"shopLocaleUpdate": {"shopLocale": locale, "userErrors": []}}
+
+    if re.search(r"\bproduct\(id:", query):
+        store.count("product")
+        product = store.products.get(variables.get("id"))
+        if not product:
+            return {"product": None}
+        nodes = [{"id": m["id"], "status": "READY" if time.time() >= m["ready_at"] else "PROCESSING"} for m in product["media"]]
+        return {"product": {"media": {"nodes": nodes}}}
+
+    if re.search(r"\bnode\(id:", query):
+        store.count("node")
+        record = store.files.get(variables.get("id"))
+        if not record:
+            return {"node": None}
+        node = {"id": record["id"], "fileStatus": store.file_status(record)}
+        ready = node["fileStatus"] == "READY"
+        if record["kind"] == "GenericFile" and "GenericFile" in query:
+            node["url"] = record["url"] if ready else None
+        elif record["kind"] == "MediaImage" and "MediaImage" in query:
+            node["image"] = {"url": record["url"]} if ready else None
+        elif record["kind"] == "Video" and "Video" in query:
+            node["sources"] = [{"url": record["url"]}] if ready else []
+        else:
+            return {"node": {}}
+        return {"node": node}
+
+    # Store-context style queries: any combination of (optionally aliased) root connections
+    roots = {
+        "menus": lambda: {"nodes": [{"id": f"gid://shopify/Menu/{m['id']}", "handle": m["handle"], "title": m["title"]}
+                                    for m in store.menus.values()]},
+        "shopLocales": lambda: list(store.locales.values()),
+        "themes": lambda: {"nodes": [{"id": f"gid://shopify/OnlineStoreTheme/{t['id']}", "name": t["name"],
+                                      "role": t["role"].upper(), "processing": theme_processing(store, t)}
+                                     for t in store.themes.values()]},
+        "locations": lambda: {"nodes": [{"id": "gid://shopify/Location/1"}]},
+        "publications": lambda: {"nodes": [{"id": "gid://shopify/Publication/1", "name": "Online Store"}]}
+    }
+    result = {}
+    for alias, field in re.findall(r"(?:(\w+)\s*:\s*)?\b(menus|shopLocales|themes|locations|publications)\b", query):
+        store.count(field)
+        result[alias or field] = roots[field]()
+    if result:
+        return result
+    raise ValueError("Unsupported query")
+
+
+def theme_processing(store: FakeShopifyStore, theme: dict) -> bool:
+    return time.time() < theme["created_at"] + store.theme_processing_delay
+
+
+# ==============================================================================
+# HTTP HANDLER
+# ==============================================================================
+
+def make_handler(store: FakeShopifyStore):
+    prefix = f"/admin/api/{API_VERSION}"
+
+    class AdminHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status: int, payload, headers: dict = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length) if length else b""
+            return json.loads(raw) if raw else {}
+
+        def _authorized(self) -> bool:
+            if not self.headers.get("X-Shopify-Access-Token"):
+                self._json(401, {"errors": "[API] Invalid API key or access token"})
+                return False
+            return True
+
+        def _rest(self, method: str):
+            """Applies latency and the REST leaky bucket. Returns the call-limit header or None if throttled."""
+            time.sleep(store.latency)
+            if not store.rest_limit.take(1):
+                self._json(429, {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."},
+                           {"Retry-After": "1.0"})
+                return None
+            used = store.rest_limit.capacity - store.rest_limit.available()
+            return {"X-Shopify-Shop-Api-Call-Limit": f"{int(round(used))}/{int(store.rest_limit.capacity)}"}
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                return self._json(200, {"calls": store.calls, "themes": len(store.themes), "products": len(store.products)})
+            if not self._authorized():
+                return
+            limit = self._rest("GET")
+            if limit is None:
+                return
+
+            match = re.match(rf"^{prefix}/themes/(\d+)\.json$", self.path)
+            if match:
+                store.count("GET themes/{id}")
+                theme = store.themes.get(match.group(1))
+                if not theme:
+                    return self._json(404, {"errors": "Not Found"}, limit)
+                return self._json(200, {"theme": {**rest_theme(theme), "processing": theme_processing(store, theme)}}, limit)
+
+            if self.path == f"{prefix}/themes.json":
+                store.count("GET themes")
+                return self._json(200, {"themes": [rest_theme(t) for t in store.themes.values()]}, limit)
+
+            if self.path == f"{prefix}/menus.json":
+                store.count("GET menus")
+                return self._json(200, {"menus": [{"id": m["id"], "handle": m["handle"], "title": m["title"]}
+                                                  for m in store.menus.values()]}, limit)
+
+            self._json(404, {"errors": "Not Found"}, limit)
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if self.path == f"{prefix}/graphql.json":
+                return self._graphql()
+
+            limit = self._rest("POST")
+            if limit is None:
+                return
+            payload = self._body()
+
+            if self.path == f"{prefix}/themes.json":
+                store.count("POST themes")
+                data = payload.get("theme", {})
+                theme_id = store.new_id()
+                theme = {"id": theme_id, "name": data.get("name", ""), "role": data.get("role", "unpublished"),
+                         "src": data.get("src"), "created_at": time.time()}
+                store.themes[str(theme_id)] = theme
+                return self._json(201, {"theme": rest_theme(theme)}, limit)
+
+            if self.path == f"{prefix}/products.json":
+                store.count("POST products")
+                data = payload.get("product", {})
+                numeric_id = store.new_id()
+                gid = f"gid://shopify/Product/{numeric_id}"
+                handle = handleize(data.get("title", "product"))
+                store.products[gid] = {"id": gid, "legacy_id": numeric_id, "handle": handle, "input": data, "media": []}
+                return self._json(201, {"product": {"id": numeric_id, "handle": handle, "title": data.get("title")}}, limit)
+
+            if self.path == f"{prefix}/pages.json":
+                store.count("POST pages")
+                page_id = store.new_id()
+                store.pages[page_id] = payload.get("page", {})
+                return self._json(201, {"page": {"id": page_id, **store.pages[page_id]}}, limit)
+
+            match = re.match(rf"^{prefix}/menus/(\d+)/items\.json$", self.path)
+            if match:
+                store.count("POST menu items")
+                menu = store.menus.get(match.group(1))
+                if not menu:
+                    return self._json(404, {"errors": "Not Found"}, limit)
+                menu["items"].append(payload.get("menu_item", {}))
+                return self._json(201, {"menu_item": payload.get("menu_item", {})}, limit)
+
+            self._json(404, {"errors": "Not Found"}, limit)
+
+        def do_PUT(self):
+            if not self._authorized():
+                return
+            limit = self._rest("PUT")
+            if limit is None:
+                return
+            payload = self._body()
+
+            match = re.match(rf"^{prefix}/themes/(\d+)\.json$", self.path)
+            if match:
+                store.count("PUT themes/{id}")
+                theme = store.themes.get(match.group(1))
+                if not theme:
+                    return self._json(404, {"errors": "Not Found"}, limit)
+                role = payload.get("theme", {}).get("role")
+                if role == "main":
+                    if theme_processing(store, theme):
+                        return self._json(422, {"errors": {"role": ["cannot be main while processing"]}}, limit)
+                    for other in store.themes.values():
+                        if other["role"] == "main":
+                            other["role"] = "unpublished"
+                if role:
+                    theme["role"] = role
+                return self._json(200, {"theme": rest_theme(theme)}, limit)
+
+            self._json(404, {"errors": "Not Found"}, limit)
+
+        def _graphql(self):
+            time.sleep(store.latency)
+            payload = self._body()
+            query = payload.get("query", "")
+            cost = estimate_query_cost(query)
+            throttle = {"maximumAvailable": store.graphql_limit.capacity,
+                        "restoreRate": store.graphql_limit.leak_rate}
+
+            if not store.graphql_limit.take(cost):
+                throttle["currentlyAvailable"] = store.graphql_limit.available()
+                return self._json(200, {
+                    "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+                    "extensions": {"cost": {"requestedQueryCost": cost, "actualQueryCost": None, "throttleStatus": throttle}}
+                })
+
+            throttle["currentlyAvailable"] = store.graphql_limit.available()
+            extensions = {"cost": {"requestedQueryCost": cost, "actualQueryCost": cost, "throttleStatus": throttle}}
+            try:
+                data = resolve_graphql(store, query, payload.get("variables") or {})
+            except Exception as e:
+                return self._json(200, {"errors": [{"message": str(e)}], "extensions": extensions})
+            self._json(200, {"data": data, "extensions": extensions})
+
+    return AdminHandler
+
+
+def rest_theme(theme: dict) -> dict:
+    return {"id": theme["id"], "name": theme["name"], "role": theme["role"],
+            "admin_graphql_api_id": f"gid://shopify/OnlineStoreTheme/{theme['id']}"}
+
+
+def start_mock_shopify(host: str = "127.0.0.1", port: int = 0, bucket_options: dict = None, **options):
+    """
+    Starts the fake Admin API and its staged-upload bucket on background threads.
+    Returns the server; server.base_url (pass it as --shopify_url), server.store and
+    server.bucket_server are set for inspection.
+    """
+    bucket_server = start_mock_bucket(host, 0, **(bucket_options or {}))
+    store = FakeShopifyStore(bucket_server.base_url, **options)
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    server.daemon_threads = True
+    server.store = store
+    server.bucket_server = bucket_server
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Shopify Admin API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every API call")
+    parser.add_argument("--file_delay", type=float, default=1.0, help="Seconds before files report READY")
+    parser.add_argument("--video_delay", type=float, default=3.0, help="Seconds before videos report READY")
+    parser.add_argument("--theme_delay", type=float, default=3.0, help="Seconds a new theme stays processing")
+    parser.add_argument("--rest_bucket", type=int, default=40, help="REST call-limit bucket size")
+    parser.add_argument("--graphql_bucket", type=int, default=1000, help="GraphQL cost bucket size")
+    parser.add_argument("--bucket_latency", type=float, default=0.0)
+    parser.add_argument("--bucket_interrupt_at", type=int, default=None)
+    parser.add_argument("--resumable_targets", action="store_true", help="Sign PUT targets for resumable sessions")
+    args = parser.parse_args()
+
+    srv = start_mock_shopify(
+        args.host, args.port,
+        bucket_options={"latency": args.bucket_latency, "interrupt_at": args.bucket_interrupt_at},
+        latency=args.latency,
+        file_processing_delay=args.file_delay,
+        video_processing_delay=args.video_delay,
+        theme_processing_delay=args.theme_delay,
+        rest_bucket_size=args.rest_bucket,
+        graphql_bucket_size=args.graphql_bucket,
+        resumable_targets=args.resumable_targets
+    )
+    print(f"🛍️ Fake Shopify Admin API on {srv.base_url} (bucket: {srv.bucket_server.base_url})")
+    print(f"   Run: python src/main.py --test --shopify_url {srv.base_url} --access_token fake")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import argparse
+from dotenv import load_dotenv
+
+# Ensure the project root is in the python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.theme_manager import ThemeManager
+from src.logic.color_cache import ColorSchemaCache
+from src.logic.color_optimizer import generate_new_color_schemas, COLOR_ENGINES
+
+# Load env vars
+load_dotenv()
+
+def main():
+    """
+    Generates and caches the color schema for each brand color, exactly as a job
+    would (same rendered base settings, description and engine), so later jobs
+    with these colors skip generation. The entries serve every job run without
+    --image_accents; with it, jobs share entries per product hue family instead.
+    """
+    parser = argparse.ArgumentParser(description="Pre-warm the color schema cache for brand colors")
+    parser.add_argument("colors", nargs="+", help="Primary colors, e.g. #EFB7C6")
+    parser.add_argument("--description", default="Luxury Brand", help="Theme description used by the jobs")
+    parser.add_argument("--color_engine", choices=COLOR_ENGINES, default="local")
+    args = parser.parse_args()
+
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    PROJECT_ROOT = os.path.dirname(BASE_DIR)
+    BASE_THEME_PATH = os.path.join(PROJECT_ROOT, "assets", "shopify-template")
+    CACHE_DIR = os.path.join(PROJECT_ROOT, ".theme_cache")
+
+    theme_manager = ThemeManager(BASE_THEME_PATH, tempfile.gettempdir(), cache_dir=CACHE_DIR)
+    cache = ColorSchemaCache(os.path.join(CACHE_DIR, "colors"))
+
+    for color in args.colors:
+        print(f"🎨 Pre-warming {color} ({args.color_engine})...")
+        rendered = theme_manager.render_files({}, {}, color, "", "")
+        settings_content = rendered.get("config/settings_data.json")
+        if settings_content is None:
+            print(f"❌ Error: base settings_data.json not found under {BASE_THEME_PATH}")
+            sys.exit(1)
+        try:
+            generate_new_color_schemas(
+                original_color_schema=settings_content,
+                theme_primary_color=color,
+                theme_description=args.description,
+                index_json_path=None,
+                index_json_content=rendered.get("templates/index.json", "{}"),
+                image_paths=[],
+                engine=args.color_engine,
+                cache=cache
+            )
+        except Exception as e:
+            print(f"❌ Could not generate the color schema for {color}: {e}")
+            sys.exit(1)
+
+    print(f"DONE! {len(args.colors)} colors cached in {cache.cache_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,133 @@ import os
 import json
 import shutil
 import uuid
-import re
+import threading
+from src.logic.placeholder_engine import get_matcher, LEFTOVER
+from src.logic.template_cache import default_template_cache
+from src.logic.theme_archive import BaseThemeArchive, plan_theme_archive
+from src.logic.theme_document import ThemeDocument
+from src.logic.jsonc import JsoncDocument
+from src.logic.template_demand import TemplateDemandIndex
+from src.utils.common import clone_tree
+
+# Slot that swaps every featured-product reference for the job's product handle
+PRODUCT_HANDLE_SLOT = "@product_handle"
+PRODUCT_HANDLE_PATTERN = r'"product":\s*"[^"]*"'
+
+# Text placeholders filled in each rendered template
+SETTINGS_TEXT_KEYS = ["NEW_THEME_SECONDARY_COLOR", "NEW_THEME_SECTION1_HEADING", "NEW_THEME_SECTION1_DESCRIPTION",
+                      "NEW_THEME_MAIN_TITLE_HERO_SLOGAN", "NEW_THEME_SECTION2_HEADING", "NEW_THEME_SECTION2_DESCRIPTION"]
+
+INDEX_TEXT_KEYS = [
+    "NEW_THEME_INITIAL_REVIEW_TITLE", "NEW_THEME_INITIAL_REVIEW_SUBTITLE",
+    "NEW_THEME_ANNOUNCEMENT_TEXT1", "NEW_THEME_ANNOUNCEMENT_TEXT2",
+    "NEW_THEME_PRODUCT_PHILOSOPHY", "NEW_THEME_IMAGE_WITH_TEXT_TITLE1",
+    "NEW_THEME_IMAGE_WITH_TEXT_TEXT1", "NEW_THEME_COMPARISON_TABLE_WHY_OUR_PRODUCT",
+    "NEW_THEME_COMPARISON_TABLE_TEXT", "NEW_THEME_BRAND_NAME",
+    "NEW_THEME_MAIN_TITLE_HERO_SLOGAN", "NEW_THEME_SUBTITLE_HERO",
+    "NEW_THEME_MAIN_TITLE_FEATURE", "NEW_THEME_TEXT_FEATURE",
+    "NEW_THEME_VIDEO_DESCRIPTION", "NEW_THEME_MAIN_TITLE_VIDEO",
+    "NEW_THEME_VIDEO_BUTTON_TEXT", "NEW_THEME_PRODUCT_SHOWCASE_REVIEW",
+    "NEW_THEME_PRODUCT_IMAGE_CAPTION_1", "NEW_THEME_PRODUCT_IMAGE_CAPTION_2",
+    "NEW_THEME_REVIEWS_SECTION_HEADLINE", "NEW_THEME_CUSTOMERS_REVIEW_TEXT_DESCRIPTION",
+    "NEW_THEME_PRODUCT_IMAGE_TITLE", "NEW_THEME_BENIFIT_AND_FEATURE",
+    "NEW_THEME_SHOP_COLLECTION_TRANSLATION", "NEW_THEME_PRODUCT_IMAGE_TITLE_2",
+    "NEW_THEME_HELP_SECTION_HEADLINE", "NEW_THEME_HELP_SECTION_SUBHEADING",
+    "NEW_BRAND_SLOGAN_CONTENT", "NEW_PRODUCT_BLURB_CONTENT", "NEW_CTA_HERO_BUTTON_CONTENT",
+    "NEW_PRODUCT_DESCRIPTION_1_CONTENT", "NEW_PRODUCT_HEADING_1_CONTENT", "NEW_SECOND_SLOGAN_CONTENT",
+    "NEW_NEED_HELP_CONTENT", "NEW_OUR_TEAM_IS_HERE_CONTENT", "NEW_CONTACT_US_BUTTON_CONTENT",
+    "NEW_FREE_SHIPPING_TEXT_CONTENT", "NEW_WATCH_DEMONSTRATION_CONTENT", "NEW_SEE_COLLECTION_BUTTON_CONTENT",
+    "NEW_GET_THIS_OFFER_BUTTON_CONTENT", "NEW_EXCELLENT_CONTENT", "NEW_PRODUCT_REVIEWS_HEADING_CONTENT",
+    "NEW_RATED_BY_CONTENT", "NEW_REVIEW_1_HOME_CONTENT", "NEW_REVIEW_2_HOME_CONTENT",
+    "NEW_REVIEW_3_HOME_CONTENT", "NEW_REVIEW_4_HOME_CONTENT"
+]
+
+PRODUCT_TEXT_KEYS = [
+    "NEW_THEME_WHAT_MAKES_OUR_PRODUCT_UNIQUE_TITLE", "NEW_THEME_PRODUCT_PAGE_IT1_TITLE",
+    "NEW_THEME_PRODUCT_PAGE_IT1_TEXT", "NEW_THEME_PRODUCT_PAGE_IT2_TITLE",
+    "NEW_THEME_PRODUCT_PAGE_IT2_TEXT", "NEW_THEME_TABLE_COMPARISON_WHY",
+    "NEW_THEME_VIDEO_TEXT_HEADING_PRODUCT_PAGE", "NEW_THEME_VIDEO_TEXT_TEXT_PRODUCT_PAGE",
+    "NEW_THEME_PRODUCT_BLURB_CONTENT", "NEW_THEME_BENEFITS_PRODUCT_CONTENT",
+    "NEW_PEOPLE_PURCHASED_CONTENT", "NEW_WANT_IT_BY_CONTENT", "NEW_ORDER_WITHIN_CONTENT",
+    "NEW_FREE_SHIPPING_CONTENT_ST", "NEW_REVIEWS_NUMBER_CONTENT", "NEW_SAFE_SECURE_PAYEMENT_CONTENT",
+    "NEW_FREE_SHIPPING_GLOBLY_CONTENT", "NEW_FDA_CLEARED_CONTENT", "NEW_TRY_IT_RISK_FREE_FOR_90_DAYS_CONTENT",
+    "NEW_LOOK_AT_OTHERS_CONTENT", "NEW_CLAIM_OFFER_CONTENT", "NEW_REAL_OFFER_PEOPLE_CONTENT",
+    "NEW_HIGHLIGHT_PRODUCT_FEATURES_CONTENT", "NEW_WHY_CHOOSE_US_CONTENT", "NEW_WHY_CHOOSE_US_BRAND_TEXT_CONTENT",
+    "NEW_THEME_FAQ_HEADING_1", "NEW_THEME_FAQ_CONTENT_1", "NEW_THEME_FAQ_HEADING_2", "NEW_THEME_FAQ_CONTENT_2",
+    "NEW_THEME_FAQ_HEADING_3", "NEW_THEME_FAQ_CONTENT_3", "NEW_THEME_FAQ_HEADING_4", "NEW_THEME_FAQ_CONTENT_4",
+    "NEW_FAQs_CONTENT", "NEW_CUSTOMER_QA_CONTENT", "NEW_758_PURCHASED_CONTENT", "NEW_HEADING_PRODUCT_NAME_CONTENT",
+    "NEW_30DAY_GUARANTEE_CONTENT", "NEW_WHAT_OUR_CUSTOMERS_SAY_CONTENT", "NEW_PARAGRAPH_PRODUCT_TEXT_VIDEO",
+    "NEW_HEADING_PRODUCT_TEXT_VIDEO", "NEW_CUSTOMER_SERVICE_TEXT_CONTENT", "NEW_CUSTOMER_SERVICE_PARAGRAPH_CONTENT",
+    "PRODUCT_SOLDOUT_TEXT", "PRODUCT_UNTRACKED_TEXT", "PRODUCT_LOW_ONE_TEXT", "PRODUCT_LOW_MANY_TEXT",
+    "PRODUCT_NORMAL_TEXT", "PRODUCT_SHARE_LABEL", "PRODUCT_OTHERS_LABEL", "PRODUCT_RELATED_HEADING"
+]
+
+FOOTER_TEXT_KEYS = ["NEW_THEME_FOOTER_FEATURE_1_TITLE", "NEW_THEME_FOOTER_FEATURE_1_DESCRIPTION",
+                    "NEW_THEME_FOOTER_FEATURE_2_TITLE", "NEW_THEME_FOOTER_FEATURE_2_DESCRIPTION",
+                    "NEW_THEME_FOOTER_FEATURE_3_TITLE", "NEW_THEME_FOOTER_FEATURE_3_DESCRIPTION",
+                    "NEW_THEME_FOOTER_FEATURE_4_TITLE", "NEW_THEME_FOOTER_FEATURE_4_DESCRIPTION",
+                    "FOOTER_ANNOUNCEMENT_1", "FOOTER_ANNOUNCEMENT_2", "FOOTER_NEWSLETTER_HEADING",
+                    "FOOTER_NEWSLETTER_SUBHEADING", "FOOTER_NEWSLETTER_PRIVACY_NOTE",
+                    "FOOTER_GET_IN_TOUCH_TITLE", "FOOTER_GET_IN_TOUCH_DESCRIPTION"]
+
+CONTACT_TEXT_KEYS = ["CONTACT_US_PAGE_HEADING", "CONTACT_US_BANNER_SUBHEADING", "GET_IN_TOUCH_TRANSLATION",
+                     "CONTACT_US_GET_IN_TOUCH_DESCRIPTION", "SUMMER_SALE_TRANSLATION", "SALE_BANNER_SUBHEADING",
+                     "SHOP_SALE_NOW", "BUNDLE_AND_SALE_TRANSLATION", "BUNDLE_BANNER_SUBHEADING",
+                     "SHOP_BUNDLE_TRANSLATION"]
+
+# Comparison table rows (block IDs of the base product template) -> content key
+COMPARISON_ROW_KEYS = {
+    "row_gGix3c": "NEW_PROS_1_CONTENT",
+    "row_GD4keD": "NEW_PROS_2_CONTENT",
+    "row_RjxJwy": "NEW_PROS_3_CONTENT",
+    "row_UCwzEV": "NEW_PROS_4_CONTENT",
+    "row_WrB3M7": "NEW_PROS_5_CONTENT"
+}
+
+# Placeholder tokens consumed by each rendered template (used by the demand index)
+TEMPLATE_TOKENS = {
+    "config/settings_data.json": SETTINGS_TEXT_KEYS + ["NEW_THEME_BRAND_NAME"],
+    "templates/index.json": INDEX_TEXT_KEYS + ["HERO_BUTTON_TEXT", "NEW_THEME_MULTICOLUMN_REVIEWS_BLOCKS",
+                                               "NEW_THEME_MULTICOLUMN_REVIEWS_BLOCK_ORDER", "NEW_THEME_COMPARISON_DATA"],
+    "templates/product.json": PRODUCT_TEXT_KEYS + ["NEW_THEME_FAQ_DATA"] + list(COMPARISON_ROW_KEYS),
+    "sections/footer-group.json": FOOTER_TEXT_KEYS,
+    "templates/page.contact.json": CONTACT_TEXT_KEYS
+}
+
+# Content keys that reach the templates through another token
+CONTENT_CONSUMERS = {
+    "NEW_THEME_SUBTITLE_BUTTON_TEXT": ["HERO_BUTTON_TEXT"],
+    "NEW_THEME_MULTICOLUMN_REVIEWS_LIST": ["NEW_THEME_MULTICOLUMN_REVIEWS_BLOCKS", "NEW_THEME_MULTICOLUMN_REVIEWS_BLOCK_ORDER"],
+    "NEW_THEME_COMPARISON_LIST": ["NEW_THEME_COMPARISON_DATA"],
+    "NEW_THEME_FAQ_LIST": ["NEW_THEME_FAQ_DATA"],
+    **{key: [row_id] for row_id, key in COMPARISON_ROW_KEYS.items()}
+}
 
 class ThemeManager:
-    def __init__(self, base_theme_path: str, temp_dir: str):
+    """
+    Holds only configuration and shared caches: rendering is a pure function of
+    (templates, content, images, options) and workspaces are scoped by order_id,
+    so one instance can serve many jobs from concurrent threads.
+    """
+    def __init__(self, base_theme_path: str, temp_dir: str, template_cache=None, workspace_mode: str = "link",
+                 cache_dir: str = None):
+        """
+        workspace_mode:
+        - "link": unchanged theme files are reflinked (or hard-linked) from the base
+          theme; only files the job rewrites are materialized (see write_text_atomic).
+        - "copy": full copytree per job.
+        cache_dir: where the prebuilt base theme archive lives (defaults to temp_dir/.cache).
+        """
+        if workspace_mode not in ("link", "copy"):
+            raise ValueError(f"Unknown workspace_mode: {workspace_mode}")
         self.base_theme_path = base_theme_path
         self.temp_dir = temp_dir
-
-        self.reviews_blocks = {}
-        self.reviews_order = []
-        self.faq_data = {}
-        self.comparison_data = {}
+        self.workspace_mode = workspace_mode
+        self.template_cache = template_cache or default_template_cache
+        self.cache_dir = cache_dir or os.path.join(temp_dir, ".cache")
+        self._base_archive = None
+        self._archive_lock = threading.Lock()
+        self.demand_index_cache = TemplateDemandIndex(self.cache_dir)
 
     def setup_workspace(self, order_id: str) -> str:
         workspace_path = os.path.join(self.temp_dir, f"order_{order_id}")
@@ -23,7 +139,11 @@ class ThemeManager:
         if not os.path.exists(src_theme):
             raise FileNotFoundError(f"Base theme not found at {src_theme}")
 
-        shutil.copytree(src_theme, workspace_path)
+        if self.workspace_mode == "link":
+            summary = clone_tree(src_theme, workspace_path)
+            print(f"📂 Workspace linked from base theme: {summary}")
+        else:
+            shutil.copytree(src_theme, workspace_path)
 
         files_to_repair = {
             "index.json": "templates",
@@ -40,6 +160,9 @@ class ThemeManager:
 
             if os.path.exists(loose_source):
                 os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
+                # Unlink first: dest may be a hard link into the base theme
+                if os.path.exists(dest_file_path):
+                    os.remove(dest_file_path)
                 shutil.copy(loose_source, dest_file_path)
                 print(f"   -> Overwrote {fname} from shopify-template root")
             else:
@@ -47,10 +170,11 @@ class ThemeManager:
 
         return workspace_path
 
-    def prepare_data(self, ai_content: dict):
+    def prepare_data(self, ai_content: dict) -> dict:
+        """Builds the structured (block) content of a job. Returns a new dict; no state is kept."""
         # --- REVIEWS ---
-        self.reviews_blocks = {}
-        self.reviews_order = []
+        reviews_blocks = {}
+        reviews_order = []
         raw_reviews = ai_content.get("NEW_THEME_MULTICOLUMN_REVIEWS_LIST", [])
 
         if not raw_reviews:
@@ -58,7 +182,7 @@ class ThemeManager:
         
         for i, r in enumerate(raw_reviews[:6]):
             bid = f"review_{uuid.uuid4().hex[:8]}"
-            self.reviews_order.append(bid)
+            reviews_order.append(bid)
 
             headline = r.get('review_headline', '')
             body = r.get('review_body', '')
@@ -67,7 +191,7 @@ class ThemeManager:
 
             review_html = f"<p><strong>{headline}</strong></p><p>{body}</p><p><small>{author}</small></p>"
 
-            self.reviews_blocks[bid] = {
+            reviews_blocks[bid] = {
                 "type": "column",
                 "settings": {
                     "title": stars,
@@ -78,7 +202,7 @@ class ThemeManager:
             }
 
         # --- COMPARISON ---
-        self.comparison_data = {}
+        comparison_data = {}
         comp_ids = ["testimonial_dPRTJq", "testimonial_EzR6nx"]
         raw_comp = ai_content.get("NEW_THEME_COMPARISON_LIST", [])
         for i, c in enumerate(raw_comp[:2]):
@@ -86,7 +210,7 @@ class ThemeManager:
             heading = c.get("testimonial_text", "Great result")
             author = c.get("author_info", "Verified")
 
-            self.comparison_data[comp_ids[i]] = {
+            comparison_data[comp_ids[i]] = {
                 "type": "testimonial",
                 "settings": {
                     "caption": caption,
@@ -96,11 +220,11 @@ class ThemeManager:
             }
 
         # --- FAQ ---
-        self.faq_data = {}
+        faq_data = {}
         faq_ids = ["collapsible_row_1", "collapsible_row_2", "collapsible_row_3", "collapsible_row_4"]
         raw_faq = ai_content.get("NEW_THEME_FAQ_LIST", [])
         for i, f in enumerate(raw_faq[:4]):
-            self.faq_data[faq_ids[i]] = {
+            faq_data[faq_ids[i]] = {
                 "type": "collapsible_row",
                 "settings": {
                     "heading": f.get("question", "FAQ"),
@@ -108,11 +232,51 @@ class ThemeManager:
                 }
             }
 
+        return {
+            "reviews_blocks": reviews_blocks,
+            "reviews_order": reviews_order,
+            "comparison_data": comparison_data,
+            "faq_data": faq_data
+        }
+
     def cleanup_placeholders(self, content: str) -> str:
-        content = re.sub(r'NEW_THEME_[A-Z0-9_]+', '', content)
-        content = re.sub(r'NEW_[A-Z0-9_]+_CONTENT', '', content)
+        content, _ = get_matcher(()).substitute(content, {})
         return content
 
+    def base_template_path(self, rel_path: str) -> str:
+        """The base theme file a job renders rel_path from."""
+        return self.template_source(os.path.join(self.base_theme_path, "new-new", rel_path))
+
+    def template_source(self, file_path: str) -> str:
+        """
+        The base file a workspace file was copied from (the loose shopify-template
+        copy when one exists), so compiled templates are shared across jobs.
+        """
+        loose_source = os.path.join(self.base_theme_path, os.path.basename(file_path))
+        return loose_source if os.path.exists(loose_source) else file_path
+
+    def demand_index(self):
+        """
+        Which content keys the base templates consume (and in which sections),
+        so generation can skip content nothing will display.
+        """
+        templates = {}
+        for rel, tokens in TEMPLATE_TOKENS.items():
+            templates[rel] = (self.base_template_path(rel), tokens)
+        return self.demand_index_cache.load(templates, CONTENT_CONSUMERS)
+
+    def render_placeholders(self, file_path: str, values: dict, patterns: dict = None) -> str:
+        """
+        Renders the precompiled template for file_path with `values` and blanks
+        leftover placeholders. The template is only scanned when its base file changes.
+        """
+        compiled = self.template_cache.load(self.template_source(file_path), values.keys(), patterns)
+        filled = sum(n for slot, n in compiled.hits.items() if slot in values)
+        missing = [k for k in values if not compiled.hits[k]]
+        print(f"   -> {os.path.basename(file_path)}: {filled} placeholders filled, "
+              f"{compiled.hits[LEFTOVER]} leftovers blanked, {len(missing)} keys unused")
+        return compiled.render(values)
+
     def escape_json_string(self, text: str) -> str:
         if not text:
             return ""
@@ -121,187 +285,125 @@ class ThemeManager:
             text_str = text_str[1:-1]
         return text_str.replace('\\', '\\\\').replace('"', '\\"')
 
-    def process_notebook_logic(self, workspace_path: str, ai_content: dict, images_map: dict, main_color: str, brand_name: str, product_handle:str):
-        self.prepare_data(ai_content)
-
-        f_index = os.path.join(workspace_path, "templates", "index.json")
-        f_settings = os.path.join(workspace_path, "config", "settings_data.json")
-        f_product = os.path.join(workspace_path, "templates", "product.json")
-        f_footer = os.path.join(workspace_path, "sections", "footer-group.json")
-        f_contact = os.path.join(workspace_path, "templates", "page.contact.json")
-
-        def apply_safe_replacements(content, keys_list):
-            for k in keys_list:
-                raw_val = ai_content.get(k, "")
-                safe_val = self.escape_json_string(raw_val)
-                content = content.replace(k, safe_val)
-            return content
+    def process_notebook_logic(self, workspace_path: str, ai_content: dict, images_map: dict, main_color: str, brand_name: str, product_handle:str,
+                               document: ThemeDocument = None):
+        """
+        Renders the job's content into the theme templates. With a ThemeDocument the
+        results stay in memory for later stages and are written by document.flush();
+        without one the files are written before returning.
+        """
+        owns_document = document is None
+        if owns_document:
+            document = ThemeDocument(workspace_path)
+
+        rendered = self.render_files(ai_content, images_map, main_color, brand_name, product_handle)
+        for rel_path, content in rendered.items():
+            document.set_text(rel_path, content)
+
+        if owns_document:
+            document.flush()
+
+    def render_files(self, ai_content: dict, images_map: dict, main_color: str, brand_name: str, product_handle: str) -> dict:
+        """
+        Pure rendering step: reads only the (cached) base templates and the given
+        inputs, and returns {workspace-relative path: rendered text}. Nothing is
+        written and no state is kept, so concurrent jobs can share one instance.
+        """
+        data = self.prepare_data(ai_content)
+        rendered = {}
+
+        f_index = self.base_template_path("templates/index.json")
+        f_settings = self.base_template_path("config/settings_data.json")
+        f_product = self.base_template_path("templates/product.json")
+        f_footer = self.base_template_path("sections/footer-group.json")
+        f_contact = self.base_template_path("templates/page.contact.json")
+
+        def safe_values(keys_list):
+            return {k: self.escape_json_string(ai_content.get(k, "")) for k in keys_list}
 
         # 1. SETTINGS
         if os.path.exists(f_settings):
-            with open(f_settings, 'r') as f: content = f.read()
-            content = content.replace("NEW_THEME_PRIMARY_COLOR", main_color)
-            content = content.replace("NEW_THEME_BRAND_NAME", self.escape_json_string(brand_name))
-
+            values = safe_values(SETTINGS_TEXT_KEYS)
             for k, v in ai_content.items():
                 if k.startswith("NEW_THEME_COLOR_SCHEME"):
-                    content = content.replace(k, str(v))
+                    values[k] = str(v)
+            values["NEW_THEME_PRIMARY_COLOR"] = main_color
+            values["NEW_THEME_BRAND_NAME"] = self.escape_json_string(brand_name)
 
-            misc_keys = ["NEW_THEME_SECONDARY_COLOR", "NEW_THEME_SECTION1_HEADING", "NEW_THEME_SECTION1_DESCRIPTION",
-                      "NEW_THEME_MAIN_TITLE_HERO_SLOGAN", "NEW_THEME_SECTION2_HEADING", "NEW_THEME_SECTION2_DESCRIPTION"]
-            
-            content = apply_safe_replacements(content, misc_keys)
-            content = self.cleanup_placeholders(content)
-            with open(f_settings, 'w') as f: f.write(content)
+            rendered["config/settings_data.json"] = self.render_placeholders(f_settings, values)
 
         # 2. INDEX
         if os.path.exists(f_index):
-            with open(f_index, 'r') as f: content = f.read()
-            for k, v in images_map.items():
-                content = content.replace(k, v)
-
-            pattern = r'"product":\s*"[^"]*"'
-            replacement = f'"product": "{product_handle}"'
-            content = re.sub(pattern, replacement, content)
-
-            blocks_json = json.dumps(self.reviews_blocks, ensure_ascii=False)
-            pattern_blocks = r'"blocks"\s*:\s*"NEW_THEME_MULTICOLUMN_REVIEWS_BLOCKS"'
-            content = re.sub(pattern_blocks, lambda m: f'"blocks": {blocks_json}', content)
-
-            order_json = json.dumps(self.reviews_order, ensure_ascii=False)
-            pattern_order = r'"block_order"\s*:\s*"NEW_THEME_MULTICOLUMN_REVIEWS_BLOCK_ORDER"'
-            content = re.sub(pattern_order, lambda m: f'"block_order": {order_json}', content)
-
-            content = content.replace("NEW_THEME_COMPARISON_DATA", json.dumps(self.comparison_data, ensure_ascii=False))
-
-            text_keys = [
-                "NEW_THEME_INITIAL_REVIEW_TITLE", "NEW_THEME_INITIAL_REVIEW_SUBTITLE",
-                "NEW_THEME_ANNOUNCEMENT_TEXT1", "NEW_THEME_ANNOUNCEMENT_TEXT2",
-                "NEW_THEME_PRODUCT_PHILOSOPHY", "NEW_THEME_IMAGE_WITH_TEXT_TITLE1",
-                "NEW_THEME_IMAGE_WITH_TEXT_TEXT1", "NEW_THEME_COMPARISON_TABLE_WHY_OUR_PRODUCT",
-                "NEW_THEME_COMPARISON_TABLE_TEXT", "NEW_THEME_BRAND_NAME",
-                "NEW_THEME_MAIN_TITLE_HERO_SLOGAN", "NEW_THEME_SUBTITLE_HERO",
-                "NEW_THEME_MAIN_TITLE_FEATURE", "NEW_THEME_TEXT_FEATURE",
-                "NEW_THEME_VIDEO_DESCRIPTION", "NEW_THEME_MAIN_TITLE_VIDEO",
-                "NEW_THEME_VIDEO_BUTTON_TEXT", "NEW_THEME_PRODUCT_SHOWCASE_REVIEW",
-                "NEW_THEME_PRODUCT_IMAGE_CAPTION_1", "NEW_THEME_PRODUCT_IMAGE_CAPTION_2",
-                "NEW_THEME_REVIEWS_SECTION_HEADLINE", "NEW_THEME_CUSTOMERS_REVIEW_TEXT_DESCRIPTION",
-                "NEW_THEME_PRODUCT_IMAGE_TITLE", "NEW_THEME_BENIFIT_AND_FEATURE",
-                "NEW_THEME_SHOP_COLLECTION_TRANSLATION", "NEW_THEME_PRODUCT_IMAGE_TITLE_2",
-                "NEW_THEME_HELP_SECTION_HEADLINE", "NEW_THEME_HELP_SECTION_SUBHEADING",
-                "NEW_BRAND_SLOGAN_CONTENT", "NEW_PRODUCT_BLURB_CONTENT", "NEW_CTA_HERO_BUTTON_CONTENT",
-                "NEW_PRODUCT_DESCRIPTION_1_CONTENT", "NEW_PRODUCT_HEADING_1_CONTENT", "NEW_SECOND_SLOGAN_CONTENT",
-                "NEW_NEED_HELP_CONTENT", "NEW_OUR_TEAM_IS_HERE_CONTENT", "NEW_CONTACT_US_BUTTON_CONTENT",
-                "NEW_FREE_SHIPPING_TEXT_CONTENT", "NEW_WATCH_DEMONSTRATION_CONTENT", "NEW_SEE_COLLECTION_BUTTON_CONTENT",
-                "NEW_GET_THIS_OFFER_BUTTON_CONTENT", "NEW_EXCELLENT_CONTENT", "NEW_PRODUCT_REVIEWS_HEADING_CONTENT",
-                "NEW_RATED_BY_CONTENT", "NEW_REVIEW_1_HOME_CONTENT", "NEW_REVIEW_2_HOME_CONTENT",
-                "NEW_REVIEW_3_HOME_CONTENT", "NEW_REVIEW_4_HOME_CONTENT"
-            ]
-            content = apply_safe_replacements(content, text_keys)
-
-            hero_btn = self.escape_json_string(ai_content.get("NEW_THEME_SUBTITLE_BUTTON_TEXT", "Shop Now"))
-            content = content.replace("HERO_BUTTON_TEXT", hero_btn)
-
-            content = self.cleanup_placeholders(content)
-            with open(f_index, 'w') as f: f.write(content)
+            values = safe_values(INDEX_TEXT_KEYS)
+            values["HERO_BUTTON_TEXT"] = self.escape_json_string(ai_content.get("NEW_THEME_SUBTITLE_BUTTON_TEXT", "Shop Now"))
+            # Structural placeholders: the quoted string is swapped for a JSON object/array
+            values['"NEW_THEME_MULTICOLUMN_REVIEWS_BLOCKS"'] = json.dumps(data["reviews_blocks"], ensure_ascii=False)
+            values['"NEW_THEME_MULTICOLUMN_REVIEWS_BLOCK_ORDER"'] = json.dumps(data["reviews_order"], ensure_ascii=False)
+            values["NEW_THEME_COMPARISON_DATA"] = json.dumps(data["comparison_data"], ensure_ascii=False)
+            # Image URLs take precedence over text keys of the same name
+            values.update(images_map)
+            values[PRODUCT_HANDLE_SLOT] = f'"product": "{product_handle}"'
+
+            rendered["templates/index.json"] = self.render_placeholders(f_index, values, {PRODUCT_HANDLE_SLOT: PRODUCT_HANDLE_PATTERN})
 
         # 3. PRODUCT
         if os.path.exists(f_product):
-            with open(f_product, 'r') as f: content = f.read()
-            content = content.replace("NEW_THEME_FAQ_DATA", json.dumps(self.faq_data, ensure_ascii=False))
-
             # --- PRE-PROCESS: Standard Replacements ---
-            p_keys = [
-                "NEW_THEME_WHAT_MAKES_OUR_PRODUCT_UNIQUE_TITLE", "NEW_THEME_PRODUCT_PAGE_IT1_TITLE",
-                "NEW_THEME_PRODUCT_PAGE_IT1_TEXT", "NEW_THEME_PRODUCT_PAGE_IT2_TITLE",
-                "NEW_THEME_PRODUCT_PAGE_IT2_TEXT", "NEW_THEME_TABLE_COMPARISON_WHY",
-                "NEW_THEME_VIDEO_TEXT_HEADING_PRODUCT_PAGE", "NEW_THEME_VIDEO_TEXT_TEXT_PRODUCT_PAGE",
-                "NEW_THEME_PRODUCT_BLURB_CONTENT", "NEW_THEME_BENEFITS_PRODUCT_CONTENT",
-                "NEW_PEOPLE_PURCHASED_CONTENT", "NEW_WANT_IT_BY_CONTENT", "NEW_ORDER_WITHIN_CONTENT",
-                "NEW_FREE_SHIPPING_CONTENT_ST", "NEW_REVIEWS_NUMBER_CONTENT", "NEW_SAFE_SECURE_PAYEMENT_CONTENT",
-                "NEW_FREE_SHIPPING_GLOBLY_CONTENT", "NEW_FDA_CLEARED_CONTENT", "NEW_TRY_IT_RISK_FREE_FOR_90_DAYS_CONTENT",
-                "NEW_LOOK_AT_OTHERS_CONTENT", "NEW_CLAIM_OFFER_CONTENT", "NEW_REAL_OFFER_PEOPLE_CONTENT",
-                "NEW_HIGHLIGHT_PRODUCT_FEATURES_CONTENT", "NEW_WHY_CHOOSE_US_CONTENT", "NEW_WHY_CHOOSE_US_BRAND_TEXT_CONTENT",
-                "NEW_THEME_FAQ_HEADING_1", "NEW_THEME_FAQ_CONTENT_1", "NEW_THEME_FAQ_HEADING_2", "NEW_THEME_FAQ_CONTENT_2",
-                "NEW_THEME_FAQ_HEADING_3", "NEW_THEME_FAQ_CONTENT_3", "NEW_THEME_FAQ_HEADING_4", "NEW_THEME_FAQ_CONTENT_4",
-                "NEW_FAQs_CONTENT", "NEW_CUSTOMER_QA_CONTENT", "NEW_758_PURCHASED_CONTENT", "NEW_HEADING_PRODUCT_NAME_CONTENT",
-                "NEW_30DAY_GUARANTEE_CONTENT", "NEW_WHAT_OUR_CUSTOMERS_SAY_CONTENT", "NEW_PARAGRAPH_PRODUCT_TEXT_VIDEO",
-                "NEW_HEADING_PRODUCT_TEXT_VIDEO", "NEW_CUSTOMER_SERVICE_TEXT_CONTENT", "NEW_CUSTOMER_SERVICE_PARAGRAPH_CONTENT",
-                "PRODUCT_SOLDOUT_TEXT", "PRODUCT_UNTRACKED_TEXT", "PRODUCT_LOW_ONE_TEXT", "PRODUCT_LOW_MANY_TEXT",
-                "PRODUCT_NORMAL_TEXT", "PRODUCT_SHARE_LABEL", "PRODUCT_OTHERS_LABEL", "PRODUCT_RELATED_HEADING"
-            ]
-            content = apply_safe_replacements(content, p_keys)
-            content = self.cleanup_placeholders(content)
+            values = safe_values(PRODUCT_TEXT_KEYS)
+            values["NEW_THEME_FAQ_DATA"] = json.dumps(data["faq_data"], ensure_ascii=False)
+            rendered["templates/product.json"] = self.render_placeholders(f_product, values)
 
             # --- POST-PROCESS: Surgical Replacement for Table Rows & Header ---
             # This overwrites the hardcoded Drone text
             try:
-                data = json.loads(content)
-                if "sections" in data:
-                    for section_id, section in data["sections"].items():
-                        # Find the Comparison Table Section
-                        # Usually identifies by type or specific blocks
-                        if section.get("type") == "comparison-table" or "comparison" in section_id:
-                            
-                            # 1. Update Header (Fixing "dycom-test-01")
-                            if "settings" in section:
-                                if "us_heading" in section["settings"]:
-                                    section["settings"]["us_heading"] = self.escape_json_string(brand_name)
-                                if "product_heading" in section["settings"]:
-                                    section["settings"]["product_heading"] = self.escape_json_string(brand_name)
-
-                            # 2. Update Rows (Fixing Drone Text)
-                            if "blocks" in section:
-                                # Map IDs to keys. NOTE: These IDs must match your base template.
-                                row_map = {
-                                    "row_gGix3c": "NEW_PROS_1_CONTENT",
-                                    "row_GD4keD": "NEW_PROS_2_CONTENT",
-                                    "row_RjxJwy": "NEW_PROS_3_CONTENT",
-                                    "row_UCwzEV": "NEW_PROS_4_CONTENT",
-                                    "row_WrB3M7": "NEW_PROS_5_CONTENT"
-                                }
-                                for bid, key in row_map.items():
-                                    if bid in section["blocks"]:
-                                        new_text = ai_content.get(key, "")
-                                        if new_text:
-                                            # Update "benefit" or "text" depending on schema
-                                            if "settings" in section["blocks"][bid]:
-                                                section["blocks"][bid]["settings"]["benefit"] = self.escape_json_string(new_text)
-
-                content = json.dumps(data, indent=2, ensure_ascii=False)
+                product = JsoncDocument(rendered["templates/product.json"])
+                for section_id, section in product.data.get("sections", {}).items():
+                    # Find the Comparison Table Section
+                    # Usually identifies by type or specific blocks
+                    if section.get("type") == "comparison-table" or "comparison" in section_id:
+                        
+                        # 1. Update Header (Fixing "dycom-test-01")
+                        if "settings" in section:
+                            if "us_heading" in section["settings"]:
+                                section["settings"]["us_heading"] = self.escape_json_string(brand_name)
+                            if "product_heading" in section["settings"]:
+                                section["settings"]["product_heading"] = self.escape_json_string(brand_name)
+
+                        # 2. Update Rows (Fixing Drone Text)
+                        if "blocks" in section:
+                            for bid, key in COMPARISON_ROW_KEYS.items():
+                                if bid in section["blocks"]:
+                                    new_text = ai_content.get(key, "")
+                                    if new_text:
+                                        # Update "benefit" or "text" depending on schema
+                                        if "settings" in section["blocks"][bid]:
+                                            section["blocks"][bid]["settings"]["benefit"] = self.escape_json_string(new_text)
+
+                rendered["templates/product.json"] = product.dumps()
             except Exception as e:
                 print(f"   ⚠️ Error during surgical JSON update: {e}")
 
-            with open(f_product, 'w') as f: f.write(content)
-
         # 4. FOOTER
         if os.path.exists(f_footer):
-            with open(f_footer, 'r') as f: content = f.read()
-            f_keys = ["NEW_THEME_FOOTER_FEATURE_1_TITLE", "NEW_THEME_FOOTER_FEATURE_1_DESCRIPTION",
-                      "NEW_THEME_FOOTER_FEATURE_2_TITLE", "NEW_THEME_FOOTER_FEATURE_2_DESCRIPTION",
-                      "NEW_THEME_FOOTER_FEATURE_3_TITLE", "NEW_THEME_FOOTER_FEATURE_3_DESCRIPTION",
-                      "NEW_THEME_FOOTER_FEATURE_4_TITLE", "NEW_THEME_FOOTER_FEATURE_4_DESCRIPTION",
-                      "FOOTER_ANNOUNCEMENT_1", "FOOTER_ANNOUNCEMENT_2", "FOOTER_NEWSLETTER_HEADING",
-                      "FOOTER_NEWSLETTER_SUBHEADING", "FOOTER_NEWSLETTER_PRIVACY_NOTE",
-                      "FOOTER_GET_IN_TOUCH_TITLE", "FOOTER_GET_IN_TOUCH_DESCRIPTION"]
-            content = apply_safe_replacements(content, f_keys)
-            content = self.cleanup_placeholders(content)
-            with open(f_footer, 'w') as f: f.write(content)
+            rendered["sections/footer-group.json"] = self.render_placeholders(f_footer, safe_values(FOOTER_TEXT_KEYS))
 
         # 5. CONTACT
         if os.path.exists(f_contact):
-            with open(f_contact, 'r') as f: content = f.read()
-            c_keys = ["CONTACT_US_PAGE_HEADING", "CONTACT_US_BANNER_SUBHEADING", "GET_IN_TOUCH_TRANSLATION",
-                      "CONTACT_US_GET_IN_TOUCH_DESCRIPTION", "SUMMER_SALE_TRANSLATION", "SALE_BANNER_SUBHEADING",
-                      "SHOP_SALE_NOW", "BUNDLE_AND_SALE_TRANSLATION", "BUNDLE_BANNER_SUBHEADING",
-                      "SHOP_BUNDLE_TRANSLATION"]
-            content = apply_safe_replacements(content, c_keys)
-            content = content.replace("NEW_CONTACT_PAGE_IMAGE_BANNER", images_map.get("NEW_THEME_HERO_BANNER", ""))
+            values = safe_values(CONTACT_TEXT_KEYS)
+            values["NEW_CONTACT_PAGE_IMAGE_BANNER"] = images_map.get("NEW_THEME_HERO_BANNER", "")
+            rendered["templates/page.contact.json"] = self.render_placeholders(f_contact, values)
+
+        return rendered
+
+    def base_archive(self) -> BaseThemeArchive:
+        with self._archive_lock:
+            if self._base_archive is None:
+                self._base_archive = BaseThemeArchive(os.path.join(self.base_theme_path, "new-new"), self.cache_dir)
+            return self._base_archive
 
-            content = self.cleanup_placeholders(content)
-            with open(f_contact, 'w') as f: f.write(content)
+    def plan_archive(self, workspace_path: str):
+        """Plans the theme ZIP; members untouched by the job are reused precompressed from the base archive."""
+        return plan_theme_archive(workspace_path, self.base_archive())
 
     def zip_theme(self, workspace_path: str) -> str:
-        zip_base = workspace_path
-        shutil.make_archive(zip_base, 'zip', workspace_path)
-        return f"{zip_base}.zip"
\ No newline at end of file
+        return self.plan_archive(workspace_path).write_to(f"{workspace_path}.zip")
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 import requests
 import uuid
+import shutil
 import re
 
 def download_file(url, output_path):
@@ -34,4 +35,64 @@ def extract_language_code(language_name, openai_client):
             return match.group(1)
         return "en"
     except Exception:
-        return "en"
\ No newline at end of file
+        return "en"
+
+def write_text_atomic(path, content, encoding="utf-8"):
+    """
+    Writes content to a temp file next to `path` and renames it into place.
+    The rename swaps the directory entry instead of writing into the existing
+    inode, so files hard-linked from the base theme are never modified.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:6]}.tmp"
+    try:
+        with open(tmp_path, "w", encoding=encoding) as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Linux FICLONE ioctl: copy-on-write clone on btrfs/XFS/overlayfs-backed volumes
+FICLONE = 0x40049409
+_reflink_supported = True
+
+
+def clone_file(src, dst):
+    """
+    Materializes dst as a cheap copy of src: a reflink when the filesystem
+    supports it, else a hard link, else a real copy. Returns the method used.
+    """
+    global _reflink_supported
+    if _reflink_supported:
+        try:
+            import fcntl
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return "reflink"
+        except (ImportError, OSError):
+            _reflink_supported = False
+            if os.path.exists(dst):
+                os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+def clone_tree(src_dir, dst_dir):
+    """
+    Recreates src_dir under dst_dir with clone_file for every file.
+    Returns a {method: count} summary.
+    """
+    summary = {}
+    for root, dirs, files in os.walk(src_dir):
+        target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for filename in files:
+            method = clone_file(os.path.join(root, filename), os.path.join(target_root, filename))
+            summary[method] = summary.get(method, 0) + 1
+    return summary
@@ -0,0 +1,102 @@
+import os
+import time
+import shutil
+
+TMPFS_DIR = "/dev/shm"
+JOB_PREFIX = "job_"
+LOCK_NAME = ".lock"
+
+
+def resolve_build_root(build_root: str, use_tmpfs: bool = False) -> str:
+    """Returns the directory job builds live under; with use_tmpfs, a RAM-backed one when available."""
+    if use_tmpfs:
+        if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK):
+            return os.path.join(TMPFS_DIR, "theme_builds")
+        print(f"   ⚠️ tmpfs not available at {TMPFS_DIR}, building in {build_root}")
+    return build_root
+
+
+def _try_lock(fileobj) -> bool:
+    """Takes an exclusive, non-blocking lock. Without fcntl (Windows) every lock succeeds."""
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    try:
+        fcntl.flock(fileobj.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _is_active(job_path: str) -> bool:
+    lock_path = os.path.join(job_path, LOCK_NAME)
+    if not os.path.exists(lock_path):
+        return False
+    try:
+        with open(lock_path, "a") as f:
+            # Closing the file releases the probe lock straight away
+            return not _try_lock(f)
+    except OSError:
+        return True
+
+
+class JobDirectory:
+    """
+    Build directory owned by a single job: <root>/job_<id>/ holds the job's
+    generated assets (assets/) and its theme workspace. A lock held for the
+    job's lifetime marks it as running, so pruning by other jobs skips it.
+    On success the directory is removed; after a failure (or with keep=True)
+    it is kept for inspection until the retention policy prunes it.
+    """
+    def __init__(self, root: str, job_id: str, keep: bool = False):
+        self.root = root
+        self.job_id = job_id
+        self.keep = keep
+        self.path = os.path.join(root, f"{JOB_PREFIX}{job_id}")
+        self.assets_dir = os.path.join(self.path, "assets")
+        self._lock_file = None
+
+    def __enter__(self):
+        os.makedirs(self.assets_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(self.path, LOCK_NAME), "w")
+        _try_lock(self._lock_file)
+        self._lock_file.write(str(os.getpid()))
+        self._lock_file.flush()
+        print(f"📁 Job build directory: {self.path}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock_file.close()
+        self._lock_file = None
+        if exc_type is None and not self.keep:
+            shutil.rmtree(self.path, ignore_errors=True)
+            print(f"🧹 Removed build directory {self.path}")
+        else:
+            print(f"📁 Build directory kept at {self.path}")
+        return False
+
+
+def prune_job_dirs(root: str, max_age_hours: float = 24, max_kept: int = 10) -> int:
+    """
+    Removes job directories left behind by earlier runs (failed or kept ones):
+    every one older than max_age_hours, then the oldest beyond max_kept.
+    Directories locked by a running job are never touched. Returns the number removed.
+    """
+    if not os.path.isdir(root):
+        return 0
+
+    finished = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith(JOB_PREFIX) and os.path.isdir(path) and not _is_active(path):
+            finished.append((os.path.getmtime(path), path))
+    finished.sort(reverse=True)
+
+    cutoff = time.time() - max_age_hours * 3600
+    stale = [path for i, (mtime, path) in enumerate(finished) if mtime < cutoff or i >= max_kept]
+    for path in stale:
+        shutil.rmtree(path, ignore_errors=True)
+    if stale:
+        print(f"🧹 Pruned {len(stale)} old build directories from {root}")
+    return len(stale)